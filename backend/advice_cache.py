@@ -0,0 +1,196 @@
+import contextvars
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from price_cache import LocalBackend
+
+# Seconds a generated piece of advice is reused before asking the LLM again
+ADVICE_CACHE_TTL = float(os.getenv("ADVICE_CACHE_TTL", str(7 * 24 * 3600)))
+ADVICE_CACHE_MAX_ENTRIES = int(os.getenv("ADVICE_CACHE_MAX_ENTRIES", "2048"))
+
+
+class _Flight:
+    """One computation of a key, whose text (when streamed) is replayed to every caller sharing it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.value = None
+        self.error = None
+        self._changed = threading.Condition()
+
+    def publish(self, chunk):
+        with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    def finish(self, value=None, error=None):
+        with self._changed:
+            self.value = value
+            self.error = error
+            self.finished = True
+            self._changed.notify_all()
+
+    def follow(self):
+        """Every chunk published so far, then each new one as it arrives, until the flight finishes."""
+        seen = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self.finished or len(self.chunks) > seen)
+                chunks = self.chunks[seen:]
+                finished = self.finished
+            yield from chunks
+            seen += len(chunks)
+            if finished:
+                return
+
+    def result(self):
+        with self._changed:
+            self._changed.wait_for(lambda: self.finished)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class AdviceCache:
+    """LLM advice keyed by prompt version and disease.
+
+    Entries live in an in-process LRU and, when a collection is given, in
+    MongoDB so they survive restarts and are shared between workers.
+    Concurrent misses for the same key share a single computation, whether
+    it was started by get_or_compute or by stream.
+    """
+
+    def __init__(self, collection=None, ttl=ADVICE_CACHE_TTL, max_entries=ADVICE_CACHE_MAX_ENTRIES):
+        self.collection = collection
+        self.ttl = ttl
+        self.local = LocalBackend(max_entries)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self._index_ready = False
+
+    @staticmethod
+    def key(prompt_version, disease):
+        return f"v{prompt_version}:{disease}"
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if time.time() - stored_at < self.ttl:
+                return value
+        if self.collection is None:
+            return None
+        try:
+            doc = self.collection.find_one({"_id": key})
+        except Exception as e:
+            print(f"Advice cache lookup failed: {str(e)}")
+            return None
+        if not doc or time.time() - doc["stored_at"] >= self.ttl:
+            return None
+        self.local.set(key, doc["advice"], doc["stored_at"], self.ttl)
+        return doc["advice"]
+
+    def set(self, key, value):
+        stored_at = time.time()
+        self.local.set(key, value, stored_at, self.ttl)
+        if self.collection is None:
+            return
+        try:
+            if not self._index_ready:
+                # Mongo's TTL monitor drops expired entries; created on first write to keep startup offline
+                self.collection.create_index("expires_at", expireAfterSeconds=0)
+                self._index_ready = True
+            self.collection.update_one(
+                {"_id": key},
+                {"$set": {
+                    "advice": value,
+                    "stored_at": stored_at,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Advice cache write failed: {str(e)}")
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing it at most once across concurrent callers.
+
+        Exceptions raised by compute are re-raised to every waiting caller and
+        nothing is cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+        flight, leader = self._join(key)
+        if leader:
+            self._run(key, flight, compute)
+        return flight.result()
+
+    def stream(self, key, generate, parse):
+        """A flight for key: follow() yields the text as it is generated, result() the value.
+
+        generate() yields the text in chunks and parse(text) turns the whole
+        of it into the value to cache. On a hit the flight is already
+        finished, with no text. On a miss the first caller starts generate()
+        on a background thread, so a client that goes away does not cut the
+        stream short for the others. A caller that joins late is replayed
+        the text so far. Exceptions from either function are raised by
+        result() and nothing is cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            flight = _Flight()
+            flight.finish(value)
+            return flight
+        flight, leader = self._join(key)
+        if leader:
+            def compute():
+                for chunk in generate():
+                    flight.publish(chunk)
+                return parse("".join(flight.chunks))
+            # Copy the caller's context so the generation is timed against its request
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(self._run, key, flight, compute),
+                name="advice-stream", daemon=True,
+            ).start()
+        return flight
+
+    def _join(self, key):
+        """(flight, leader): the key's flight in progress, or a new one the caller must run."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        self._count("misses" if leader else "coalesced")
+        return flight, leader
+
+    def _run(self, key, flight, compute):
+        value = error = None
+        try:
+            value = compute()
+            self.set(key, value)
+        except Exception as e:
+            self._count("errors")
+            error = e
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.finish(value, error)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._flights)
+        stats["local_entries"] = len(self.local)
+        stats["persistent"] = self.collection is not None
+        return stats
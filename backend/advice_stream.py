@@ -0,0 +1,101 @@
+"""Incremental parsing of the LLM's JSON advice as it streams in.
+
+The advice prompt asks for one flat JSON object. AdviceStreamParser is fed
+the completion chunk by chunk and hands back each top-level member as soon
+as its value is closed, so a client can render the description before the
+prevention tips have been generated. Text around the object (a code fence,
+a preamble) is skipped.
+"""
+import json
+
+# Advice key -> field of the /api/predict response it fills
+ADVICE_FIELDS = {
+    "description": "medical_advice.description",
+    "treatment_advice": "medical_advice.treatment",
+    "when_to_see_doctor": "medical_advice.when_to_seek_help",
+    "prevention_tips": "medical_advice.prevention",
+    "recommended_medicines": "medication",
+}
+
+
+class AdviceStreamParser:
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._start = None
+        self._member_start = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        """Add text; returns the (key, value) members completed by it."""
+        self.text += chunk
+        completed = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._start is None:
+                if char == "{":
+                    self._start = self._pos
+                    self._member_start = self._pos + 1
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._member(self._pos))
+                    self.done = True
+            elif char == "," and self._depth == 1:
+                completed.extend(self._member(self._pos))
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return completed
+
+    def _member(self, end):
+        member = self.text[self._member_start:end].strip()
+        if not member:
+            return []
+        try:
+            return list(json.loads("{" + member + "}").items())
+        except json.JSONDecodeError:
+            # Left for result() to reject
+            return []
+
+    def result(self):
+        """The whole advice object; raises json.JSONDecodeError if the completion was not valid JSON."""
+        if not self.done:
+            return json.loads(self.text)
+        return json.loads(self.text[self._start:self._pos])
+
+
+def parse_advice(text):
+    """The advice object in a whole completion; raises json.JSONDecodeError if it has none."""
+    parser = AdviceStreamParser()
+    parser.feed(text)
+    return parser.result()
+
+
+def advice_updates(key, value, drugs_for_disease, medicines_source):
+    """(response field, value) pairs for one advice member, as format_prediction would fill them."""
+    field = ADVICE_FIELDS.get(key)
+    if field is None:
+        return []
+    if key == "recommended_medicines":
+        value = value if isinstance(value, dict) else {}
+        value = {
+            "source": value.get("source", medicines_source),
+            "list": value.get("medications", drugs_for_disease),
+        }
+    return [(field, value)]
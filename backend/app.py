@@ -1,134 +1,185 @@
-import base64
+from services import ServiceRegistry, import_module
 from datetime import datetime, timezone
-from io import BytesIO
 import json
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
-import joblib
-import pandas as pd
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from langchain_openai import ChatOpenAI
 import os
-from web3 import Web3
-from pymongo import MongoClient
-from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.backends import default_backend
 from scraping import *
-import qrcode
+from medicine_search import iter_store_results, search_medicines, store_order
+from price_cache import create_price_cache
+from advice_cache import AdviceCache
+from advice_stream import AdviceStreamParser, advice_updates, parse_advice
+from model_artifacts import ModelArtifacts
+from tx_manager import TransactionManager
+from report_projection import CONTRACT_DEPLOY_BLOCK, PROJECTION_SYNC_INTERVAL, ReportProjection
+from http_client import http_get
+from ipfs_metadata import CidMetadataStore
+from patient_names import PatientNameResolver
+from indexes import audit_queries, ensure_indexes, insert_unique, start_index_build
+from sequences import Sequence
+from leases import Lease
+from key_fingerprints import FINGERPRINT_FIELD, backfill_fingerprints, fingerprint_pem
+from crypto_service import CryptoService, ServiceBusy
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, FirstChunk, MongoCommandMetrics, add_span_listener, instrument_flask, render as render_metrics, track
+from profiling import ProfilerBusy, SlowRequestRecorder, capture_slow_requests, format_collapsed, profile_threads
+from report_listing import ListingError, mongo_filter, paginate, parse_listing_options, split_page
 from utils import preprocess_text
-import nltk
+import hmac
+import math
 import ssl
 import sys
+import threading
+import time
+import click
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
-# Configure the language model with error handling
-try:
-    api_key = os.getenv("TOGETHER_API_KEY")
-    if not api_key:
-        raise ValueError("TOGETHER_API_KEY environment variable not set")
-        
-    together_model = ChatOpenAI(
-    base_url="https://api.together.xyz/v1",
-    api_key=os.getenv("TOGETHER_API_KEY"),
-    model="mistralai/Mixtral-8x7B-Instruct-v0.1",
-)
-except Exception as e:
-    print(f"Failed to initialize Together AI client: {str(e)}")
-    sys.exit(1)
-
-# Verify NLTK resources
-try:
-    nltk.data.find('corpora/stopwords')
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    print("NLTK resources missing - attempting to download...")
-    try:
-        nltk.download('stopwords')
-        nltk.download('wordnet')
-    except Exception as e:
-        print(f"Failed to download NLTK resources: {str(e)}")
-        sys.exit(1)
+api = Blueprint("api", __name__, cli_group=None)
 
-# Load model components
-def load_model_with_dependencies():
-    try:
-        model_components = joblib.load('models/disease_predictor.pkl')
-        return (
-            model_components['model'],
-            model_components['vectorizer'],
-            model_components['label_encoder'],
-            pd.read_csv('models/disease_drug_data.csv')
-        )
-    except Exception as e:
-        print(f"Error loading models: {str(e)}")
-        raise
+# Clients, caches and managers are built the first time they are used (see
+# services.py); the module-level names below are proxies that stand in for them
+services = ServiceRegistry()
 
-try:
-    model, vectorizer, label_encoder, medicine_df = load_model_with_dependencies()
-except Exception as e:
-    print(f"Fatal error loading models: {str(e)}")
+# Fail fast on a missing key, even though the client itself is only built on the first LLM call
+if not os.getenv("TOGETHER_API_KEY"):
+    print("Failed to initialize Together AI client: TOGETHER_API_KEY environment variable not set")
     sys.exit(1)
 
-# Load the model components with custom unpickler
-def load_model_with_dependencies():
-    try:
-        # Create a dictionary with the preprocessing function
-        # that will be available during unpickling
-        global preprocess_text
-        
-        # Load the saved model components
-        model_components = joblib.load('models/disease_predictor.pkl')
-        
-        # Extract components
-        model = model_components['model']
-        vectorizer = model_components['vectorizer']
-        label_encoder = model_components['label_encoder']
-        
-        # Load the medicine dataset
-        medicine_df = pd.read_csv('models/disease_drug_data.csv')
-        
-        print("All models and data loaded successfully!")
-        return model, vectorizer, label_encoder, medicine_df
-        
-    except Exception as e:
-        print(f"Error loading models: {str(e)}")
-        raise e
+# Any OpenAI-compatible endpoint serving the model, e.g. a local stand-in for benchmarks
+TOGETHER_BASE_URL = os.getenv("TOGETHER_BASE_URL", "https://api.together.xyz/v1")
 
-# Load models at startup
-model, vectorizer, label_encoder, medicine_df = load_model_with_dependencies()
+@services.factory("llm")
+def create_llm():
+    ChatOpenAI = import_module("langchain_openai").ChatOpenAI
+    return ChatOpenAI(
+        base_url=TOGETHER_BASE_URL,
+        api_key=os.getenv("TOGETHER_API_KEY"),
+        model="mistralai/Mixtral-8x7B-Instruct-v0.1",
+    )
+
+together_model = services.proxy("llm")
+
+# Model components are loaded lazily on first use, from the compiled
+# memory-mapped artifacts when present (see model_artifacts.py)
+artifacts = ModelArtifacts()
 
 # MongoDB setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client.curelink
-documents_collection = db.documents
-users_collection = db.users
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
+MONGO_DB = os.getenv("MONGO_DB", "curelink")
+
+@services.factory("db")
+def connect_mongo():
+    # Looked up at call time so tests can swap in a stand-in client
+    MongoClient = import_module("pymongo").MongoClient
+    return MongoClient(MONGO_URL, event_listeners=[MongoCommandMetrics()])[MONGO_DB]
+
+def collection_service(name):
+    services.register(name, lambda: services.get("db")[name])
+    return services.proxy(name)
+
+db = services.proxy("db")
+documents_collection = collection_service("documents")
+users_collection = collection_service("users")
+hospitals_collection = collection_service("hospitals")
 
 # Blockchain setup
 infura_url = os.getenv("INFURA_URL")
-web3 = Web3(Web3.HTTPProvider(infura_url))
 contract_address = os.getenv("CONTRACT_ADDRESS")
-with open("abi.json", "r") as abi_file:
-    contract_abi = json.load(abi_file)
-contract = web3.eth.contract(address=contract_address, abi=contract_abi)
 
-# Add this near your other MongoDB collection definitions
-hospitals_collection = db.hospitals
+@services.factory("web3")
+def connect_web3():
+    Web3 = import_module("web3").Web3
+
+    class TimedHTTPProvider(Web3.HTTPProvider):
+        def make_request(self, method, params):
+            with track("chain", method):
+                return super().make_request(method, params)
+
+    return Web3(TimedHTTPProvider(infura_url))
+
+@services.factory("contract_abi")
+def load_contract_abi():
+    with open("abi.json", "r") as abi_file:
+        return json.load(abi_file)
+
+@services.factory("contract")
+def load_contract():
+    return services.get("web3").eth.contract(address=contract_address, abi=services.get("contract_abi"))
+
+web3 = services.proxy("web3")
+contract = services.proxy("contract")
+
+# User and hospital IDs come from atomic counters, reserved in blocks per process
+services.register("user_ids", lambda: Sequence(db.counters, "users", services.get("users")))
+services.register("hospital_ids", lambda: Sequence(db.counters, "hospitals", services.get("hospitals")))
+user_ids = services.proxy("user_ids")
+hospital_ids = services.proxy("hospital_ids")
+
+# RSA key generation and QR rendering for registrations, off the request thread
+services.register("crypto_service", CryptoService)
+crypto_service = services.proxy("crypto_service")
+
+def record_added_report(context, receipt):
+    """Save a mined report to MongoDB with its on-chain document ID"""
+    # The ID comes from the transaction's own ReportAdded event; several reports may share a block
+    events = contract.events.ReportAdded().process_receipt(receipt)
+    if not events:
+        raise ValueError("No ReportAdded event in the receipt")
+    document_id = events[0]["args"]["documentId"]
+    # Upserted, so settling the same transaction twice leaves one document
+    documents_collection.update_one(
+        {"patient_id": context["patient_id"], "document_id": document_id},
+        {"$setOnInsert": {**context, "document_id": document_id}},
+        upsert=True
+    )
+
+def record_report_review(context, receipt):
+    """Mirror a mined approval or rejection in MongoDB"""
+    documents_collection.update_one(
+        {
+            "patient_id": context["patient_id"],
+            "document_id": context["document_id"]
+        },
+        {
+            "$set": {
+                "is_approved": context["is_approved"],
+                "is_rejected": context["is_rejected"],
+                "updated_at": datetime.utcnow()
+            }
+        }
+    )
+
+# Contract writes are signed with a locally tracked nonce and confirmed in the background
+@services.factory("tx_manager")
+def create_tx_manager():
+    manager = TransactionManager(services.get("web3"), db.transactions, db.nonces)
+    manager.register_handler("add_report", record_added_report)
+    manager.register_handler("approve_report", record_report_review)
+    manager.register_handler("reject_report", record_report_review)
+    return manager
 
-def get_patient_name(patient_id):
-    """Helper function to get patient name by ID"""
-    patient = users_collection.find_one({"id": patient_id})
-    if patient:
-        return f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip()
-    return "Unknown Patient"
+tx_manager = services.proxy("tx_manager")
+
+# MongoDB read model of on-chain reports, kept current from the contract's events
+services.register("report_projection", lambda: ReportProjection(services.get("web3"), services.get("contract"), services.get("db")))
+report_projection = services.proxy("report_projection")
+
+# Scraped medicine prices, cached per store and normalized search query
+services.register("price_cache", lambda: create_price_cache(services.get("db")))
+price_cache = services.proxy("price_cache")
+
+# Patient display names for report listings, batched and briefly cached
+services.register("patient_names", lambda: PatientNameResolver(services.get("users")))
+patient_names = services.proxy("patient_names")
 
 # Add this route to fetch hospital data
-@app.route("/api/hospital", methods=["GET"])
+@api.route("/api/hospital", methods=["GET"])
 def get_hospital_data():
     try:
         # In a real app, you would get hospital_id from authentication/session
@@ -158,7 +209,7 @@ def get_hospital_data():
         return jsonify({"error": str(e)}), 500
 
 # Add this route for hospital login
-@app.route("/login-hospital", methods=["POST"])
+@api.route("/login-hospital", methods=["POST"])
 def login_hospital():
     try:
         data = request.json
@@ -194,11 +245,10 @@ def login_hospital():
 
 # Add this function near your other ID generation functions
 def generate_hospital_id():
-    last_hospital = hospitals_collection.find_one(sort=[("id", -1)])
-    return (last_hospital["id"] + 1) if last_hospital else 1
+    return hospital_ids.next()
 
 # Add this new route for hospital registration
-@app.route("/register-hospital", methods=["POST"])
+@api.route("/register-hospital", methods=["POST"])
 def register_hospital():
     try:
         data = request.json
@@ -236,8 +286,9 @@ def register_hospital():
             "approved": False  # For admin approval if needed
         }
 
-        # Insert into MongoDB
-        hospitals_collection.insert_one(hospital_doc)
+        # Insert into MongoDB; a concurrent registration may have taken the email since the check
+        if not insert_unique(hospitals_collection, hospital_doc, "email"):
+            return jsonify({"error": "Hospital with this email already exists"}), 400
 
         return jsonify({
             "message": "Hospital registered successfully",
@@ -249,49 +300,27 @@ def register_hospital():
 
 # Function to generate a unique numeric ID
 def generate_unique_id():
-    last_user = users_collection.find_one(sort=[("id", -1)])
-    return (last_user["id"] + 1) if last_user else 1
-
-# Function to generate key pair
-def generate_key_pair():
-    private_key = rsa.generate_private_key(
-        public_exponent=65537, key_size=2048, backend=default_backend())
-    public_key = private_key.public_key()
-    return private_key, public_key
-
-# Function to serialize keys
-def serialize_keys(private_key, public_key):
-    private_key_pem = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.TraditionalOpenSSL,
-        encryption_algorithm=serialization.NoEncryption()
-    )
-    public_key_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
-    return private_key_pem, public_key_pem
-
-# Function to generate a QR code image and return it as a base64 string
-def generate_qr_code(data):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    # Convert the image to a base64-encoded string
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return user_ids.next()
+
+def find_user_by_public_key(public_key_pem, extra_query=None):
+    """Look a user up by the fingerprint of their PEM public key"""
+    fingerprint = fingerprint_pem(public_key_pem)
+    if fingerprint is None:
+        return None
+    user = users_collection.find_one({**(extra_query or {}), FINGERPRINT_FIELD: fingerprint})
+    if user is None:
+        # Users registered before fingerprints existed, until backfill-key-fingerprints has run
+        user = users_collection.find_one({
+            **(extra_query or {}),
+            "public_key": public_key_pem,
+            FINGERPRINT_FIELD: {"$exists": False}
+        })
+        if user is not None:
+            users_collection.update_one({"_id": user["_id"]}, {"$set": {FINGERPRINT_FIELD: fingerprint}})
+    return user
 
 # Register API
-@app.route("/register", methods=["POST"])
+@api.route("/register", methods=["POST"])
 def register_user():
     data = request.json
 
@@ -313,19 +342,17 @@ def register_user():
     if users_collection.find_one({"email": email}):
         return jsonify({"error": "User with this email already exists"}), 400
 
+    # Generate the private/public key pair and the private key's QR code in a worker process
+    try:
+        private_key_str, public_key_pem, qr_code_base64 = crypto_service.registration_keys()
+    except ServiceBusy:
+        return jsonify({"error": "Registration is busy, please retry shortly"}), 503, {"Retry-After": "1"}
+
     # Generate unique numeric ID
     user_id = generate_unique_id()
 
-    # Generate private and public key pair
-    private_key, public_key = generate_key_pair()
-    private_key_pem, public_key_pem = serialize_keys(private_key, public_key)
-
-    # Generate QR code for the private key
-    private_key_str = private_key_pem.decode("utf-8")
-    qr_code_base64 = generate_qr_code(private_key_str)
-
     # Insert user data into the database
-    users_collection.insert_one({
+    inserted = insert_unique(users_collection, {
         "id": user_id,  # Unique numeric ID
         "first_name": first_name,
         "last_name": last_name,
@@ -335,8 +362,12 @@ def register_user():
         "dob": dob,
         "address": address,
         "aadhar": aadhar,
-        "public_key": public_key_pem.decode("utf-8")  # Store only public key in DB
-    })
+        "public_key": public_key_pem,  # Store only public key in DB
+        FINGERPRINT_FIELD: fingerprint_pem(public_key_pem)
+    }, "email")
+    if not inserted:
+        # A concurrent registration took the email since the check above
+        return jsonify({"error": "User with this email already exists"}), 400
 
     # Return private key, user ID, and QR code to the frontend
     return jsonify({
@@ -346,7 +377,7 @@ def register_user():
         "qr_code": qr_code_base64  # Base64-encoded QR code image
     }), 201
 
-@app.route("/login", methods=["POST"])
+@api.route("/login", methods=["POST"])
 def login_user():
     data = request.get_json()
     if not data:
@@ -372,8 +403,8 @@ def login_user():
             format=serialization.PublicFormat.SubjectPublicKeyInfo
         ).decode('utf-8')
 
-        # Find the user in the database using the derived public key
-        user = users_collection.find_one({"public_key": derived_public_key_pem})
+        # Find the user in the database using the derived public key's fingerprint
+        user = find_user_by_public_key(derived_public_key_pem)
         if not user:
             return jsonify({"error": "User not found"}), 404
 
@@ -390,7 +421,7 @@ def login_user():
         return jsonify({"error": "Key validation error", "details": str(e)}), 400
 
 # Upload API (updated for all contract fields)
-@app.route("/upload", methods=["POST"])
+@api.route("/upload", methods=["POST"])
 def upload_document():
     data = request.json
     public_key = data["public_key"]  # Get public key from frontend
@@ -410,19 +441,14 @@ def upload_document():
     
     try:
         # Find patient by public key to get patient_id
-        user = users_collection.find_one({"public_key": public_key})
+        user = find_user_by_public_key(public_key)
         if not user:
             return jsonify({"error": "User not found"}), 404
         
         patient_id = user["id"]
-        account = web3.eth.account.from_key(private_key)
-        sender_address = account.address
 
-        # Get the nonce for the sender address
-        nonce = web3.eth.get_transaction_count(sender_address)
-        
-        # Call the contract function with all fields
-        tx = contract.functions.addReportByDoctor(
+        # Call the contract function with all fields; the nonce is filled in by the tx manager
+        build_tx = lambda params: contract.functions.addReportByDoctor(
             patient_id,
             report_hashes,
             disease,
@@ -434,18 +460,14 @@ def upload_document():
             hospital_id,
             uploaded_date
         ).build_transaction({
-            "from": sender_address,
+            **params,
             "gas": 2000000,
             "gasPrice": web3.to_wei('20', 'gwei'),
-            "nonce": nonce,
         })
-        
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        web3.eth.wait_for_transaction_receipt(tx_hash)
 
-        # Save document details to MongoDB with all fields
-        documents_collection.insert_one({
+        # Returns as soon as the node accepts the transaction; document details
+        # are saved to MongoDB by record_added_report once it is mined
+        tx_hash = tx_manager.submit("add_report", private_key, build_tx, context={
             "patient_id": patient_id,
             "report_hashes": report_hashes,
             "disease": disease,
@@ -458,20 +480,20 @@ def upload_document():
             "uploaded_date": uploaded_date,
             "is_approved": False,
             "is_rejected": False,
-            "added_by_patient": False,
-            "document_id": contract.functions.getCurrentDocumentId().call() - 1  # Get the just-added document ID
+            "added_by_patient": False
         })
 
         return jsonify({
             "message": "Document uploaded successfully",
             "ipfs_hashes": report_hashes,
-            "transaction_hash": tx_hash.hex()
+            "transaction_hash": tx_hash.hex(),
+            "status": "pending"
         }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/add-patient-document", methods=["POST"])
+@api.route("/add-patient-document", methods=["POST"])
 def add_patient_document():
     data = request.json
     patient_id = data.get("patient_id")
@@ -500,14 +522,8 @@ def add_patient_document():
         
         hospital_id = hospital["id"]
 
-        account = web3.eth.account.from_key(private_key)
-        sender_address = account.address
-
-        # Get the nonce for the sender address
-        nonce = web3.eth.get_transaction_count(sender_address)
-
         # Build the transaction with all fields
-        tx = contract.functions.addReportByPatient(
+        build_tx = lambda params: contract.functions.addReportByPatient(
             int(patient_id),
             report_hashes,
             disease,
@@ -519,19 +535,13 @@ def add_patient_document():
             int(hospital_id),
             uploaded_date
         ).build_transaction({
-            "from": sender_address,
+            **params,
             "gas": 2000000,
             "gasPrice": web3.to_wei('20', 'gwei'),
-            "nonce": nonce,
         })
 
-        # Sign and send the transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        web3.eth.wait_for_transaction_receipt(tx_hash)
-
-        # Save document details to MongoDB
-        documents_collection.insert_one({
+        # Sign and send the transaction; document details are saved to MongoDB once it is mined
+        tx_hash = tx_manager.submit("add_report", private_key, build_tx, context={
             "patient_id": patient_id,
             "report_hashes": report_hashes,
             "disease": disease,
@@ -544,21 +554,21 @@ def add_patient_document():
             "uploaded_date": uploaded_date,
             "is_approved": True,
             "is_rejected": False,
-            "added_by_patient": True,
-            "document_id": contract.functions.getCurrentDocumentId().call() - 1
+            "added_by_patient": True
         })
 
         return jsonify({
             "message": "Document added successfully by patient",
             "transaction_hash": tx_hash.hex(),
-            "ipfs_hashes": report_hashes
+            "ipfs_hashes": report_hashes,
+            "status": "pending"
         }), 201
 
     except Exception as e:
         print(str(e))
         return jsonify({"error": str(e)}), 500
      
-@app.route('/approve-report', methods=['POST'])
+@api.route('/approve-report', methods=['POST'])
 def approve_report():
     try:
         data = request.json
@@ -573,50 +583,33 @@ def approve_report():
         if not private_key:
             return jsonify({"error": "Private key not found"}), 400
 
-        account = web3.eth.account.from_key(private_key)
-        sender_address = account.address
-
-        nonce = web3.eth.get_transaction_count(sender_address)
-
-        tx = contract.functions.approveReport(
+        build_tx = lambda params: contract.functions.approveReport(
             int(patient_id),
             int(document_id)
         ).build_transaction({
-            "from": sender_address,
+            **params,
             "gas": 200000,
             "gasPrice": web3.to_wei('20', 'gwei'),
-            "nonce": nonce,
         })
 
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-
-        # Update MongoDB
-        update_result = documents_collection.update_one(
-            {
-                "patient_id": int(patient_id),
-                "document_id": int(document_id) - 1
-            },
-            {
-                "$set": {
-                    "is_approved": True,
-                    "is_rejected": False,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-
+        # MongoDB is updated by record_report_review once the transaction is mined
+        tx_hash = tx_manager.submit("approve_report", private_key, build_tx, context={
+            "patient_id": int(patient_id),
+            "document_id": int(document_id) - 1,
+            "is_approved": True,
+            "is_rejected": False
+        })
 
         return jsonify({
             "message": "Report approved successfully",
-            "transaction_hash": tx_hash.hex()
+            "transaction_hash": tx_hash.hex(),
+            "status": "pending"
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/reject-report', methods=['POST'])
+@api.route('/reject-report', methods=['POST'])
 def reject_report():
     try:
         data = request.json
@@ -631,64 +624,208 @@ def reject_report():
         if not private_key:
             return jsonify({"error": "Private key not found"}), 400
 
-        account = web3.eth.account.from_key(private_key)
-        sender_address = account.address
-
-        nonce = web3.eth.get_transaction_count(sender_address)
-
-        tx = contract.functions.rejectReport(
+        build_tx = lambda params: contract.functions.rejectReport(
             int(patient_id),
             int(document_id)
         ).build_transaction({
-            "from": sender_address,
+            **params,
             "gas": 200000,
             "gasPrice": web3.to_wei('20', 'gwei'),
-            "nonce": nonce,
         })
 
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-
-        # Update MongoDB
-        update_result = documents_collection.update_one(
-            {
-                "patient_id": int(patient_id),
-                "document_id": int(document_id)
-            },
-            {
-                "$set": {
-                    "is_approved": False,
-                    "is_rejected": True,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-
+        # MongoDB is updated by record_report_review once the transaction is mined
+        tx_hash = tx_manager.submit("reject_report", private_key, build_tx, context={
+            "patient_id": int(patient_id),
+            "document_id": int(document_id),
+            "is_approved": False,
+            "is_rejected": True
+        })
 
         return jsonify({
             "message": "Report rejected successfully",
-            "transaction_hash": tx_hash.hex()
+            "transaction_hash": tx_hash.hex(),
+            "status": "pending"
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def get_file_details(cid):
+def normalize_tx_hash(tx_hash):
+    if not tx_hash.startswith("0x"):
+        tx_hash = "0x" + tx_hash
+    return tx_hash.lower()
+
+def format_tx_status(tx):
+    return {
+        "transaction_hash": tx["_id"],
+        "kind": tx["kind"],
+        "status": tx["status"],
+        "block_number": tx.get("block_number"),
+        "gas_used": tx.get("gas_used"),
+        "error": tx.get("error"),
+        "submitted_at": tx["submitted_at"],
+        "updated_at": tx["updated_at"]
+    }
+
+@api.route("/tx-status/<tx_hash>", methods=["GET"])
+def tx_status(tx_hash):
+    try:
+        tx = tx_manager.status(normalize_tx_hash(tx_hash))
+        if not tx:
+            return jsonify({"error": "Transaction not found"}), 404
+
+        return jsonify(format_tx_status(tx)), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def load_reports(options, patient_id=None, hospital_id=None):
+    """One page of a patient's or hospital's reports as (reports, next_cursor, freshness).
+
+    reports is None if the chain is unreachable. Filters and paging are run
+    in MongoDB when the projection is current, otherwise on the chain's list.
+    """
+    try:
+        watermark = report_projection.fresh_watermark()
+    except Exception as e:
+        print(f"Report projection unavailable: {str(e)}")
+        watermark = None
+
+    if watermark:
+        owner = {"patient_id": patient_id} if patient_id is not None else {"hospital_id": hospital_id}
+        limit = options["limit"]
+        # One extra row tells whether there is a next page
+        reports = report_projection.find_reports(
+            owner, mongo_filter(options), options["after"], limit + 1 if limit else None
+        )
+        reports, next_cursor = split_page(reports, limit)
+        return reports, next_cursor, {"source": "projection", "as_of_block": watermark["block"]}
+
+    if not web3.is_connected():
+        return None, None, {"source": "chain"}
+
+    if patient_id is not None:
+        reports_json = contract.functions.getReports(patient_id).call()
+    else:
+        reports_json = contract.functions.getReportsByHospitalId(hospital_id).call()
+
+    # Parse the JSON string returned by the contract
+    if not reports_json or reports_json == "[]":
+        return [], None, {"source": "chain"}
+    reports, next_cursor = paginate(json.loads(reports_json), options)
+    return reports, next_cursor, {"source": "chain"}
+
+def fetch_pinata_file(cid):
+    """File metadata Pinata holds for a CID, or None when it has no such file."""
     url = "https://api.pinata.cloud/v3/files/public"
     querystring = {"cid": cid}
     headers = {"Authorization": f"Bearer {os.getenv('PINATA_JWT')}"}
 
-    try:
-        response = requests.get(url, headers=headers, params=querystring)
+    with track("pinata", "file_lookup"):
+        response = http_get(url, headers=headers, params=querystring)
         response.raise_for_status()
-        data = response.json()
-        return data["data"]["files"][0]["name"]
-    except Exception as e:
-        print(f"Error fetching file details for CID {cid}: {str(e)}")
-        return "Unknown"
+    files = response.json()["data"]["files"]
+    return files[0] if files else None
+
+# CID -> file metadata, shared across workers through MongoDB
+CID_RESOLVE_MAX = int(os.getenv("CID_RESOLVE_MAX", "500"))
+services.register("cid_store", lambda: CidMetadataStore(db.cid_metadata, fetch_pinata_file))
+cid_store = services.proxy("cid_store")
+
+def ipfs_file_url(ipfs_hash):
+    return f"https://magenta-glamorous-silverfish-702.mypinata.cloud/ipfs/{ipfs_hash}?pinataGatewayToken=aMhZLFDXoAnaPBLjmo98KI89cumJQ5K7i_7xh5p49rS853TVXXJIEINrc_1-pYZv"
+
+def format_file_details(report_hashes, file_names):
+    return [
+        {
+            "file_name": file_names.get(ipfs_hash, "Unknown"),
+            "file_url": ipfs_file_url(ipfs_hash),
+            "ipfs_hash": ipfs_hash
+        }
+        for ipfs_hash in report_hashes
+    ]
+
+def format_reports(reports, fields=None, patient_id=None):
+    """Response rows for a page of reports, only resolving file and patient names when requested."""
+    wanted = lambda field: fields is None or field in fields
+    file_names = {}
+    if wanted("file_details"):
+        # Resolve the file names of every report in one batch
+        file_names = cid_store.resolve_names(
+            ipfs_hash for report in reports for ipfs_hash in report["reportHashes"]
+        )
+    names = {}
+    if wanted("patient_name"):
+        # One users query for all patients in the page
+        names = patient_names.names_for(
+            patient_id if patient_id is not None else int(report["patientId"]) for report in reports
+        )
+
+    formatted_documents = []
+    for report in reports:
+        report_patient_id = patient_id if patient_id is not None else report["patientId"]
+        formatted_document = {
+            "document_id": report["documentId"],
+            "patient_id": report_patient_id,
+            "patient_name": names.get(int(report_patient_id)),
+            "file_details": format_file_details(report["reportHashes"], file_names),
+            "hospital_id": report["hospitalId"],
+            "doctor_name": report["doctorName"],
+            "is_approved": report["isApproved"],
+            "is_rejected": report["isRejected"],
+            "added_by_patient": report["addedByPatient"],
+            "disease": report["disease"],
+            "hospital_name": report["hospital"],
+            "medication": report["medication"],
+            "treatment_date": report["treatmentDate"],
+            "summary": report["summary"],
+            "uploaded_date": report["uploadedDate"],
+            "report_hashes": report["reportHashes"]
+        }
+        if fields is not None:
+            formatted_document = {key: value for key, value in formatted_document.items() if key in fields}
+        formatted_documents.append(formatted_document)
+    return formatted_documents
+
+def report_listing_response(reports, next_cursor, freshness, options, patient_id=None, hospital_id=None):
+    """(body, status) of /get-documents (patient_id given) or /get-hospital-reports (hospital_id given)"""
+    if reports is None:
+        return {"error": "Failed to connect to blockchain"}, 500
+
+    if options["limit"]:
+        freshness["next_cursor"] = next_cursor
+
+    if patient_id is not None:
+        if not reports:
+            return {"message": "No documents found for this patient", "documents": [], **freshness}, 200
+        return {
+            "message": "Documents retrieved successfully",
+            "documents": format_reports(reports, options["fields"], patient_id=patient_id),
+            **freshness
+        }, 200
+
+    if not reports:
+        return {"message": "No reports found for this hospital", "documents": [], **freshness}, 200
+    return {
+        "message": "Hospital reports retrieved successfully",
+        "hospital_id": hospital_id,
+        "documents": format_reports(reports, options["fields"]),
+        **freshness
+    }, 200
+
+@api.route("/resolve-cids", methods=["POST"])
+def resolve_cids():
+    data = request.get_json()
+    if not data or not isinstance(data.get("cids"), list):
+        return jsonify({"error": "cids must be a list"}), 400
+    if len(data["cids"]) > CID_RESOLVE_MAX:
+        return jsonify({"error": f"At most {CID_RESOLVE_MAX} CIDs per request"}), 400
 
-@app.route("/get-documents", methods=["POST"])
+    cids = [str(cid) for cid in data["cids"]]
+    file_names = cid_store.resolve_names(cids)
+    return jsonify({"files": format_file_details(cids, file_names)}), 200
+
+@api.route("/get-documents", methods=["POST"])
 def get_documents():
     data = request.get_json()
     if not data:
@@ -699,63 +836,17 @@ def get_documents():
         return jsonify({"error": "patient_id is required"}), 400
 
     try:
-        if not web3.is_connected():
-            return jsonify({"error": "Failed to connect to blockchain"}), 500
-
         patient_id = int(patient_id)  # Ensure integer
 
-        # Call the getReports function from the contract
-        reports_json = contract.functions.getReports(patient_id).call()
-        
-        if not reports_json or reports_json == "[]":
-            return jsonify({"message": "No documents found for this patient", "documents": []}), 200
-
-        # Parse the JSON string into a list of dictionaries
-        reports = json.loads(reports_json)
-        
-        formatted_documents = []
-        for report in reports:
-            # Get file details for each report hash
-            file_details = []
-            for ipfs_hash in report["reportHashes"]:
-                try:
-                    file_name = get_file_details(ipfs_hash)
-                    file_url = f"https://magenta-glamorous-silverfish-702.mypinata.cloud/ipfs/{ipfs_hash}?pinataGatewayToken=aMhZLFDXoAnaPBLjmo98KI89cumJQ5K7i_7xh5p49rS853TVXXJIEINrc_1-pYZv"
-                    file_details.append({
-                        "file_name": file_name,
-                        "file_url": file_url,
-                        "ipfs_hash": ipfs_hash
-                    })
-                except Exception as e:
-                    print(f"Error processing IPFS hash {ipfs_hash}: {str(e)}")
-                    continue
-
-            # Format the report with all fields from contract
-            formatted_document = {
-                "document_id": report["documentId"],
-                "patient_id": patient_id,
-                "patient_name": get_patient_name(int(patient_id)),
-                "file_details": file_details,
-                "hospital_id": report["hospitalId"],
-                "doctor_name": report["doctorName"],
-                "is_approved": report["isApproved"],
-                "is_rejected": report["isRejected"],
-                "added_by_patient": report["addedByPatient"],
-                "disease": report["disease"],
-                "hospital_name": report["hospital"],
-                "medication": report["medication"],
-                "treatment_date": report["treatmentDate"],
-                "summary": report["summary"],
-                "uploaded_date": report["uploadedDate"],
-                "report_hashes": report["reportHashes"]
-            }
-            
-            formatted_documents.append(formatted_document)
+        try:
+            options = parse_listing_options(data)
+        except ListingError as le:
+            return jsonify({"error": str(le)}), 400
 
-        return jsonify({
-            "message": "Documents retrieved successfully",
-            "documents": formatted_documents
-        }), 200
+        # Serve from the MongoDB projection when it is current, otherwise call getReports
+        reports, next_cursor, freshness = load_reports(options, patient_id=patient_id)
+        body, status = report_listing_response(reports, next_cursor, freshness, options, patient_id=patient_id)
+        return jsonify(body), status
 
     except ValueError as ve:
         return jsonify({"error": f"Invalid patient ID format: {str(ve)}"}), 400
@@ -764,41 +855,93 @@ def get_documents():
         return jsonify({"error": f"Failed to retrieve documents: {str(e)}"}), 500
       
 # Other APIs (unchanged)
-@app.route("/fetch-medicines", methods=["POST"])
+@api.route("/fetch-medicines", methods=["POST"])
 def fetch_medicine():
     try:
         data = request.get_json()
         search = data.get("search")
 
-        one_mg_data = one_mg(str(search).replace(" ","%20").strip())
-        apollopharmacy_data = apollopharmacy(str(search))
-        pharmeasy_data = pharmeasy(str(search).replace(" ","%20").strip())
-        
-        # Create a list of results with consistent structure
-        results = []
-        
-        if one_mg_data:
-            one_mg_data["price"] = int(str(one_mg_data["price"]).replace("₹",""))
-            one_mg_data['store'] = '1mg'
-            results.append(one_mg_data)
-            
-        if apollopharmacy_data:
-            apollopharmacy_data['store'] = 'Apollo Pharmacy'
-            results.append(apollopharmacy_data)
-            
-        if pharmeasy_data:
-            pharmeasy_data['store'] = 'PharmEasy'
-            results.append(pharmeasy_data)
+        # Query all stores concurrently; slow or failing stores are reported, not fatal
+        results, stores = search_medicines(search, cache=price_cache)
         
         return jsonify({
             "success": True,
-            "results": results
+            "results": results,
+            "stores": stores
         }), 200
     except Exception as e:
         print(str(e))
         return jsonify({"success": False, "message": str(e)}), 500
 
-@app.route("/hello-world", methods=["GET"])
+def sse_event(event, data):
+    """One Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    # No-buffering hint for nginx, so each event reaches the client as it is sent
+    return Response(stream_with_context(events), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+class StoreEvents:
+    """The events of /fetch-medicines/stream, built the same for app.py's route and asgi.py's."""
+
+    def __init__(self):
+        self.settled = []
+
+    def store(self, result, status):
+        self.settled.append((result, status))
+        return sse_event("store", {**status, "result": result})
+
+    def summary(self):
+        results, stores = store_order(self.settled)
+        return sse_event("summary", {"success": True, "results": results, "stores": stores})
+
+    @staticmethod
+    def error(e):
+        print(str(e))
+        return sse_event("error", {"success": False, "message": str(e)})
+
+@api.route("/fetch-medicines/stream", methods=["GET", "POST"])
+def fetch_medicine_stream():
+    """/fetch-medicines as Server-Sent Events: one "store" event per store as it settles, then "summary".
+
+    GET takes ?search= (for EventSource); POST takes the same JSON body as /fetch-medicines.
+    The summary carries the same results and stores as the non-streaming response.
+    """
+    if request.method == "GET":
+        search = request.args.get("search")
+    else:
+        data = request.get_json(silent=True) or {}
+        search = data.get("search")
+    if not search:
+        return jsonify({"success": False, "message": "search is required"}), 400
+
+    def events():
+        stream = StoreEvents()
+        try:
+            for result, status in iter_store_results(search, cache=price_cache):
+                yield stream.store(result, status)
+            yield stream.summary()
+        except Exception as e:
+            yield stream.error(e)
+
+    return sse_response(events())
+
+@api.route("/fetch-medicines/cache-stats", methods=["GET"])
+def medicine_cache_stats():
+    try:
+        return jsonify(price_cache.stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/api/model-info", methods=["GET"])
+def model_info():
+    # Which artifact format is in use and how long each component took to load
+    return jsonify(artifacts.status()), 200
+
+@api.route("/hello-world", methods=["GET"])
 def hello_world():
     try:
         # Call the getHelloWorld function from the contract
@@ -807,40 +950,21 @@ def hello_world():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/predict', methods=['POST'])
-def predict():
-    # Get the input sentence from the request
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No JSON data received"}), 400
-    
-    input_sentence = data.get('symptoms', '')
-
-    # Check if the input sentence is empty
-    if not input_sentence:
-        return jsonify({"error": "Input sentence is required"}), 400
-
-    try:
-        # Preprocess the input text
-        processed_text = preprocess_text(input_sentence)
-        
-        # Transform the input sentence using the TF-IDF vectorizer
-        transformed_input = vectorizer.transform([processed_text])
+# Bump whenever the advice prompt changes so cached completions are not reused
+ADVICE_PROMPT_VERSION = 1
 
-        # Predict the disease using the trained model
-        predicted_encoded = model.predict(transformed_input)[0]
-        predicted_disease = label_encoder.inverse_transform([predicted_encoded])[0]
+# LLM advice per predicted disease, persisted in MongoDB and shared across workers
+services.register("advice_cache", lambda: AdviceCache(db.advice_cache))
+advice_cache = services.proxy("advice_cache")
 
-        # Retrieve medicines for the predicted disease
-        if predicted_disease in medicine_df['disease'].values:
-            drugs_for_disease = medicine_df[medicine_df['disease'] == predicted_disease]['drug'].tolist()
-            medicines_source = "from our database"
-        else:
-            drugs_for_disease = []
-            medicines_source = "based on general medical knowledge"
+def get_drugs_for_disease(predicted_disease):
+    """Helper function returning (drugs, source description) for a disease"""
+    if predicted_disease in artifacts.drug_index:
+        return artifacts.drug_index.drugs_for(predicted_disease), "from our database"
+    return [], "based on general medical knowledge"
 
-        # Generate a detailed response using the language model
-        prompt = f"""
+def build_advice_prompt(predicted_disease, drugs_for_disease, medicines_source):
+    return f"""
         Act as an expert doctor providing information about {predicted_disease}.
         {f"Recommended medicines from our database: {', '.join(drugs_for_disease)}" if drugs_for_disease else "No specific medications found in our database. Please suggest appropriate medications based on your medical knowledge."}
         
@@ -858,53 +982,409 @@ def predict():
         }}
         """
 
+def generate_advice(predicted_disease, drugs_for_disease, medicines_source):
+    """Ask the language model for advice; raises json.JSONDecodeError on unparseable output"""
+    prompt = build_advice_prompt(predicted_disease, drugs_for_disease, medicines_source)
+    with track("llm", "advice"):
         ai_response = together_model.invoke(prompt).content
+    # Parsed as the streaming path does, so both accept the same completions
+    return parse_advice(ai_response)
+
+def stream_advice_text(predicted_disease, drugs_for_disease, medicines_source):
+    """generate_advice's completion, yielded chunk by chunk as the model writes it"""
+    prompt = build_advice_prompt(predicted_disease, drugs_for_disease, medicines_source)
+    first_token = FirstChunk("llm", "advice_first_token")
+    with track("llm", "advice_stream"):
+        for chunk in together_model.stream(prompt):
+            first_token()
+            yield chunk.content
+
+def get_advice(predicted_disease, drugs_for_disease, medicines_source):
+    """Cached advice for a disease; concurrent requests for the same disease share one LLM call"""
+    return advice_cache.get_or_compute(
+        AdviceCache.key(ADVICE_PROMPT_VERSION, predicted_disease),
+        lambda: generate_advice(predicted_disease, drugs_for_disease, medicines_source)
+    )
+
+@api.route('/api/predict', methods=['POST'])
+def predict():
+    # Get the input sentence from the request
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON data received"}), 400
+    
+    input_sentence = data.get('symptoms', '')
+
+    # Check if the input sentence is empty
+    if not input_sentence:
+        return jsonify({"error": "Input sentence is required"}), 400
+
+    try:
+        predicted_disease = classify_symptoms(input_sentence)
+
+        # Retrieve medicines for the predicted disease
+        drugs_for_disease, medicines_source = get_drugs_for_disease(predicted_disease)
 
         try:
-            # Parse the AI response to ensure it's valid JSON
-            parsed_advice = json.loads(ai_response)
+            parsed_advice = get_advice(predicted_disease, drugs_for_disease, medicines_source)
         except json.JSONDecodeError:
-            # Fallback if the AI response isn't valid JSON
-            parsed_advice = {
-                "description": "Could not parse detailed medical advice",
-                "recommended_medicines": {
-                    "source": medicines_source,
-                    "medications": drugs_for_disease if drugs_for_disease else ["Consult a doctor for appropriate medications"]
-                },
-                "treatment_advice": "Please consult a healthcare professional for treatment options",
-                "when_to_see_doctor": "If symptoms persist or worsen, seek medical attention",
-                "prevention_tips": "Maintain a healthy lifestyle with proper diet and exercise"
-            }
+            # Fallback if the AI response isn't valid JSON (not cached, so the next request retries)
+            parsed_advice = fallback_advice(drugs_for_disease, medicines_source)
 
-        # Format the complete response
-        response = {
-            "diagnosis": {
-                "disease": predicted_disease,
-                "confidence": "High"  # Could be calculated from model probabilities if available
-            },
-            "medication": {
-                "source": parsed_advice.get("recommended_medicines", {}).get("source", medicines_source),
-                "list": parsed_advice.get("recommended_medicines", {}).get("medications", drugs_for_disease)
-            },
-            "medical_advice": {
-                "description": parsed_advice.get("description", ""),
-                "treatment": parsed_advice.get("treatment_advice", ""),
-                "when_to_seek_help": parsed_advice.get("when_to_see_doctor", ""),
-                "prevention": parsed_advice.get("prevention_tips", "")
-            },
-            "disclaimer": "This information is not a substitute for professional medical advice. Always consult a healthcare provider for diagnosis and treatment."
-        }
+        return jsonify(format_prediction(predicted_disease, drugs_for_disease, medicines_source, parsed_advice))
+
+    except Exception as e:
+        return jsonify({
+            "error": "An error occurred during prediction",
+            "details": str(e)
+        }), 500
+
+@api.route('/api/predict/stream', methods=['POST'])
+def predict_stream():
+    """/api/predict as Server-Sent Events.
 
-        return jsonify(response)
+    "diagnosis" carries the classifier's result and our database's medicines
+    straight away; each "advice" event fills one response field as soon as the
+    model has finished writing it; "complete" is the body /api/predict returns.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No JSON data received"}), 400
 
+    input_sentence = data.get('symptoms', '')
+    if not input_sentence:
+        return jsonify({"error": "Input sentence is required"}), 400
+
+    try:
+        predicted_disease = classify_symptoms(input_sentence)
+        drugs_for_disease, medicines_source = get_drugs_for_disease(predicted_disease)
     except Exception as e:
         return jsonify({
             "error": "An error occurred during prediction",
             "details": str(e)
         }), 500
-        
-        
-@app.route("/fetch-user-details", methods=["POST"])
+
+    def events():
+        stream = PredictionEvents(predicted_disease, drugs_for_disease, medicines_source)
+        yield stream.diagnosis()
+        try:
+            # Shares the LLM call with concurrent requests for the same disease, streamed or not
+            flight = advice_cache.stream(
+                AdviceCache.key(ADVICE_PROMPT_VERSION, predicted_disease),
+                lambda: stream_advice_text(predicted_disease, drugs_for_disease, medicines_source),
+                parse_advice,
+            )
+            for text in flight.follow():
+                yield from stream.text(text)
+            try:
+                parsed_advice = flight.result()
+            except json.JSONDecodeError:
+                parsed_advice = None
+            else:
+                yield from stream.advice(parsed_advice)
+            yield stream.complete(parsed_advice)
+        except Exception as e:
+            yield stream.error(e)
+
+    return sse_response(events())
+
+class PredictionEvents:
+    """The events of /api/predict/stream, built the same for app.py's route and asgi.py's."""
+
+    def __init__(self, predicted_disease, drugs_for_disease, medicines_source):
+        self.predicted_disease = predicted_disease
+        self.drugs_for_disease = drugs_for_disease
+        self.medicines_source = medicines_source
+        self.parser = AdviceStreamParser()
+        self.sent = set()
+
+    def diagnosis(self):
+        prediction = format_prediction(self.predicted_disease, self.drugs_for_disease, self.medicines_source, {})
+        return sse_event("diagnosis", {"diagnosis": prediction["diagnosis"], "medication": prediction["medication"]})
+
+    def _advice(self, members):
+        events = []
+        for name, value in members:
+            self.sent.add(name)
+            for field, update in advice_updates(name, value, self.drugs_for_disease, self.medicines_source):
+                events.append(sse_event("advice", {"field": field, "value": update}))
+        return events
+
+    def text(self, chunk):
+        """The "advice" events for the fields the next chunk of the completion finishes."""
+        return self._advice(self.parser.feed(chunk))
+
+    def advice(self, parsed_advice):
+        """The "advice" events for the fields of the finished advice not already streamed.
+
+        All of them when the advice came from the cache, or from a call that
+        was not streamed.
+        """
+        return self._advice((name, value) for name, value in parsed_advice.items() if name not in self.sent)
+
+    def complete(self, parsed_advice):
+        # Same fallback as /api/predict, and likewise not cached
+        if parsed_advice is None:
+            parsed_advice = fallback_advice(self.drugs_for_disease, self.medicines_source)
+        return sse_event("complete", format_prediction(self.predicted_disease, self.drugs_for_disease, self.medicines_source, parsed_advice))
+
+    @staticmethod
+    def error(e):
+        return sse_event("error", {"error": "An error occurred during prediction", "details": str(e)})
+
+def classify_symptoms(input_sentence):
+    # Preprocess the input text
+    processed_text = preprocess_text(input_sentence)
+    
+    # Transform the input sentence using the TF-IDF vectorizer
+    with track("model", "vectorize"):
+        transformed_input = artifacts.vectorizer.transform([processed_text])
+
+    # Predict the disease using the trained model
+    with track("model", "predict"):
+        predicted_encoded = artifacts.model.predict(transformed_input)[0]
+    return artifacts.label_encoder.inverse_transform([predicted_encoded])[0]
+
+def fallback_advice(drugs_for_disease, medicines_source):
+    return {
+        "description": "Could not parse detailed medical advice",
+        "recommended_medicines": {
+            "source": medicines_source,
+            "medications": drugs_for_disease if drugs_for_disease else ["Consult a doctor for appropriate medications"]
+        },
+        "treatment_advice": "Please consult a healthcare professional for treatment options",
+        "when_to_see_doctor": "If symptoms persist or worsen, seek medical attention",
+        "prevention_tips": "Maintain a healthy lifestyle with proper diet and exercise"
+    }
+
+def format_prediction(predicted_disease, drugs_for_disease, medicines_source, parsed_advice):
+    # Format the complete response
+    return {
+        "diagnosis": {
+            "disease": predicted_disease,
+            "confidence": "High"  # Could be calculated from model probabilities if available
+        },
+        "medication": {
+            "source": parsed_advice.get("recommended_medicines", {}).get("source", medicines_source),
+            "list": parsed_advice.get("recommended_medicines", {}).get("medications", drugs_for_disease)
+        },
+        "medical_advice": {
+            "description": parsed_advice.get("description", ""),
+            "treatment": parsed_advice.get("treatment_advice", ""),
+            "when_to_seek_help": parsed_advice.get("when_to_see_doctor", ""),
+            "prevention": parsed_advice.get("prevention_tips", "")
+        },
+        "disclaimer": "This information is not a substitute for professional medical advice. Always consult a healthcare provider for diagnosis and treatment."
+    }
+
+# Upper bound on symptom texts accepted by a single batch request
+PREDICT_BATCH_MAX = int(os.getenv("PREDICT_BATCH_MAX", "500"))
+
+@api.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON data received"}), 400
+
+    texts = data.get('symptoms')
+    if not isinstance(texts, list) or not texts:
+        return jsonify({"error": "symptoms must be a non-empty list of strings"}), 400
+    if len(texts) > PREDICT_BATCH_MAX:
+        return jsonify({"error": f"At most {PREDICT_BATCH_MAX} symptom texts per batch"}), 400
+
+    try:
+        # Empty or non-string items get an error entry instead of failing the batch
+        valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+        results = [{"index": i, "error": "Input sentence is required"} for i in range(len(texts))]
+
+        if valid:
+            # One preprocessing pass, one sparse transform and one model call for the whole batch
+            processed = [preprocess_text(texts[i]) for i in valid]
+            with track("model", "vectorize_batch"):
+                matrix = artifacts.vectorizer.transform(processed)
+            with track("model", "predict_batch"):
+                probabilities = artifacts.model.predict_proba(matrix)
+            best = probabilities.argmax(axis=1)
+            diseases = artifacts.label_encoder.inverse_transform(artifacts.model.classes_[best])
+            confidences = probabilities[range(len(valid)), best]
+
+            drugs_by_disease = {}
+            for i, disease, confidence in zip(valid, diseases, confidences):
+                if disease not in drugs_by_disease:
+                    drugs_by_disease[disease] = get_drugs_for_disease(disease)[0]
+                drugs = drugs_by_disease[disease]
+                results[i] = {
+                    "index": i,
+                    "diagnosis": {
+                        "disease": disease,
+                        "confidence": round(float(confidence), 4)
+                    },
+                    "medication": {
+                        "source": "from our database" if drugs else "based on general medical knowledge",
+                        "list": drugs
+                    }
+                }
+
+        return jsonify({
+            "count": len(results),
+            "results": results,
+            "disclaimer": "This information is not a substitute for professional medical advice. Always consult a healthcare provider for diagnosis and treatment."
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "error": "An error occurred during prediction",
+            "details": str(e)
+        }), 500
+
+
+@api.route('/api/drug-diseases', methods=['GET'])
+def drug_diseases():
+    drug = request.args.get("drug", "").strip()
+    if not drug:
+        return jsonify({"error": "drug is required"}), 400
+
+    diseases = artifacts.drug_index.diseases_for(drug)
+    if not diseases:
+        return jsonify({"error": "Drug not found"}), 404
+
+    return jsonify({
+        "drug": artifacts.drug_index.drug_name(drug),
+        "diseases": diseases
+    }), 200
+
+@api.cli.command("prewarm-advice")
+@click.option("--workers", default=4, show_default=True, help="Concurrent LLM calls")
+@click.option("--limit", default=0, help="Only warm the first N diseases (0 = all)")
+def prewarm_advice(workers, limit):
+    """Fill the advice cache for every disease the label encoder knows."""
+    diseases = list(artifacts.label_encoder.classes_)
+    if limit:
+        diseases = diseases[:limit]
+
+    def warm(disease):
+        drugs_for_disease, medicines_source = get_drugs_for_disease(disease)
+        try:
+            get_advice(disease, drugs_for_disease, medicines_source)
+            return True
+        except Exception as e:
+            print(f"Failed to warm advice for {disease}: {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        warmed = sum(executor.map(warm, diseases))
+    print(f"Warmed advice for {warmed}/{len(diseases)} diseases")
+    print(advice_cache.stats())
+
+
+@api.cli.command("ensure-indexes")
+def ensure_indexes_command():
+    """Build the declared MongoDB indexes (existing ones are left as they are)."""
+    failed = False
+    for collection_name, built in ensure_indexes(db).items():
+        for name, error in built:
+            print(f"{collection_name}.{name}: {'FAILED - ' + error if error else 'ok'}")
+            failed = failed or bool(error)
+    if failed:
+        sys.exit(1)
+
+
+@api.cli.command("backfill-key-fingerprints")
+@click.option("--batch-size", default=500, show_default=True, help="Updates per bulk write")
+def backfill_key_fingerprints(batch_size):
+    """Add public-key fingerprints to users registered before they existed."""
+    updated, skipped = backfill_fingerprints(users_collection, batch_size)
+    print(f"Added fingerprints to {updated} users ({skipped} unparseable public keys skipped)")
+
+
+@api.cli.command("audit-queries")
+def audit_queries_command():
+    """Explain every query shape the API issues and flag collection scans."""
+    collscans = 0
+    for row in audit_queries(db):
+        flag = "COLLSCAN" if row["collscan"] else "ok"
+        print(f"{flag:9} {row['collection']:13} {row['caller']:28} {' <- '.join(row['stages'])}")
+        collscans += row["collscan"]
+    print(f"{collscans} quer{'y' if collscans == 1 else 'ies'} scanning a whole collection")
+    if collscans:
+        sys.exit(1)
+
+
+@api.route("/register/crypto-stats", methods=["GET"])
+def crypto_stats():
+    return jsonify(crypto_service.stats()), 200
+
+
+@api.route("/metrics", methods=["GET"])
+def metrics():
+    """Route and dependency latency histograms, error counts and in-flight gauges for Prometheus."""
+    return render_metrics(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
+
+
+@api.route("/api/startup-report", methods=["GET"])
+def startup_report():
+    """Boot time, lazily imported modules and when each service was first built."""
+    return jsonify(services.startup_report()), 200
+
+
+@api.cli.command("startup-report")
+@click.option("--init-all", is_flag=True, help="Build every service now, to time each one's init")
+def startup_report_command(init_all):
+    """Print the startup profile of this process."""
+    if init_all:
+        for name in services.startup_report()["not_initialized"]:
+            services.get(name)
+    print(json.dumps(services.startup_report(), indent=2))
+
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Requests slower than SLOW_REQUEST_MS, with their stack samples and dependency spans
+slow_requests = SlowRequestRecorder()
+add_span_listener(slow_requests.record_span)
+
+def admin_denied():
+    """A 403 response unless the request carries the configured X-Admin-Token."""
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        return jsonify({"error": "Admin token required"}), 403
+    return None
+
+
+@api.route("/admin/profile", methods=["GET"])
+def admin_profile():
+    """Sample every thread for ?seconds= and return collapsed stacks, ready for flamegraph.pl or speedscope."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval_ms = float(request.args.get("interval_ms", 5))
+    except ValueError:
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+    if not (math.isfinite(seconds) and math.isfinite(interval_ms)) or seconds <= 0 or interval_ms <= 0:
+        return jsonify({"error": "seconds and interval_ms must be positive"}), 400
+
+    try:
+        stacks = profile_threads(seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return format_collapsed(stacks), 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
+@api.route("/admin/slow-requests", methods=["GET"])
+def admin_slow_requests():
+    """The most recent requests over the slow-request threshold, newest first."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify({
+        "threshold_ms": slow_requests.threshold * 1000,
+        "requests": slow_requests.recent(),
+    }), 200
+
+
+@api.route("/fetch-user-details", methods=["POST"])
 def fetch_user_details():
     data = request.get_json()
     if not data:
@@ -920,16 +1400,18 @@ def fetch_user_details():
         query = {}
         if user_id:
             query["id"] = int(user_id)
-        if public_key:
-            query["public_key"] = public_key
 
         # Fetch user details from the database
-        user = users_collection.find_one(query)
+        if public_key:
+            user = find_user_by_public_key(public_key, query)
+        else:
+            user = users_collection.find_one(query)
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        # Remove sensitive fields before sending the response
+        # Remove internal fields before sending the response
         user.pop("_id", None)
+        user.pop(FINGERPRINT_FIELD, None)
         
         return jsonify({
             "message": "User details fetched successfully",
@@ -942,7 +1424,7 @@ def fetch_user_details():
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 
-@app.route('/get-hospital-reports', methods=['POST'])
+@api.route('/get-hospital-reports', methods=['POST'])
 def get_hospital_reports():
     try:
         data = request.json
@@ -951,64 +1433,17 @@ def get_hospital_reports():
         if not hospital_id:
             return jsonify({"error": "hospital_id is required"}), 400
 
-        if not web3.is_connected():
-            return jsonify({"error": "Failed to connect to blockchain"}), 500
-
         hospital_id = int(hospital_id)  # Ensure integer
 
-        # Call the smart contract function
-        reports_json = contract.functions.getReportsByHospitalId(hospital_id).call()
-
-        if not reports_json or reports_json == "[]":
-            return jsonify({"message": "No reports found for this hospital", "documents": []}), 200
+        try:
+            options = parse_listing_options(data)
+        except ListingError as le:
+            return jsonify({"error": str(le)}), 400
 
-        # Parse the JSON string from blockchain
-        reports = json.loads(reports_json)
-        
-        formatted_documents = []
-        for report in reports:
-            # Get file details for each report hash
-            file_details = []
-            for ipfs_hash in report["reportHashes"]:
-                try:
-                    file_name = get_file_details(ipfs_hash)
-                    file_url = f"https://magenta-glamorous-silverfish-702.mypinata.cloud/ipfs/{ipfs_hash}?pinataGatewayToken=aMhZLFDXoAnaPBLjmo98KI89cumJQ5K7i_7xh5p49rS853TVXXJIEINrc_1-pYZv"
-                    file_details.append({
-                        "file_name": file_name,
-                        "file_url": file_url,
-                        "ipfs_hash": ipfs_hash
-                    })
-                except Exception as e:
-                    print(f"Error processing IPFS hash {ipfs_hash}: {str(e)}")
-                    continue
-
-            # Format the report with all fields from contract
-            formatted_document = {
-                "document_id": report["documentId"],
-                "patient_id": report["patientId"],
-                "patient_name": get_patient_name(int(report["patientId"])),
-                "file_details": file_details,
-                "hospital_id": report["hospitalId"],
-                "doctor_name": report["doctorName"],
-                "is_approved": report["isApproved"],
-                "is_rejected": report["isRejected"],
-                "added_by_patient": report["addedByPatient"],
-                "disease": report["disease"],
-                "hospital_name": report["hospital"],
-                "medication": report["medication"],
-                "treatment_date": report["treatmentDate"],
-                "summary": report["summary"],
-                "uploaded_date": report["uploadedDate"],
-                "report_hashes": report["reportHashes"]
-            }
-            
-            formatted_documents.append(formatted_document)
-
-        return jsonify({
-            "message": "Hospital reports retrieved successfully",
-            "hospital_id": hospital_id,
-            "documents": formatted_documents
-        }), 200
+        # Serve from the MongoDB projection when it is current, otherwise call getReportsByHospitalId
+        reports, next_cursor, freshness = load_reports(options, hospital_id=hospital_id)
+        body, status = report_listing_response(reports, next_cursor, freshness, options, hospital_id=hospital_id)
+        return jsonify(body), status
 
     except ValueError as ve:
         return jsonify({"error": f"Invalid hospital ID format: {str(ve)}"}), 400
@@ -1016,5 +1451,88 @@ def get_hospital_reports():
         print(f"Error in get_hospital_reports: {str(e)}")
         return jsonify({"error": f"Failed to retrieve hospital reports: {str(e)}"}), 500
 
+_background_lock = threading.Lock()
+_background_started = False
+
+def run_deployment_tasks(interval=PROJECTION_SYNC_INTERVAL):
+    """Work done by one worker of the whole deployment, whichever holds the lease.
+
+    On taking the lease the worker builds the declared indexes and resumes
+    tracking of transactions left pending by earlier processes; while it
+    holds it, it keeps the report projection synced and picks up the
+    transactions of workers that died without holding the lease. The
+    other workers keep retrying, so a new holder takes over when this one
+    dies.
+    """
+    lease = Lease(db.leases, "deployment-tasks")
+    leading = False
+    sync_projection = os.getenv("REPORT_PROJECTION_SYNC", "1") == "1"
+    if sync_projection and CONTRACT_DEPLOY_BLOCK is None:
+        print("CONTRACT_DEPLOY_BLOCK is not set; the report projection will not be synced")
+        sync_projection = False
+    while True:
+        try:
+            if not lease.acquire():
+                leading = False
+            else:
+                if not leading:
+                    leading = True
+                    # Declared indexes for users/hospitals/documents, built in the background
+                    if os.getenv("MONGO_ENSURE_INDEXES", "1") == "1":
+                        start_index_build(services.get("db"))
+                    count = tx_manager.recover_pending()
+                    if count:
+                        print(f"Resumed tracking of {count} pending transactions")
+                else:
+                    # Pending past the receipt timeout: its worker is gone
+                    tx_manager.recover_pending(older_than=tx_manager.receipt_timeout)
+                if sync_projection:
+                    report_projection.sync()
+        except Exception as e:
+            print(f"Deployment task failed: {str(e)}")
+        time.sleep(interval)
+
+def _run_background_services():
+    try:
+        if os.getenv("PRELOAD_MODELS") == "1":
+            artifacts.preload()
+        crypto_service.start()
+    except Exception as e:
+        print(f"Background service startup failed: {str(e)}")
+    threading.Thread(target=run_deployment_tasks, name="deployment-tasks", daemon=True).start()
+
+def start_background_services():
+    """Start this worker's background work, once, when it begins serving.
+
+    Called on the first request (and from asgi.py's lifespan startup), so
+    importing the app, e.g. for a flask CLI command, starts nothing.
+    Model preloading and the key pool are per worker; the rest runs in
+    run_deployment_tasks.
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    threading.Thread(target=_run_background_services, name="service-startup", daemon=True).start()
+
+@api.before_app_request
+def start_serving():
+    start_background_services()
+
+def create_app():
+    """Build the Flask app; services are connected on first use, not here."""
+    flask_app = Flask(__name__)
+    CORS(flask_app)
+    instrument_flask(flask_app)
+    capture_slow_requests(flask_app, slow_requests)
+    flask_app.register_blueprint(api)
+    services.mark_booted()
+    if os.getenv("STARTUP_PROFILE") == "1":
+        print(f"Booted in {services.boot_ms} ms")
+    return flask_app
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
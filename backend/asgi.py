@@ -0,0 +1,497 @@
+"""ASGI serving mode.
+
+    uvicorn asgi:application --workers 4
+
+Routes that spend their time waiting on the network (the LLM, the pharmacy
+sites, MongoDB and the chain) are served natively here with async clients,
+so one process can hold hundreds of them in flight. Every other route is
+handed to the Flask app, whose views run on a thread pool of
+ASGI_WSGI_THREADS threads. Paths, status codes and JSON bodies are the same
+as with `flask run`.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from a2wsgi import WSGIMiddleware
+from pymongo import ASCENDING, AsyncMongoClient
+from advice_cache import AdviceCache
+from advice_stream import parse_advice
+from http_client import build_async_client
+from services import import_module
+from medicine_search import aiter_store_results, asearch_medicines
+from metrics import FirstChunk, MongoCommandMetrics, request_finished, request_started, track
+from report_listing import ListingError, mongo_filter, paginate, parse_listing_options, split_page
+from report_projection import HEAD_CACHE_SECONDS, STATE_ID, fresh_state, report_criteria
+from app import (
+    ADVICE_PROMPT_VERSION, MONGO_DB, MONGO_URL, PredictionEvents, StoreEvents, advice_cache, app,
+    build_advice_prompt, classify_symptoms, contract_address, fallback_advice, format_prediction,
+    format_tx_status, get_drugs_for_disease, normalize_tx_hash, price_cache, report_listing_response,
+    services as app_services, start_background_services, together_model,
+)
+
+# Threads serving the Flask (non-async) routes
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+
+
+class _AdviceFlight:
+    """asyncio counterpart of advice_cache's flights: one advice computation shared by every request for it.
+
+    produce(flight) is run as a task, publishing the completion's chunks as
+    they arrive when it streams; follow() replays them to each request.
+    """
+
+    def __init__(self, produce):
+        self.chunks = []
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(produce(self))
+        self.task.add_done_callback(self._finished)
+
+    def publish(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _finished(self, task):
+        if not task.cancelled():
+            # Retrieved here too, in case every request waiting on it has gone
+            task.exception()
+        self._notify()
+
+    async def follow(self):
+        seen = 0
+        while True:
+            changed = self._changed
+            while seen < len(self.chunks):
+                yield self.chunks[seen]
+                seen += 1
+            if self.task.done():
+                return
+            await changed.wait()
+
+    async def result(self):
+        # A cancelled request must not cancel the call other requests wait on
+        return await asyncio.shield(self.task)
+
+
+class AsyncServices:
+    """Async clients, created on the server's event loop at startup."""
+
+    def __init__(self):
+        self.started = False
+        self._start_lock = None
+        self._advice_flights = {}
+        self._head = None
+        self._head_read_at = float("-inf")
+
+    async def start(self):
+        if self.started:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.started:
+                return
+            self.http = build_async_client()
+            # Same server and database as app.py
+            self.mongo = AsyncMongoClient(MONGO_URL, event_listeners=[MongoCommandMetrics()])
+            self.db = self.mongo[MONGO_DB]
+            AsyncWeb3 = import_module("web3").AsyncWeb3
+
+            class TimedAsyncHTTPProvider(AsyncWeb3.AsyncHTTPProvider):
+                async def make_request(self, method, params):
+                    with track("chain", method):
+                        return await super().make_request(method, params)
+
+            self.web3 = AsyncWeb3(TimedAsyncHTTPProvider(os.getenv("INFURA_URL")))
+            self.contract = self.web3.eth.contract(address=contract_address, abi=app_services.get("contract_abi"))
+            self.started = True
+
+    async def close(self):
+        if not self.started:
+            return
+        await self.http.aclose()
+        await self.mongo.close()
+        await self.web3.provider.disconnect()
+        self.started = False
+
+    async def advice(self, predicted_disease, drugs_for_disease, medicines_source):
+        """Async get_advice: cached advice, or one LLM call shared by concurrent requests."""
+        flight = await self.advice_flight(predicted_disease, drugs_for_disease, medicines_source, stream=False)
+        return await flight.result()
+
+    async def advice_flight(self, predicted_disease, drugs_for_disease, medicines_source, stream=True):
+        """Async AdviceCache.stream: a flight whose follow() streams the completion and result() the advice.
+
+        Concurrent requests for the same disease, streamed or not, share one
+        LLM call. A request that joins a call made with stream=False, or
+        finds the advice cached, gets no text, only the result.
+        """
+        key = AdviceCache.key(ADVICE_PROMPT_VERSION, predicted_disease)
+        cached = await asyncio.to_thread(advice_cache.get, key)
+        if cached is not None:
+            async def hit(flight):
+                return cached
+            return _AdviceFlight(hit)
+
+        flight = self._advice_flights.get(key)
+        if flight is None:
+            generate = self._stream_advice if stream else self._generate_advice
+            flight = _AdviceFlight(lambda flight: generate(flight, key, predicted_disease, drugs_for_disease, medicines_source))
+            self._advice_flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._advice_flights.pop(key, None))
+        return flight
+
+    async def _generate_advice(self, flight, key, predicted_disease, drugs_for_disease, medicines_source):
+        prompt = build_advice_prompt(predicted_disease, drugs_for_disease, medicines_source)
+        with track("llm", "advice"):
+            ai_response = (await together_model.ainvoke(prompt)).content
+        advice = parse_advice(ai_response)
+        await asyncio.to_thread(advice_cache.set, key, advice)
+        return advice
+
+    async def _stream_advice(self, flight, key, predicted_disease, drugs_for_disease, medicines_source):
+        async for chunk in self.stream_advice_text(predicted_disease, drugs_for_disease, medicines_source):
+            flight.publish(chunk)
+        advice = parse_advice("".join(flight.chunks))
+        await asyncio.to_thread(advice_cache.set, key, advice)
+        return advice
+
+    async def stream_advice_text(self, predicted_disease, drugs_for_disease, medicines_source):
+        """Async stream_advice_text: the completion, chunk by chunk as the model writes it."""
+        prompt = build_advice_prompt(predicted_disease, drugs_for_disease, medicines_source)
+        first_token = FirstChunk("llm", "advice_first_token")
+        with track("llm", "advice_stream"):
+            async for chunk in together_model.astream(prompt):
+                first_token()
+                yield chunk.content
+
+    async def chain_head(self):
+        """Async ReportProjection.chain_head: the cached current block number, or None."""
+        # A failed read is cached too, so an unreachable node costs one attempt per interval
+        if time.monotonic() - self._head_read_at > HEAD_CACHE_SECONDS:
+            self._head_read_at = time.monotonic()
+            try:
+                self._head = await self.web3.eth.block_number
+            except Exception as e:
+                print(f"Failed to read the chain head: {str(e)}")
+                self._head = None
+        return self._head
+
+    async def load_reports(self, options, patient_id=None, hospital_id=None):
+        """Async load_reports: (reports, next_cursor, freshness)."""
+        try:
+            state = await self.db.projection_state.find_one({"_id": STATE_ID})
+            watermark = fresh_state(state, await self.chain_head()) if state else None
+        except Exception as e:
+            print(f"Report projection unavailable: {str(e)}")
+            watermark = None
+
+        if watermark:
+            owner = {"patient_id": patient_id} if patient_id is not None else {"hospital_id": hospital_id}
+            limit = options["limit"]
+            cursor = self.db.reports.find(
+                report_criteria(owner, mongo_filter(options), options["after"]), {"report": 1}
+            ).sort("document_id", ASCENDING)
+            if limit:
+                # One extra row tells whether there is a next page
+                cursor = cursor.limit(limit + 1)
+            reports, next_cursor = split_page([doc["report"] async for doc in cursor], limit)
+            return reports, next_cursor, {"source": "projection", "as_of_block": watermark["block"]}
+
+        if not await self.web3.is_connected():
+            return None, None, {"source": "chain"}
+
+        if patient_id is not None:
+            reports_json = await self.contract.functions.getReports(patient_id).call()
+        else:
+            reports_json = await self.contract.functions.getReportsByHospitalId(hospital_id).call()
+
+        if not reports_json or reports_json == "[]":
+            return [], None, {"source": "chain"}
+        reports, next_cursor = paginate(json.loads(reports_json), options)
+        return reports, next_cursor, {"source": "chain"}
+
+
+services = AsyncServices()
+ROUTES = []
+
+
+def route(method, path):
+    pattern = re.compile("^" + re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", path) + "$")
+
+    def decorator(handler):
+        ROUTES.append((method, path, pattern, handler))
+        return handler
+    return decorator
+
+
+@route("POST", "/api/predict")
+async def predict(data):
+    if not data:
+        return {"error": "No JSON data received"}, 400
+
+    input_sentence = data.get('symptoms', '')
+    if not input_sentence:
+        return {"error": "Input sentence is required"}, 400
+
+    try:
+        predicted_disease = await asyncio.to_thread(classify_symptoms, input_sentence)
+        drugs_for_disease, medicines_source = get_drugs_for_disease(predicted_disease)
+        try:
+            parsed_advice = await services.advice(predicted_disease, drugs_for_disease, medicines_source)
+        except json.JSONDecodeError:
+            parsed_advice = fallback_advice(drugs_for_disease, medicines_source)
+        return format_prediction(predicted_disease, drugs_for_disease, medicines_source, parsed_advice), 200
+    except Exception as e:
+        return {"error": "An error occurred during prediction", "details": str(e)}, 500
+
+
+@route("POST", "/api/predict/stream")
+async def predict_stream(data):
+    if not data:
+        return {"error": "No JSON data received"}, 400
+    input_sentence = data.get('symptoms', '')
+    if not input_sentence:
+        return {"error": "Input sentence is required"}, 400
+
+    try:
+        predicted_disease = await asyncio.to_thread(classify_symptoms, input_sentence)
+        drugs_for_disease, medicines_source = get_drugs_for_disease(predicted_disease)
+    except Exception as e:
+        return {"error": "An error occurred during prediction", "details": str(e)}, 500
+
+    async def events():
+        stream = PredictionEvents(predicted_disease, drugs_for_disease, medicines_source)
+        yield stream.diagnosis()
+        try:
+            flight = await services.advice_flight(predicted_disease, drugs_for_disease, medicines_source)
+            async for text in flight.follow():
+                for event in stream.text(text):
+                    yield event
+            try:
+                parsed_advice = await flight.result()
+            except json.JSONDecodeError:
+                parsed_advice = None
+            else:
+                for event in stream.advice(parsed_advice):
+                    yield event
+            yield stream.complete(parsed_advice)
+        except Exception as e:
+            yield stream.error(e)
+
+    return events(), 200
+
+
+@route("POST", "/fetch-medicines")
+async def fetch_medicine(data):
+    try:
+        search = data.get("search")
+        results, stores = await asearch_medicines(search, services.http, cache=price_cache)
+        return {"success": True, "results": results, "stores": stores}, 200
+    except Exception as e:
+        print(str(e))
+        return {"success": False, "message": str(e)}, 500
+
+
+@route("POST", "/fetch-medicines/stream")
+async def fetch_medicine_stream(data):
+    search = (data or {}).get("search")
+    if not search:
+        return {"success": False, "message": "search is required"}, 400
+
+    async def events():
+        stream = StoreEvents()
+        try:
+            async for result, status in aiter_store_results(search, services.http, cache=price_cache):
+                yield stream.store(result, status)
+            yield stream.summary()
+        except Exception as e:
+            yield stream.error(e)
+
+    return events(), 200
+
+
+@route("GET", "/tx-status/<tx_hash>")
+async def tx_status(data, tx_hash):
+    try:
+        tx = await services.db.transactions.find_one({"_id": normalize_tx_hash(tx_hash)})
+        if not tx:
+            return {"error": "Transaction not found"}, 404
+        return format_tx_status(tx), 200
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+@route("POST", "/get-documents")
+async def get_documents(data):
+    if not data:
+        return {"error": "Invalid JSON data"}, 400
+
+    patient_id = data.get("patient_id")
+    if not patient_id:
+        return {"error": "patient_id is required"}, 400
+
+    try:
+        patient_id = int(patient_id)
+        try:
+            options = parse_listing_options(data)
+        except ListingError as le:
+            return {"error": str(le)}, 400
+
+        reports, next_cursor, freshness = await services.load_reports(options, patient_id=patient_id)
+        # File and patient names come from caches that are nearly always warm
+        return await asyncio.to_thread(
+            report_listing_response, reports, next_cursor, freshness, options, patient_id=patient_id
+        )
+    except ValueError as ve:
+        return {"error": f"Invalid patient ID format: {str(ve)}"}, 400
+    except Exception as e:
+        print(f"Error in get_documents: {str(e)}")
+        return {"error": f"Failed to retrieve documents: {str(e)}"}, 500
+
+
+@route("POST", "/get-hospital-reports")
+async def get_hospital_reports(data):
+    try:
+        hospital_id = data.get('hospital_id')
+        if not hospital_id:
+            return {"error": "hospital_id is required"}, 400
+
+        hospital_id = int(hospital_id)
+        try:
+            options = parse_listing_options(data)
+        except ListingError as le:
+            return {"error": str(le)}, 400
+
+        reports, next_cursor, freshness = await services.load_reports(options, hospital_id=hospital_id)
+        return await asyncio.to_thread(
+            report_listing_response, reports, next_cursor, freshness, options, hospital_id=hospital_id
+        )
+    except ValueError as ve:
+        return {"error": f"Invalid hospital ID format: {str(ve)}"}, 400
+    except Exception as e:
+        print(f"Error in get_hospital_reports: {str(e)}")
+        return {"error": f"Failed to retrieve hospital reports: {str(e)}"}, 500
+
+
+async def _read_json(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def _send_json(send, payload, status):
+    # Serialized by Flask's JSON provider so bodies match jsonify() exactly
+    response = app.json.response(payload)
+    body = response.get_data()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", response.mimetype.encode()),
+            (b"content-length", str(len(body)).encode()),
+            # What flask_cors's CORS(app) sends for every response
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_events(send, receive, events):
+    """Stream an async iterator of Server-Sent Events messages, one body chunk each.
+
+    The server's send() returns quietly once the client has gone, so the
+    stream is stopped, and events closed, when receive() reports
+    http.disconnect.
+    """
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+
+    async def stream():
+        async for message in events:
+            await send({"type": "http.response.body", "body": message.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def disconnect():
+        # The request body has already been read, so the next message is the disconnect
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    streaming = asyncio.ensure_future(stream())
+    watching = asyncio.ensure_future(disconnect())
+    try:
+        await asyncio.wait((streaming, watching), return_when=asyncio.FIRST_COMPLETED)
+        if streaming.done():
+            streaming.result()
+    finally:
+        streaming.cancel()
+        watching.cancel()
+        await asyncio.gather(streaming, watching, return_exceptions=True)
+        await events.aclose()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await services.start()
+                start_background_services()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await services.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+class Application:
+    def __init__(self, wsgi_app):
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=ASGI_WSGI_THREADS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await _lifespan(receive, send)
+        if scope["type"] == "http":
+            for method, path, pattern, handler in ROUTES:
+                match = pattern.match(scope["path"])
+                if match and scope["method"] == method:
+                    # Timed under the same route label Flask would use
+                    started = request_started(method, path)
+                    status = 500
+                    try:
+                        await services.start()
+                        data = await _read_json(receive)
+                        payload, status = await handler(data, **match.groupdict())
+                        # Streaming routes return an async iterator of events instead of a body
+                        if hasattr(payload, "__aiter__"):
+                            return await _send_events(send, receive, payload)
+                        return await _send_json(send, payload, status)
+                    finally:
+                        request_finished(method, path, status, started)
+        return await self.wsgi(scope, receive, send)
+
+
+application = Application(app)
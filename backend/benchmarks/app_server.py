@@ -0,0 +1,164 @@
+"""The backend, wired to the offline stand-ins, for benchmarks.
+
+    python -m benchmarks.app_server --standins http://127.0.0.1:8100 [--mode asgi]
+
+Points the LLM, chain and MongoDB settings at the stand-ins and a scratch
+database (dropped first), rewrites outbound requests to the pharmacy sites
+and Pinata to the stand-in server, seeds patients with real key pairs and
+a few hospitals, then serves the app with the Flask server (threaded) or
+uvicorn. Prints one JSON line with "ready", the URL and the seeded
+accounts when it is accepting requests.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from benchmarks.standin_chain import CONTRACT_ADDRESS, DEV_PRIVATE_KEY
+from benchmarks.standins import STANDIN_HOSTS
+
+BENCH_DB = "curelink_bench"
+
+
+def configure(args):
+    """Environment read by app.py at import time."""
+    os.environ.setdefault("TOGETHER_API_KEY", "bench")
+    os.environ.setdefault("PINATA_JWT", "bench")
+    os.environ["TOGETHER_BASE_URL"] = f"{args.standins}/v1"
+    os.environ["INFURA_URL"] = f"{args.standins}/rpc"
+    os.environ["CONTRACT_ADDRESS"] = CONTRACT_ADDRESS
+    # The stand-in chain's contract exists from its first block
+    os.environ["CONTRACT_DEPLOY_BLOCK"] = "0"
+    os.environ["PRIVATE_KEY"] = DEV_PRIVATE_KEY
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["MONGO_DB"] = args.mongo_db
+    os.environ["REPORT_PROJECTION_SYNC"] = "1" if args.projection else "0"
+    os.environ.setdefault("REPORT_PROJECTION_SYNC_INTERVAL", "1")
+
+
+def redirect_outbound(standins):
+    """Send requests for the pharmacy sites and Pinata to the stand-in server instead."""
+    import httpx
+    from requests.adapters import HTTPAdapter
+    import http_client
+
+    def rewrite(url):
+        parts = urlsplit(str(url))
+        return f"{standins}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+    class RedirectAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            request.url = rewrite(request.url)
+            return super().send(request, **kwargs)
+
+    adapter = RedirectAdapter(pool_maxsize=http_client.POOL_MAXSIZE)
+    for retry in (True, False):
+        session = http_client.get_session(retry)
+        for host in STANDIN_HOSTS:
+            session.mount(f"https://{host}", adapter)
+
+    # The ASGI mode's httpx client, created per event loop by asgi.py
+    build_async_client = http_client.build_async_client
+
+    def build_redirected_client():
+        client = build_async_client()
+
+        async def redirect(request):
+            if request.url.host in STANDIN_HOSTS:
+                request.url = httpx.URL(rewrite(request.url))
+        client.event_hooks = {**client.event_hooks, "request": [redirect]}
+        return client
+    http_client.build_async_client = build_redirected_client
+
+
+def seed_accounts(app_module, patients, hospitals):
+    """Patients 1..patients with real key pairs, hospitals 1..hospitals; returns their credentials."""
+    from crypto_service import generate_key_pair, serialize_keys
+    from key_fingerprints import FINGERPRINT_FIELD, fingerprint_pem
+
+    seeded = {"patients": [], "hospitals": []}
+    users = []
+    for patient_id in range(1, patients + 1):
+        _, public_key_pem = serialize_keys(*generate_key_pair())
+        public_key_pem = public_key_pem.decode("utf-8")
+        users.append({
+            "id": patient_id,
+            "first_name": "Bench",
+            "last_name": f"Patient {patient_id}",
+            "email": f"patient{patient_id}@bench.local",
+            "phone": "0000000000",
+            "public_key": public_key_pem,
+            FINGERPRINT_FIELD: fingerprint_pem(public_key_pem),
+        })
+        seeded["patients"].append({"id": patient_id, "public_key": public_key_pem})
+    if users:
+        app_module.users_collection.insert_many(users)
+
+    hospital_docs = []
+    for hospital_id in range(1, hospitals + 1):
+        credentials = {"email": f"hospital{hospital_id}@bench.local", "password": "bench"}
+        hospital_docs.append({"id": hospital_id, "name": f"Bench Hospital {hospital_id}", "approved": True, **credentials})
+        seeded["hospitals"].append({"id": hospital_id, **credentials})
+    if hospital_docs:
+        app_module.hospitals_collection.insert_many(hospital_docs)
+    return seeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the backend against the offline stand-ins")
+    parser.add_argument("--standins", required=True, help="Base URL of benchmarks.standins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--mode", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--mongo-db", default=BENCH_DB, help="Scratch database, dropped on start")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--hospitals", type=int, default=5)
+    parser.add_argument("--projection", action="store_true", help="Serve listings from the MongoDB projection")
+    args = parser.parse_args()
+    args.standins = args.standins.rstrip("/")
+    if args.mongo_db == "curelink":
+        parser.error("refusing to drop the application database; pick a scratch --mongo-db")
+
+    configure(args)
+    from pymongo import MongoClient
+    MongoClient(args.mongo_url).drop_database(args.mongo_db)
+
+    import app as app_module
+    redirect_outbound(args.standins)
+    seeded = seed_accounts(app_module, args.patients, args.hospitals)
+
+    if args.mode == "asgi":
+        import uvicorn
+        import asgi
+        config = uvicorn.Config(asgi.application, host=args.host, port=args.port, log_level="warning")
+        server = uvicorn.Server(config)
+        announce = lambda: print(json.dumps({"ready": True, "url": f"http://{args.host}:{args.port}", **seeded}), flush=True)
+
+        # uvicorn has no ready callback; announce once its startup has completed
+        def wait_started():
+            while not server.started:
+                time.sleep(0.05)
+            announce()
+        threading.Thread(target=wait_started, daemon=True).start()
+        server.run()
+        return 0
+
+    from werkzeug.serving import make_server
+    # One access log line per request would skew the numbers being measured
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(args.host, args.port, app_module.app, threaded=True)
+    host, port = server.server_address[:2]
+    print(json.dumps({"ready": True, "url": f"http://{host}:{port}", **seeded}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
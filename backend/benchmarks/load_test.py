@@ -0,0 +1,335 @@
+"""End-to-end load test of the backend, fully offline.
+
+Run from the backend directory, with a MongoDB listening locally:
+
+    python -m benchmarks.load_test [--mode asgi] [--concurrency 1,8,32] [--requests 200]
+    python -m benchmarks.load_test --json results.json
+    python -m benchmarks.load_test --baseline results.json --max-regression 0.15
+
+Starts benchmarks.standins (fake LLM, pharmacy fixtures, Pinata and a dev
+chain) and benchmarks.app_server in their own processes, then drives each
+route at each concurrency level and reports throughput and p50/p95/p99
+latency. Streamed routes are read to the end as they arrive, with the time
+to the first of each of their STREAM_EVENTS reported too; a stream that
+sends an "error" event counts as a failed request. With --baseline, exits with status 1 when a route's p95 grew or
+its throughput fell by more than --max-regression, or it started failing
+requests, compared with the saved run.
+
+Request bodies come from the repo's own data: symptom descriptions from
+models/Disease Prediction.csv and drug names from models/disease_drug_data.csv.
+"""
+import argparse
+import csv
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+SYMPTOMS_DATASET = "models/Disease Prediction.csv"
+DRUGS_DATASET = "models/disease_drug_data.csv"
+STARTUP_TIMEOUT = 120
+
+
+def load_column(path, column, limit=2000):
+    with open(path, newline="", encoding="utf-8") as f:
+        values = [row[column] for row in csv.DictReader(f) if row.get(column)]
+    return sorted(set(values))[:limit]
+
+
+# Route -> builder of (method, path, json body) from a random generator and the seeded accounts
+def predict_request(rng, data):
+    return "POST", "/api/predict", {"symptoms": rng.choice(data["symptoms"])}
+
+
+def predict_stream_request(rng, data):
+    return "POST", "/api/predict/stream", {"symptoms": rng.choice(data["symptoms"])}
+
+
+def fetch_medicines_request(rng, data):
+    return "POST", "/fetch-medicines", {"search": rng.choice(data["drugs"])}
+
+
+def get_documents_request(rng, data):
+    return "POST", "/get-documents", {"patient_id": rng.choice(data["patients"])["id"]}
+
+
+def upload_request(rng, data):
+    patient = rng.choice(data["patients"])
+    hospital = rng.choice(data["hospitals"])
+    return "POST", "/upload", {
+        "public_key": patient["public_key"],
+        "report_hashes": [f"bafkreibench{rng.getrandbits(64):016x}"],
+        "disease": "Migraine",
+        "hospital": f"Bench Hospital {hospital['id']}",
+        "medication": "Paracetamol 650mg",
+        "treatment_date": "2024-06-01",
+        "summary": "Benchmark upload",
+        "doctor_name": "Dr. Bench",
+        "hospital_id": hospital["id"],
+        "uploaded_date": "2024-06-01T10:00:00",
+    }
+
+
+SCENARIOS = {
+    "predict": predict_request,
+    "predict-stream": predict_stream_request,
+    "fetch-medicines": fetch_medicines_request,
+    "get-documents": get_documents_request,
+    "upload": upload_request,
+}
+
+# Server-Sent Events routes -> events whose first arrival is timed
+STREAM_EVENTS = {
+    "predict-stream": ("diagnosis", "advice"),
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def read_event_stream(response, started, events):
+    """Read a Server-Sent Events response to its end.
+
+    Returns ({event: ms from started to its first arrival} for the given
+    events, the data of the first "error" event or None).
+    """
+    firsts = {}
+    error = None
+    in_error = False
+    # chunk_size=None hands over data as it arrives rather than in 512-byte blocks
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+            in_error = event == "error"
+            if event in events and event not in firsts:
+                firsts[event] = (time.perf_counter() - started) * 1000
+        elif in_error and line.startswith("data: ") and error is None:
+            error = line[len("data: "):]
+    return firsts, error
+
+
+def run_scenario(base_url, build, data, concurrency, total, seed=1, stream_events=()):
+    """Send total requests with concurrency workers; returns the route's summary.
+
+    With stream_events the responses are streamed, and the summary also
+    has the p50/p95 time to the first of each of those events.
+    """
+    latencies = []
+    firsts = {event: [] for event in stream_events}
+    errors = []
+    lock = threading.Lock()
+    remaining = iter(range(total))
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            method, path, body = build(rng, data)
+            started = time.perf_counter()
+            arrived = {}
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=60, stream=bool(stream_events))
+                ok = response.status_code < 400
+                if ok and stream_events:
+                    arrived, error = read_event_stream(response, started, stream_events)
+                    ok = error is None
+                    detail = f"event: error {(error or '')[:120]}"
+                else:
+                    detail = f"{response.status_code} {response.text[:120]}"
+            except requests.RequestException as e:
+                ok, detail = False, str(e)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                for event, ms in arrived.items():
+                    firsts[event].append(ms)
+                if not ok:
+                    errors.append(detail)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    summary = {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_sample": errors[:3],
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "max_ms": round(latencies[-1], 1),
+    }
+    for event, values in firsts.items():
+        values.sort()
+        for name, fraction in (("p50", 0.50), ("p95", 0.95)):
+            value = percentile(values, fraction)
+            summary[f"first_{event}_{name}_ms"] = round(value, 1) if value is not None else None
+    return summary
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_process(module, *args):
+    """Start python -m module and wait for its JSON "ready" line."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", module, *map(str, args)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        line = process.stdout.readline()
+        if not line:
+            if process.poll() is not None:
+                raise RuntimeError(f"{module} exited with status {process.returncode} before it was ready")
+            continue
+        if line.startswith("{"):
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("ready"):
+                # Keep draining stdout so the server never blocks on a full pipe
+                threading.Thread(target=lambda: [None for _ in process.stdout], daemon=True).start()
+                return process, message
+    process.kill()
+    raise RuntimeError(f"{module} was not ready within {STARTUP_TIMEOUT}s")
+
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def compare(results, baseline, max_regression):
+    """Regressions of results against a baseline run, as printable lines."""
+    previous = {(row["route"], row["concurrency"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        base = previous.get((row["route"], row["concurrency"]))
+        if base is None:
+            continue
+        label = f"{row['route']} @ {row['concurrency']}"
+        if row["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{label}: p95 {base['p95_ms']} -> {row['p95_ms']} ms")
+        if row["throughput_rps"] < base["throughput_rps"] * (1 - max_regression):
+            regressions.append(f"{label}: throughput {base['throughput_rps']} -> {row['throughput_rps']} req/s")
+        if row["errors"] > base["errors"]:
+            regressions.append(f"{label}: errors {base['errors']} -> {row['errors']}")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'route':16} {'conc':>5} {'reqs':>6} {'errs':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in results:
+        print(f"{row['route']:16} {row['concurrency']:>5} {row['requests']:>6} {row['errors']:>5} "
+              f"{row['throughput_rps']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+        for event in STREAM_EVENTS.get(row["route"], ()):
+            print(f"{'':16} first {event}: p50 {row.get(f'first_{event}_p50_ms')} ms, "
+                  f"p95 {row.get(f'first_{event}_p95_ms')} ms")
+        for sample in row["error_sample"]:
+            print(f"{'':16} ! {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the backend routes")
+    parser.add_argument("--routes", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per route first")
+    parser.add_argument("--mode", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--projection", action="store_true", help="Serve listings from the MongoDB projection")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--hospitals", type=int, default=5)
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=1.5)
+    parser.add_argument("--site-latency", type=float, default=0.3)
+    parser.add_argument("--pinata-latency", type=float, default=0.1)
+    parser.add_argument("--chain-latency", type=float, default=0.02)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="Allowed fractional slowdown")
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(",") if route.strip()]
+    unknown = [route for route in routes if route not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    standins, standins_info = start_process(
+        "benchmarks.standins", "--port", free_port(),
+        "--llm-latency", args.llm_latency, "--site-latency", args.site_latency,
+        "--pinata-latency", args.pinata_latency, "--chain-latency", args.chain_latency,
+        "--patients", args.patients, "--hospitals", args.hospitals, "--reports", args.reports,
+    )
+    server = None
+    try:
+        server_args = [
+            "--standins", standins_info["url"], "--port", free_port(), "--mode", args.mode,
+            "--mongo-url", args.mongo_url, "--patients", args.patients, "--hospitals", args.hospitals,
+        ]
+        if args.projection:
+            server_args.append("--projection")
+        server, seeded = start_process("benchmarks.app_server", *server_args)
+        data = {
+            "symptoms": load_column(SYMPTOMS_DATASET, "text"),
+            "drugs": load_column(DRUGS_DATASET, "drug"),
+            "patients": seeded["patients"],
+            "hospitals": seeded["hospitals"],
+        }
+
+        results = []
+        for route in routes:
+            stream_events = STREAM_EVENTS.get(route, ())
+            if args.warmup:
+                run_scenario(seeded["url"], SCENARIOS[route], data, 1, args.warmup, seed=0, stream_events=stream_events)
+            for level in levels:
+                row = run_scenario(seeded["url"], SCENARIOS[route], data, level, args.requests, stream_events=stream_events)
+                results.append({"route": route, **row})
+                print(f"{route} @ {level}: {row['throughput_rps']} req/s, p95 {row['p95_ms']} ms", file=sys.stderr)
+    finally:
+        if server is not None:
+            stop_process(server)
+        stop_process(standins)
+
+    print_table(results)
+    report = {"config": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")}, "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
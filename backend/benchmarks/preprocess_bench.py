@@ -0,0 +1,77 @@
+"""Micro-benchmark for utils.preprocess_text.
+
+Run from the backend directory:
+
+    python -m benchmarks.preprocess_bench [--repeat 3]
+
+Compares the precompiled pipeline against the previous per-call
+implementation on every row of models/Disease Prediction.csv and checks
+that both produce identical output.
+"""
+import argparse
+import csv
+import re
+import time
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+import utils
+
+DATASET = "models/Disease Prediction.csv"
+
+
+def legacy_preprocess_text(text):
+    # Previous implementation, kept verbatim as the baseline
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    words = text.split()
+    stop_words = set(stopwords.words('english'))
+    words = [word for word in words if word not in stop_words]
+    lemmatizer = WordNetLemmatizer()
+    words = [lemmatizer.lemmatize(word) for word in words]
+    return ' '.join(words)
+
+
+def load_texts(path=DATASET):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+
+def timed(fn, texts, repeat):
+    best = None
+    output = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = fn(texts)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_texts()
+    # Warm the corpora so neither side pays the one-off WordNet load
+    legacy_preprocess_text("warm up")
+    utils.preprocess_text("warm up")
+
+    legacy_time, legacy_out = timed(lambda t: [legacy_preprocess_text(x) for x in t], texts, args.repeat)
+    fast_time, fast_out = timed(lambda t: [utils.preprocess_text(x) for x in t], texts, args.repeat)
+    stream_time, stream_out = timed(lambda t: list(utils.preprocess_texts(t)), texts, args.repeat)
+
+    mismatches = sum(1 for a, b in zip(legacy_out, fast_out) if a != b)
+    mismatches += sum(1 for a, b in zip(legacy_out, stream_out) if a != b)
+
+    print(f"rows: {len(texts)}  repeat: {args.repeat} (best of)")
+    print(f"legacy      {legacy_time * 1000:9.1f} ms  {len(texts) / legacy_time:10.0f} rows/s")
+    print(f"precompiled {fast_time * 1000:9.1f} ms  {len(texts) / fast_time:10.0f} rows/s  x{legacy_time / fast_time:.1f}")
+    print(f"streaming   {stream_time * 1000:9.1f} ms  {len(texts) / stream_time:10.0f} rows/s  x{legacy_time / stream_time:.1f}")
+    print(f"lemma cache: {utils._lemmatize.cache_info()}")
+    print("output identical" if mismatches == 0 else f"MISMATCHES: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
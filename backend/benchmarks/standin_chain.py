@@ -0,0 +1,308 @@
+"""In-memory JSON-RPC dev chain running the reports contract from abi.json.
+
+abi.json carries only the contract's interface, not its bytecode, so there
+is nothing to deploy on eth-tester or a dev node. This chain implements the
+ABI's report functions in Python behind the Ethereum JSON-RPC methods the
+backend uses, so web3, contract encoding, transaction signing and the
+tx manager all run unchanged. Every transaction is mined into its own
+block as soon as it is sent.
+"""
+import json
+import threading
+import time
+import rlp
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector, keccak, to_checksum_address
+
+CHAIN_ID = 31337
+# Where hardhat/anvil put the first contract deployed from their first dev account
+CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+# Their well-known, publicly listed dev account #0; never holds real funds
+DEV_PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+GAS_PRICE = 20 * 10**9
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _types(params):
+    return [param["type"] for param in params]
+
+
+def _hex(value):
+    return hex(value)
+
+
+def _block_number(tag, head):
+    if tag in (None, "latest", "pending", "safe", "finalized"):
+        return head
+    if tag == "earliest":
+        return 0
+    return int(tag, 16)
+
+
+class ReportsContract:
+    """The report-keeping logic of the contract, as far as the ABI describes it."""
+
+    def __init__(self):
+        self.reports = {}  # document ID -> report dict, in the getReports JSON shape
+        self.next_document_id = 1
+
+    def add_report(self, patient_id, report_hashes, disease, hospital, medication, treatment_date,
+                   summary, doctor_name, hospital_id, uploaded_date, added_by_patient=False):
+        document_id = self.next_document_id
+        self.next_document_id += 1
+        self.reports[document_id] = {
+            "documentId": document_id,
+            "patientId": patient_id,
+            "reportHashes": list(report_hashes),
+            "isApproved": False,
+            "isRejected": False,
+            "addedByPatient": added_by_patient,
+            "disease": disease,
+            "hospital": hospital,
+            "medication": medication,
+            "treatmentDate": treatment_date,
+            "summary": summary,
+            "doctorName": doctor_name,
+            "hospitalId": hospital_id,
+            "uploadedDate": uploaded_date,
+        }
+        return ("ReportAdded", [patient_id, document_id, hospital_id])
+
+    def review(self, patient_id, document_id, approved):
+        report = self.reports.get(document_id)
+        if report is None or report["patientId"] != patient_id:
+            raise RpcError(3, "execution reverted: Report not found")
+        report["isApproved"] = approved
+        report["isRejected"] = not approved
+        return ("ReportApproved" if approved else "ReportRejected", [patient_id, document_id])
+
+    def reports_json(self, key, value):
+        return json.dumps([report for report in self.reports.values() if report[key] == value])
+
+
+class StandinChain:
+    def __init__(self, abi_path="abi.json", address=CONTRACT_ADDRESS):
+        with open(abi_path, "r") as abi_file:
+            abi = json.load(abi_file)
+        self.address = to_checksum_address(address)
+        self.functions = {
+            function_abi_to_4byte_selector(entry): entry for entry in abi if entry["type"] == "function"
+        }
+        self.events = {entry["name"]: entry for entry in abi if entry["type"] == "event"}
+        self.contract = ReportsContract()
+        self._lock = threading.Lock()
+        self.head = 0
+        self.block_times = {0: int(time.time())}
+        # Next document ID as of each block, for getCurrentDocumentId calls pinned to a block
+        self.document_counter = {0: self.contract.next_document_id}
+        self.nonces = {}
+        # (sender, nonce) -> transaction sent ahead of a nonce gap, mined once the gap is filled
+        self.queued = {}
+        self.transactions = {}
+        self.receipts = {}
+        self.logs = []
+
+    # Contract execution
+
+    def _mine(self, tx_hash, sender, to, emitted):
+        """Close a block holding one transaction, returning its receipt."""
+        self.head += 1
+        self.block_times[self.head] = int(time.time())
+        self.document_counter[self.head] = self.contract.next_document_id
+        block_hash = "0x" + keccak(text=f"block-{self.head}").hex()
+        logs = [self._log(name, args, tx_hash, block_hash, index) for index, (name, args) in enumerate(emitted)]
+        self.logs.extend(logs)
+        return {
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "blockHash": block_hash,
+            "blockNumber": _hex(self.head),
+            "from": sender,
+            "to": to,
+            "cumulativeGasUsed": _hex(90000),
+            "gasUsed": _hex(90000),
+            "effectiveGasPrice": _hex(GAS_PRICE),
+            "contractAddress": None,
+            "logs": logs,
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+            "type": "0x0",
+        }
+
+    def _log(self, name, args, tx_hash, block_hash, index):
+        event = self.events[name]
+        topics = ["0x" + event_abi_to_log_topic(event).hex()]
+        data_types, data_values = [], []
+        for param, value in zip(event["inputs"], args):
+            if param["indexed"]:
+                topics.append("0x" + abi_encode([param["type"]], [value]).hex())
+            else:
+                data_types.append(param["type"])
+                data_values.append(value)
+        return {
+            "address": self.address,
+            "topics": topics,
+            "data": "0x" + abi_encode(data_types, data_values).hex(),
+            "blockNumber": _hex(self.head),
+            "blockHash": block_hash,
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "logIndex": _hex(index),
+            "removed": False,
+        }
+
+    def _transact(self, data):
+        """Apply a contract call; returns the (event, args) it emits."""
+        entry = self.functions.get(bytes(data[:4]))
+        if entry is None or entry["stateMutability"] == "view":
+            raise RpcError(3, "execution reverted")
+        args = abi_decode(_types(entry["inputs"]), bytes(data[4:]))
+        name = entry["name"]
+        if name in ("addReportByDoctor", "addReportByPatient"):
+            return [self.contract.add_report(*args, added_by_patient=name == "addReportByPatient")]
+        if name in ("approveReport", "rejectReport"):
+            return [self.contract.review(*args, approved=name == "approveReport")]
+        raise RpcError(3, f"execution reverted: {name} is not implemented by the stand-in chain")
+
+    def _view(self, data, block):
+        entry = self.functions.get(bytes(data[:4]))
+        if entry is None or entry["stateMutability"] != "view":
+            raise RpcError(3, "execution reverted")
+        args = abi_decode(_types(entry["inputs"]), bytes(data[4:]))
+        name = entry["name"]
+        if name == "getCurrentDocumentId":
+            result = [self.document_counter[min(block, self.head)]]
+        elif name == "getReports":
+            result = [self.contract.reports_json("patientId", args[0])]
+        elif name == "getReportsByHospitalId":
+            result = [self.contract.reports_json("hospitalId", args[0])]
+        else:
+            raise RpcError(3, f"execution reverted: {name} is not implemented by the stand-in chain")
+        return "0x" + abi_encode(_types(entry["outputs"]), result).hex()
+
+    def seed_reports(self, reports):
+        """Add reports (dicts of add_report's arguments) in one block, as if sent by the dev account."""
+        with self._lock:
+            emitted = [self.contract.add_report(**report) for report in reports]
+            tx_hash = "0x" + keccak(text=f"seed-{self.head}").hex()
+            self.receipts[tx_hash] = self._mine(tx_hash, Account.from_key(DEV_PRIVATE_KEY).address, self.address, emitted)
+
+    # JSON-RPC methods
+
+    def send_raw_transaction(self, raw_hex):
+        raw = bytes.fromhex(raw_hex[2:])
+        if raw[0] <= 0x7f:
+            tx = TypedTransaction.from_bytes(raw).as_dict()
+            nonce, to, data = tx["nonce"], tx.get("to"), tx.get("data", b"")
+        else:
+            nonce, _, _, to, _, data = rlp.decode(raw)[:6]
+            nonce = int.from_bytes(nonce, "big")
+        to = to_checksum_address(to) if to else None
+        sender = Account.recover_transaction(raw)
+        tx_hash = "0x" + keccak(raw).hex()
+        with self._lock:
+            expected = self.nonces.get(sender, 0)
+            if nonce < expected or (sender, nonce) in self.queued:
+                raise RpcError(-32000, "nonce too low")
+            # Like a dev node, hold a transaction ahead of a nonce gap until the gap is filled
+            self.queued[(sender, nonce)] = (tx_hash, to, data)
+            while (sender, expected) in self.queued:
+                queued_hash, queued_to, queued_data = self.queued.pop((sender, expected))
+                self._apply(queued_hash, sender, expected, queued_to, queued_data)
+                expected += 1
+        return tx_hash
+
+    def _apply(self, tx_hash, sender, nonce, to, data):
+        emitted = self._transact(data) if to == self.address else []
+        self.nonces[sender] = nonce + 1
+        self.transactions[tx_hash] = {"hash": tx_hash, "from": sender, "to": to, "nonce": _hex(nonce)}
+        self.receipts[tx_hash] = self._mine(tx_hash, sender, to, emitted)
+
+    def get_logs(self, criteria):
+        with self._lock:
+            start = _block_number(criteria.get("fromBlock"), self.head)
+            end = _block_number(criteria.get("toBlock"), self.head)
+            addresses = criteria.get("address")
+            if isinstance(addresses, str):
+                addresses = [addresses]
+            topics = criteria.get("topics") or []
+            matched = []
+            for log in self.logs:
+                if not start <= int(log["blockNumber"], 16) <= end:
+                    continue
+                if addresses and log["address"].lower() not in {a.lower() for a in addresses}:
+                    continue
+                if any(
+                    wanted is not None and log["topics"][i] not in (wanted if isinstance(wanted, list) else [wanted])
+                    for i, wanted in enumerate(topics)
+                ):
+                    continue
+                matched.append(log)
+            return matched
+
+    def get_block(self, tag):
+        with self._lock:
+            number = _block_number(tag, self.head)
+            if number > self.head:
+                return None
+            return {
+                "number": _hex(number),
+                "hash": "0x" + keccak(text=f"block-{number}").hex(),
+                "parentHash": "0x" + keccak(text=f"block-{number - 1}").hex(),
+                "timestamp": _hex(self.block_times.get(number, self.block_times[0])),
+                "gasLimit": _hex(30_000_000),
+                "gasUsed": "0x0",
+                "baseFeePerGas": _hex(GAS_PRICE // 2),
+                "transactions": [],
+            }
+
+    def handle(self, method, params):
+        """Result of one JSON-RPC call; raises RpcError on failure."""
+        if method == "web3_clientVersion":
+            return "CureLinkStandinChain/1.0"
+        if method == "net_version":
+            return str(CHAIN_ID)
+        if method == "eth_chainId":
+            return _hex(CHAIN_ID)
+        if method == "eth_blockNumber":
+            return _hex(self.head)
+        if method == "eth_gasPrice":
+            return _hex(GAS_PRICE)
+        if method == "eth_estimateGas":
+            return _hex(200000)
+        if method == "eth_getTransactionCount":
+            return _hex(self.nonces.get(to_checksum_address(params[0]), 0))
+        if method == "eth_sendRawTransaction":
+            return self.send_raw_transaction(params[0])
+        if method == "eth_getTransactionReceipt":
+            return self.receipts.get(params[0])
+        if method == "eth_getTransactionByHash":
+            return self.transactions.get(params[0])
+        if method == "eth_getBlockByNumber":
+            return self.get_block(params[0])
+        if method == "eth_getLogs":
+            return self.get_logs(params[0])
+        if method == "eth_call":
+            call = params[0]
+            if to_checksum_address(call["to"]) != self.address:
+                return "0x"
+            with self._lock:
+                block = _block_number(params[1] if len(params) > 1 else None, self.head)
+                return self._view(bytes.fromhex(call.get("data", call.get("input", "0x"))[2:]), block)
+        raise RpcError(-32601, f"Method {method} not supported by the stand-in chain")
+
+    def handle_request(self, request):
+        """JSON-RPC response for one request object."""
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.handle(request["method"], request.get("params") or [])
+        except RpcError as e:
+            response["error"] = {"code": e.code, "message": str(e)}
+        return response
@@ -0,0 +1,242 @@
+"""Offline stand-ins for every external service the backend calls.
+
+    python -m benchmarks.standins --port 8100 [--llm-latency 1.5 ...]
+
+One threaded HTTP server plays:
+
+    /<pharmacy host>/...    recorded 1mg, Apollo and PharmEasy search results
+                            (fixtures/), for requests rewritten by app_server.py
+    /api.pinata.cloud/...   Pinata's file listing, naming every CID it is asked about
+    /v1/chat/completions    an OpenAI-compatible LLM answering advice prompts,
+                            streamed as server-sent chunks when asked to
+    /rpc                    the JSON-RPC dev chain of standin_chain.py, seeded
+                            with --reports reports spread over the patients
+
+Each service sleeps for its configured latency before answering, so
+benchmarks see realistic waits without any network. A JSON line with
+"ready" is printed once the server is listening.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from eth_utils import keccak
+from benchmarks.standin_chain import StandinChain
+
+FIXTURES = Path(__file__).parent / "fixtures"
+# Characters per streamed completion chunk, roughly a few tokens
+STREAM_CHUNK_CHARS = 16
+
+# Host -> fixture answering its search requests
+PHARMACY_FIXTURES = {
+    "www.1mg.com": ("one_mg.html", "text/html; charset=utf-8"),
+    "search.apollo247.com": ("apollopharmacy.json", "application/json"),
+    "pharmeasy.in": ("pharmeasy.html", "text/html; charset=utf-8"),
+}
+PINATA_HOST = "api.pinata.cloud"
+# Every https host app_server.py redirects here
+STANDIN_HOSTS = tuple(PHARMACY_FIXTURES) + (PINATA_HOST,)
+
+DISEASES = ("Migraine", "Common Cold", "Allergy", "Hypertension", "Bronchial Asthma", "Jaundice")
+
+
+def report_cid(document_number):
+    return "bafkrei" + keccak(text=f"report-{document_number}").hex()[:52]
+
+
+def seed_reports(chain, patients, hospitals, reports, seed=7):
+    """Spread reports over patient IDs 1..patients and hospital IDs 1..hospitals."""
+    rng = random.Random(seed)
+    chain.seed_reports([
+        {
+            "patient_id": rng.randint(1, patients),
+            "report_hashes": [report_cid(n), report_cid(n + reports)][:rng.randint(1, 2)],
+            "disease": rng.choice(DISEASES),
+            "hospital": f"Bench Hospital {n % hospitals + 1}",
+            "medication": "Paracetamol 650mg",
+            "treatment_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "summary": "Routine follow-up; symptoms resolved with treatment.",
+            "doctor_name": "Dr. Bench",
+            "hospital_id": n % hospitals + 1,
+            "uploaded_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00",
+        }
+        for n in range(reports)
+    ])
+
+
+def advice_completion(prompt):
+    """The JSON advice the real model is prompted for, for the disease named in the prompt."""
+    match = re.search(r"information about (.+?)\.", prompt)
+    disease = match.group(1) if match else "the condition"
+    return json.dumps({
+        "predicted_disease": disease,
+        "description": f"{disease} is a common condition. Symptoms usually improve with rest and treatment.",
+        "recommended_medicines": {
+            "source": "from our database",
+            "medications": ["Paracetamol", "Cetirizine"],
+        },
+        "treatment_advice": "- Rest and stay hydrated\n- Take medication as prescribed\n- Eat light meals\n- Track your symptoms",
+        "when_to_see_doctor": "- Symptoms last more than a week\n- High fever or difficulty breathing",
+        "prevention_tips": "- Wash hands regularly\n- Sleep well\n- Keep vaccinations current",
+    }, indent=2)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CureLinkStandins/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _reply(self, status, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, chunks, latency):
+        """Send chunks as server-sent events, the LLM latency spread over them, then [DONE]."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _route(self, method):
+        url = urlsplit(self.path)
+        host, _, rest = url.path.lstrip("/").partition("/")
+        body = self._body()
+        latency = self.server.latency
+
+        if method == "GET" and url.path == "/health":
+            return self._reply(200, {"ok": True})
+        if method == "POST" and url.path == "/rpc":
+            time.sleep(latency["chain"])
+            request = json.loads(body)
+            if isinstance(request, list):
+                return self._reply(200, [self.server.chain.handle_request(r) for r in request])
+            return self._reply(200, self.server.chain.handle_request(request))
+        if method == "POST" and url.path == "/v1/chat/completions":
+            request = json.loads(body)
+            if request.get("stream"):
+                return self._stream(self.server.completion_chunks(request), latency["llm"])
+            time.sleep(latency["llm"])
+            return self._reply(200, self.server.completion(request))
+        if host in PHARMACY_FIXTURES:
+            time.sleep(latency["site"])
+            name, content_type = PHARMACY_FIXTURES[host]
+            return self._reply(200, self.server.fixtures[name], content_type)
+        if host == PINATA_HOST and rest == "v3/files/public":
+            time.sleep(latency["pinata"])
+            cid = parse_qs(url.query).get("cid", [""])[0]
+            files = [{"id": cid[-12:], "cid": cid, "name": f"report-{cid[-8:]}.pdf", "size": 48213, "mime_type": "application/pdf"}]
+            return self._reply(200, {"data": {"files": files, "next_page_token": None}})
+        return self._reply(404, {"error": f"No stand-in for {method} {self.path}"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, chain, latency):
+        super().__init__(address, StandinHandler)
+        self.chain = chain
+        self.latency = latency
+        self.fixtures = {name: (FIXTURES / name).read_bytes() for name, _ in PHARMACY_FIXTURES.values()}
+        self.completions = 0
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on a slow stand-in (search timeouts) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def _advice(self, request):
+        self.completions += 1
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        return prompt, advice_completion(prompt)
+
+    def completion_chunks(self, request):
+        """The completion as chat.completion.chunk objects, the last one carrying finish_reason."""
+        _, content = self._advice(request)
+        header = {"id": f"chatcmpl-bench-{self.completions}", "object": "chat.completion.chunk",
+                  "created": int(time.time()), "model": request.get("model", "bench")}
+        chunks = [
+            {**header, "choices": [{"index": 0, "delta": {"role": "assistant", "content": content[i:i + STREAM_CHUNK_CHARS]},
+                                    "finish_reason": None}]}
+            for i in range(0, len(content), STREAM_CHUNK_CHARS)
+        ]
+        chunks.append({**header, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        return chunks
+
+    def completion(self, request):
+        prompt, content = self._advice(request)
+        return {
+            "id": f"chatcmpl-bench-{self.completions}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "bench"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve offline stand-ins for the backend's external services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="Seconds per LLM completion")
+    parser.add_argument("--site-latency", type=float, default=0.3, help="Seconds per pharmacy search")
+    parser.add_argument("--pinata-latency", type=float, default=0.1, help="Seconds per Pinata lookup")
+    parser.add_argument("--chain-latency", type=float, default=0.02, help="Seconds per JSON-RPC call")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--hospitals", type=int, default=5)
+    parser.add_argument("--reports", type=int, default=200)
+    args = parser.parse_args()
+
+    chain = StandinChain()
+    seed_reports(chain, args.patients, args.hospitals, args.reports)
+    latency = {"llm": args.llm_latency, "site": args.site_latency, "pinata": args.pinata_latency, "chain": args.chain_latency}
+    server = StandinServer((args.host, args.port), chain, latency)
+    host, port = server.server_address[:2]
+    print(json.dumps({"ready": True, "url": f"http://{host}:{port}"}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
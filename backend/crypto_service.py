@@ -0,0 +1,223 @@
+"""RSA key generation and QR rendering for registrations, run in worker processes.
+
+Registration needs a 2048-bit keypair and a PNG QR code of the private
+key, both CPU-bound and slow under the GIL. CryptoService runs them in a
+ProcessPoolExecutor with a bounded number of outstanding jobs; when the
+bound is reached, callers get ServiceBusy straight away instead of
+queueing without limit. Optionally a few registrations' worth of keys and
+QR codes are generated ahead of time to absorb bursts.
+"""
+import base64
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from io import BytesIO
+import qrcode
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
+
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", "2"))
+# Jobs allowed to be running or waiting at once before callers are turned away
+CRYPTO_MAX_QUEUE = int(os.getenv("CRYPTO_MAX_QUEUE", "16"))
+# Pre-generated registrations kept ready (0 disables the pool)
+CRYPTO_KEYPAIR_POOL = int(os.getenv("CRYPTO_KEYPAIR_POOL", "0"))
+CRYPTO_TIMEOUT = float(os.getenv("CRYPTO_TIMEOUT", "30"))
+
+
+# Function to generate key pair
+def generate_key_pair():
+    private_key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend())
+    public_key = private_key.public_key()
+    return private_key, public_key
+
+# Function to serialize keys
+def serialize_keys(private_key, public_key):
+    private_key_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_key_pem = public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_key_pem, public_key_pem
+
+# Function to generate a QR code image and return it as a base64 string
+def generate_qr_code(data):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    # Convert the image to a base64-encoded string
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def generate_registration_keys():
+    """Everything registration needs, as plain strings so it pickles back cheaply.
+
+    Returns (private_key_pem, public_key_pem, qr_code_base64).
+    """
+    private_key, public_key = generate_key_pair()
+    private_key_pem, public_key_pem = serialize_keys(private_key, public_key)
+    private_key_str = private_key_pem.decode("utf-8")
+    return private_key_str, public_key_pem.decode("utf-8"), generate_qr_code(private_key_str)
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class CryptoService:
+    def __init__(self, max_workers=CRYPTO_WORKERS, max_queue=CRYPTO_MAX_QUEUE, pool_size=CRYPTO_KEYPAIR_POOL):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pool_size = pool_size
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._pool = deque()
+        self._refilling = 0
+        self._outstanding = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._failed = 0
+        self._pool_hits = 0
+        self._service_ms = deque(maxlen=500)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Not fork: this process already runs threads (MongoDB, the tx tracker,
+                    # scrapers) whose locks a forked child could inherit mid-hold. Workers
+                    # only unpickle this module's functions, so it is all they preload.
+                    if "forkserver" in multiprocessing.get_all_start_methods():
+                        context = multiprocessing.get_context("forkserver")
+                        context.set_forkserver_preload(["crypto_service"])
+                    else:
+                        context = multiprocessing.get_context("spawn")
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._executor
+
+    def _submit(self):
+        """Queue one generation job, or raise ServiceBusy if max_queue jobs are outstanding."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ServiceBusy("Key generation queue is full")
+        started = time.perf_counter()
+        with self._lock:
+            self._outstanding += 1
+        try:
+            future = self._get_executor().submit(generate_registration_keys)
+        except Exception:
+            self._finish(started, failed=True)
+            raise
+        future.add_done_callback(lambda f: self._done(started, f))
+        return future
+
+    def _done(self, started, future):
+        # exception() raises on a cancelled future, which would leak the slot
+        if future.cancelled():
+            self._finish(started, cancelled=True)
+        else:
+            self._finish(started, failed=future.exception() is not None)
+
+    def _finish(self, started, failed=False, cancelled=False):
+        """Release a job's slot; a cancelled job was already counted as timed out."""
+        with self._lock:
+            self._outstanding -= 1
+            if cancelled:
+                pass
+            elif failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+                self._service_ms.append((time.perf_counter() - started) * 1000)
+        self._slots.release()
+
+    def _refill(self):
+        """Top the pre-generated pool back up; skipped while the queue is busy with live requests."""
+        with self._lock:
+            missing = self.pool_size - len(self._pool) - self._refilling
+            if missing <= 0:
+                return
+            self._refilling += missing
+        for _ in range(missing):
+            try:
+                future = self._submit()
+            except ServiceBusy:
+                with self._lock:
+                    self._refilling -= 1
+                continue
+            future.add_done_callback(self._store_pregenerated)
+
+    def _store_pregenerated(self, future):
+        with self._lock:
+            self._refilling -= 1
+            if not future.cancelled() and future.exception() is None:
+                self._pool.append(future.result())
+
+    def start(self):
+        """Fill the pre-generated pool, if enabled."""
+        if self.pool_size:
+            self._refill()
+
+    def registration_keys(self, timeout=CRYPTO_TIMEOUT):
+        """(private_key_pem, public_key_pem, qr_code_base64) for a new user.
+
+        Raises ServiceBusy when too many generations are already queued, or
+        when the generation takes longer than timeout seconds.
+        """
+        with self._lock:
+            keys = self._pool.popleft() if self._pool else None
+            if keys is not None:
+                self._pool_hits += 1
+        if self.pool_size:
+            self._refill()
+        if keys is not None:
+            return keys
+        future = self._submit()
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # A queued job is cancelled and frees its slot now; one already
+            # running can't be, and frees it when it finishes
+            future.cancel()
+            with self._lock:
+                self._timed_out += 1
+            raise ServiceBusy("Key generation timed out")
+
+    def stats(self):
+        with self._lock:
+            service_ms = sorted(self._service_ms)
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self._outstanding,
+                "max_queue": self.max_queue,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "pool_size": len(self._pool),
+                "pool_target": self.pool_size,
+                "pool_hits": self._pool_hits,
+                "service_ms_avg": round(sum(service_ms) / len(service_ms), 1) if service_ms else None,
+                "service_ms_p95": round(service_ms[min(len(service_ms) - 1, int(len(service_ms) * 0.95))], 1) if service_ms else None,
+            }
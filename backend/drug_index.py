@@ -0,0 +1,57 @@
+import sys
+from types import MappingProxyType
+
+
+def _normalize(name):
+    return " ".join(str(name).split()).lower()
+
+
+class DrugIndex:
+    """Immutable disease -> drugs and drug -> diseases lookup built once at startup.
+
+    Drug lists keep the order of first appearance in the source table with
+    duplicates removed. Names are interned and stored as tuples, so the index
+    is far smaller than the DataFrame it replaces and lookups are O(1).
+    """
+
+    __slots__ = ("_drugs_by_disease", "_diseases_by_drug", "_drug_names")
+
+    def __init__(self, pairs):
+        drugs_by_disease = {}
+        diseases_by_drug = {}
+        drug_names = {}
+        for disease, drug in pairs:
+            disease = sys.intern(str(disease))
+            drug = sys.intern(str(drug))
+            drugs_by_disease.setdefault(disease, {})[drug] = None
+            key = _normalize(drug)
+            drug_names.setdefault(key, drug)
+            diseases_by_drug.setdefault(key, {})[disease] = None
+
+        self._drugs_by_disease = MappingProxyType({k: tuple(v) for k, v in drugs_by_disease.items()})
+        self._diseases_by_drug = MappingProxyType({k: tuple(v) for k, v in diseases_by_drug.items()})
+        self._drug_names = MappingProxyType(drug_names)
+
+    @classmethod
+    def from_dataframe(cls, df, disease_column="disease", drug_column="drug"):
+        return cls(zip(df[disease_column].tolist(), df[drug_column].tolist()))
+
+    def __contains__(self, disease):
+        return disease in self._drugs_by_disease
+
+    def __len__(self):
+        return len(self._drugs_by_disease)
+
+    def drugs_for(self, disease):
+        return list(self._drugs_by_disease.get(disease, ()))
+
+    def diseases_for(self, drug):
+        """Diseases a drug is listed for; matching ignores case and extra whitespace."""
+        return list(self._diseases_by_drug.get(_normalize(drug), ()))
+
+    def drug_name(self, drug):
+        """Canonical spelling of a drug as it appears in the source table."""
+        return self._drug_names.get(_normalize(drug))
+
+    def diseases(self):
+        return list(self._drugs_by_disease)
@@ -0,0 +1,101 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds applied to every outbound call
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Connections kept alive per host, and number of hosts with their own pool
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.3"))
+
+# retry flag -> session
+_sessions = {}
+_session_lock = threading.Lock()
+
+
+def _build_session(retry_failures=True):
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # Every POST we send is a read-only search, so it is safe to retry
+        allowed_methods=frozenset(["GET", "HEAD", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry if retry_failures else 0,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(retry=True):
+    """Return the process-wide session; connections are pooled and kept alive per host.
+
+    retry=False gives a second session that never retries, for calls made
+    against a deadline, where a retry would outlive the caller's wait.
+    """
+    session = _sessions.get(retry)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(retry)
+            if session is None:
+                session = _sessions[retry] = _build_session(retry)
+    return session
+
+
+def http_get(url, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().get(url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().post(url, **kwargs)
+
+
+def http_request(method, url, retry=True, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session(retry).request(method, url, **kwargs)
+
+
+def close_session():
+    """Drop pooled connections, e.g. after fork in a pre-forking server."""
+    with _session_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def build_async_client():
+    """An httpx.AsyncClient with the same timeouts and pool sizes, for the ASGI serving mode.
+
+    Async clients are bound to their event loop, so asgi.py creates one per
+    loop at startup and closes it at shutdown.
+    """
+    import httpx
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=POOL_MAXSIZE * POOL_CONNECTIONS,
+            max_keepalive_connections=POOL_MAXSIZE,
+        ),
+        # httpx only retries failed connections, not error statuses
+        transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES),
+        follow_redirects=True,
+    )
@@ -0,0 +1,191 @@
+"""Standalone indexer for the contract's report events.
+
+    python indexer.py [--once] [--from-block N] [--confirmations N]
+
+Pulls ReportAdded/ReportApproved/ReportRejected logs in adaptive block
+ranges, stores them in the report_events collection as a replayable
+history, and keeps the reports projection (see report_projection.py)
+current. Progress is checkpointed in MongoDB so a restart resumes where
+the previous run stopped. Only blocks at least --confirmations deep are
+indexed; if the checkpointed block has been reorganised away the indexer
+rewinds by the confirmation depth and re-applies that range.
+
+When this service is running, start the API with REPORT_PROJECTION_SYNC=0
+so the workers do not sync the projection themselves.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from web3 import Web3
+from report_projection import ReportProjection, CONTRACT_DEPLOY_BLOCK, deploy_block
+
+CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "3"))
+MIN_CHUNK = int(os.getenv("INDEXER_MIN_CHUNK", "10"))
+MAX_CHUNK = int(os.getenv("INDEXER_MAX_CHUNK", "5000"))
+# After this many consecutive chunks finishing faster than TARGET_CHUNK_SECONDS the chunk doubles
+TARGET_CHUNK_SECONDS = float(os.getenv("INDEXER_TARGET_CHUNK_SECONDS", "2"))
+GROW_AFTER = 5
+POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", "5"))
+CHECKPOINT_ID = "report_events"
+
+
+class ReportIndexer:
+    def __init__(self, web3, contract, db, confirmations=CONFIRMATIONS,
+                 min_chunk=MIN_CHUNK, max_chunk=MAX_CHUNK):
+        self.web3 = web3
+        self.projection = ReportProjection(web3, contract, db)
+        self.events = db.report_events
+        self.checkpoints = db.indexer_checkpoints
+        self.confirmations = confirmations
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.chunk = min(max(min_chunk, 1000), max_chunk)
+        self._fast_chunks = 0
+        self._indexes_ready = False
+
+    def ensure_indexes(self):
+        if not self._indexes_ready:
+            self.events.create_index([("block_number", ASCENDING), ("log_index", ASCENDING)])
+            self.events.create_index([("patient_id", ASCENDING), ("block_number", ASCENDING)])
+            self.projection.ensure_indexes()
+            self._indexes_ready = True
+
+    def checkpoint(self):
+        return self.checkpoints.find_one({"_id": CHECKPOINT_ID})
+
+    def _save_checkpoint(self, block, head, blocks_per_sec):
+        block_hash = self.web3.to_hex(self.web3.eth.get_block(block)["hash"]) if block >= 0 else None
+        self.checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {
+                "block": block,
+                "block_hash": block_hash,
+                "head": head,
+                "lag": head - block,
+                "blocks_per_sec": round(blocks_per_sec, 1),
+                "updated_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+        self.projection.set_watermark(block, head)
+
+    def _start_block(self, from_block=None):
+        """Next block to index, rewinding first if the checkpointed block was reorganised."""
+        state = self.checkpoint()
+        if from_block is not None or not state:
+            return deploy_block() if from_block is None else from_block
+        block = state["block"]
+        if state.get("block_hash"):
+            current_hash = self.web3.to_hex(self.web3.eth.get_block(block)["hash"])
+            if current_hash != state["block_hash"]:
+                rewind_to = max(block - self.confirmations, (CONTRACT_DEPLOY_BLOCK or 0) - 1)
+                print(f"Reorg detected at block {block}; rewinding to {rewind_to}")
+                affected = self.events.distinct("patient_id", {"block_number": {"$gt": rewind_to}})
+                self.events.delete_many({"block_number": {"$gt": rewind_to}})
+                self.projection.refresh_patients(affected, rewind_to)
+                return rewind_to + 1
+        return block + 1
+
+    def _fetch(self, start, safe_head):
+        """Fetch logs for the largest chunk the node accepts, shrinking on failure."""
+        while True:
+            end = min(start + self.chunk - 1, safe_head)
+            started = time.perf_counter()
+            try:
+                logs = self.projection.fetch_logs(start, end)
+            except Exception as e:
+                if self.chunk <= self.min_chunk:
+                    raise
+                # Typically "query returned more than N results" or a provider timeout
+                self.chunk = max(self.min_chunk, self.chunk // 2)
+                self._fast_chunks = 0
+                print(f"get_logs {start}-{end} failed ({str(e)}); retrying with chunk={self.chunk}")
+                continue
+            if time.perf_counter() - started < TARGET_CHUNK_SECONDS and end - start + 1 == self.chunk:
+                self._fast_chunks += 1
+                if self._fast_chunks >= GROW_AFTER:
+                    self.chunk = min(self.max_chunk, self.chunk * 2)
+                    self._fast_chunks = 0
+            else:
+                self._fast_chunks = 0
+            return end, logs
+
+    def _store_events(self, logs):
+        operations = []
+        for log in logs:
+            tx_hash = self.web3.to_hex(log["transactionHash"])
+            operations.append(UpdateOne(
+                {"_id": f"{tx_hash}:{log['logIndex']}"},
+                {"$set": {
+                    "event": log["event"],
+                    "args": {key: int(value) for key, value in log["args"].items()},
+                    "patient_id": int(log["args"]["patientId"]),
+                    "block_number": log["blockNumber"],
+                    "block_hash": self.web3.to_hex(log["blockHash"]),
+                    "transaction_hash": tx_hash,
+                    "log_index": log["logIndex"],
+                }},
+                upsert=True,
+            ))
+        if operations:
+            self.events.bulk_write(operations, ordered=False)
+
+    def run(self, follow=True, from_block=None, poll_interval=POLL_INTERVAL):
+        self.ensure_indexes()
+        start = self._start_block(from_block)
+        window_started = time.perf_counter()
+        window_blocks = 0
+        while True:
+            head = self.web3.eth.block_number
+            safe_head = head - self.confirmations
+            if start > safe_head:
+                if not follow:
+                    return
+                time.sleep(poll_interval)
+                start = self._start_block()
+                continue
+
+            end, logs = self._fetch(start, safe_head)
+            self._store_events(logs)
+            self.projection.refresh_patients({int(log["args"]["patientId"]) for log in logs}, end)
+
+            window_blocks += end - start + 1
+            elapsed = time.perf_counter() - window_started
+            blocks_per_sec = window_blocks / elapsed if elapsed > 0 else 0.0
+            self._save_checkpoint(end, head, blocks_per_sec)
+            print(f"Indexed blocks {start}-{end}: {len(logs)} events, chunk={self.chunk}, "
+                  f"{blocks_per_sec:.0f} blocks/s, lag={head - end}")
+            if elapsed > 60:
+                window_started = time.perf_counter()
+                window_blocks = 0
+            start = end + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the contract's report events into MongoDB")
+    parser.add_argument("--once", action="store_true", help="Stop once caught up instead of following the chain")
+    parser.add_argument("--from-block", type=int, default=None, help="Ignore the checkpoint and start here")
+    parser.add_argument("--confirmations", type=int, default=CONFIRMATIONS)
+    args = parser.parse_args()
+
+    load_dotenv()
+    web3 = Web3(Web3.HTTPProvider(os.getenv("INFURA_URL")))
+    with open("abi.json", "r") as abi_file:
+        contract_abi = json.load(abi_file)
+    contract = web3.eth.contract(address=os.getenv("CONTRACT_ADDRESS"), abi=contract_abi)
+    # The same settings as app.py, so the API reads what the indexer writes
+    db = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017/"))[os.getenv("MONGO_DB", "curelink")]
+
+    indexer = ReportIndexer(web3, contract, db, confirmations=args.confirmations)
+    try:
+        indexer.run(follow=not args.once, from_block=args.from_block)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
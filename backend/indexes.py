@@ -0,0 +1,127 @@
+"""Declared MongoDB indexes for the core collections, and a query-plan audit.
+
+    flask ensure-indexes     build any missing index (safe to re-run)
+    flask audit-queries      explain() each route's query shape, flag COLLSCANs
+
+Collections owned by a helper module (reports, cid_metadata, advice_cache,
+price_cache, ...) create their own indexes on first use.
+"""
+import threading
+from pymongo import ASCENDING, DESCENDING, HASHED
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+# collection -> [(keys, options)]
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        # Logins look users up by the SHA-256 of their public key
+        ([("public_key_fingerprint", ASCENDING)], {"name": "public_key_fingerprint_unique", "unique": True, "sparse": True}),
+        # PEM keys are several hundred bytes; a hashed index stores only their hash
+        ([("public_key", HASHED)], {"name": "public_key_hashed"}),
+    ],
+    "hospitals": [
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("name", ASCENDING)], {"name": "name"}),
+    ],
+    "documents": [
+        ([("patient_id", ASCENDING), ("document_id", ASCENDING)], {"name": "patient_document"}),
+    ],
+    "transactions": [
+        ([("status", ASCENDING)], {"name": "status"}),
+    ],
+}
+
+# (route or caller, collection, filter, sort) for every query the API issues
+QUERY_SHAPES = [
+    ("/login", "users", {"public_key_fingerprint": "0" * 64}, None),
+    ("/login before backfill", "users", {"public_key": "-----BEGIN PUBLIC KEY-----", "public_key_fingerprint": {"$exists": False}}, None),
+    ("/register", "users", {"email": "user@example.com"}, None),
+    ("user id sequence seed", "users", {}, [("id", DESCENDING)]),
+    ("/fetch-user-details", "users", {"id": 1}, None),
+    ("patient names", "users", {"id": {"$in": [1, 2]}}, None),
+    ("/api/hospital", "hospitals", {"id": 1}, None),
+    ("/login-hospital", "hospitals", {"email": "hospital@example.com"}, None),
+    ("hospital id sequence seed", "hospitals", {}, [("id", DESCENDING)]),
+    ("/add-patient-document", "hospitals", {"name": "Hospital"}, None),
+    ("report review", "documents", {"patient_id": 1, "document_id": 1}, None),
+    ("pending transactions", "transactions", {"status": "pending"}, None),
+]
+
+
+def ensure_indexes(db):
+    """Create every declared index, returning {collection: [(index name, error or None)]}.
+
+    create_index is a no-op for an index that already exists. A failure,
+    e.g. a unique index over existing duplicates, is reported rather than
+    raised so the other indexes are still built.
+    """
+    results = {}
+    for collection_name, specs in INDEXES.items():
+        collection = db[collection_name]
+        results[collection_name] = []
+        for keys, options in specs:
+            try:
+                collection.create_index(keys, **options)
+                results[collection_name].append((options["name"], None))
+            except OperationFailure as e:
+                results[collection_name].append((options["name"], str(e)))
+    return results
+
+
+def insert_unique(collection, doc, field):
+    """insert_one, returning False if a document with the same value of field already exists.
+
+    The find_one check a route makes first can race with a concurrent insert;
+    the unique index catches the loser, which is reported here like the
+    check would have. A duplicate on any other unique index is re-raised.
+    """
+    try:
+        collection.insert_one(doc)
+    except DuplicateKeyError:
+        if collection.find_one({field: doc[field]}, {"_id": 1}) is not None:
+            return False
+        raise
+    return True
+
+
+def start_index_build(db):
+    """Run ensure_indexes in the background so startup doesn't wait on MongoDB."""
+    def run():
+        try:
+            for collection_name, built in ensure_indexes(db).items():
+                for name, error in built:
+                    if error:
+                        print(f"Failed to build index {collection_name}.{name}: {error}")
+        except Exception as e:
+            print(f"Index build failed: {str(e)}")
+    threading.Thread(target=run, name="index-build", daemon=True).start()
+
+
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return [stage for stage in stages if stage]
+
+
+def audit_queries(db):
+    """explain() each query shape, returning dicts with the winning plan's stages and a collscan flag."""
+    report = []
+    for caller, collection_name, query, sort in QUERY_SHAPES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.limit(1).explain()["queryPlanner"]["winningPlan"]
+        stages = _plan_stages(plan)
+        report.append({
+            "caller": caller,
+            "collection": collection_name,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
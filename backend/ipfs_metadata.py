@@ -0,0 +1,145 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+
+CID_CACHE_MAX_ENTRIES = int(os.getenv("CID_CACHE_MAX_ENTRIES", "20000"))
+# Seconds a lookup that found no file is remembered before Pinata is asked again
+CID_NEGATIVE_TTL = float(os.getenv("CID_NEGATIVE_TTL", "60"))
+# Upper bound on concurrent Pinata requests across the whole process: every
+# bulk resolution shares one executor of this size
+CID_RESOLVE_WORKERS = int(os.getenv("CID_RESOLVE_WORKERS", "8"))
+
+
+class _MetadataLRU:
+    """In-process LRU of CID -> metadata; an entry may carry an expiry."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cid):
+        """(found, metadata); an expired entry is dropped and not found."""
+        with self._lock:
+            entry = self._entries.get(cid)
+            if entry is None:
+                return False, None
+            metadata, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[cid]
+                return False, None
+            self._entries.move_to_end(cid)
+            return True, metadata
+
+    def set(self, cid, metadata, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[cid] = (metadata, expires_at)
+            self._entries.move_to_end(cid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CidMetadataStore:
+    """CID -> file metadata, with an in-process LRU in front of MongoDB.
+
+    CIDs are content-addressed, so a resolved entry never goes stale and is
+    kept forever. Misses are fetched concurrently through fetch(cid), which
+    returns the metadata dict or None; a None is cached as a negative entry
+    for CID_NEGATIVE_TTL seconds only. A fetch that raises (a timeout, a
+    5xx) resolves to None for that call and is not cached at all.
+    """
+
+    def __init__(self, collection, fetch, max_entries=CID_CACHE_MAX_ENTRIES,
+                 negative_ttl=CID_NEGATIVE_TTL, max_workers=CID_RESOLVE_WORKERS):
+        self.collection = collection
+        self.fetch = fetch
+        self.negative_ttl = negative_ttl
+        self.local = _MetadataLRU(max_entries)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cid-resolver")
+        self._index_ready = False
+
+    def _remember(self, cid, metadata):
+        self.local.set(cid, metadata, None if metadata is not None else self.negative_ttl)
+
+    def _safe_fetch(self, cid):
+        """(fetched, metadata); fetched is False when the lookup itself failed."""
+        try:
+            return True, self.fetch(cid)
+        except Exception as e:
+            print(f"Error fetching file details for CID {cid}: {str(e)}")
+            return False, None
+
+    def _persist(self, resolved):
+        if not self._index_ready:
+            # Only negative entries carry expires_at, so resolved CIDs never expire
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+        now = datetime.now(timezone.utc)
+        operations = []
+        for cid, metadata in resolved.items():
+            if metadata is not None:
+                update = {"$set": {"metadata": metadata, "resolved_at": now}, "$unset": {"expires_at": ""}}
+            else:
+                update = {"$set": {"metadata": None, "expires_at": now + timedelta(seconds=self.negative_ttl)}}
+            operations.append(UpdateOne({"_id": cid}, update, upsert=True))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def resolve_many(self, cids):
+        """Return {cid: metadata or None} for every CID, with one MongoDB query for all local misses."""
+        results = {}
+        missing = []
+        for cid in dict.fromkeys(cids):
+            found, metadata = self.local.get(cid)
+            if found:
+                results[cid] = metadata
+            else:
+                missing.append(cid)
+        if not missing:
+            return results
+
+        try:
+            now = datetime.now(timezone.utc)
+            for doc in self.collection.find({"_id": {"$in": missing}}):
+                expires_at = doc.get("expires_at")
+                if expires_at is not None:
+                    if expires_at.tzinfo is None:
+                        expires_at = expires_at.replace(tzinfo=timezone.utc)
+                    if expires_at <= now:
+                        continue
+                results[doc["_id"]] = doc["metadata"]
+                self._remember(doc["_id"], doc["metadata"])
+        except Exception as e:
+            print(f"CID metadata lookup failed: {str(e)}")
+
+        to_fetch = [cid for cid in missing if cid not in results]
+        if to_fetch:
+            # One context copy per lookup: a context can be entered by one thread at a time
+            futures = [self._executor.submit(contextvars.copy_context().run, self._safe_fetch, cid) for cid in to_fetch]
+            fetched = {}
+            for cid, future in zip(to_fetch, futures):
+                ok, metadata = future.result()
+                results[cid] = metadata
+                if ok:
+                    fetched[cid] = metadata
+                    self._remember(cid, metadata)
+            try:
+                self._persist(fetched)
+            except Exception as e:
+                print(f"CID metadata write failed: {str(e)}")
+        return results
+
+    def resolve_names(self, cids, default="Unknown"):
+        return {
+            cid: (metadata or {}).get("name") or default
+            for cid, metadata in self.resolve_many(cids).items()
+        }
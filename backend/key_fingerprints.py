@@ -0,0 +1,55 @@
+import hashlib
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
+from pymongo import UpdateOne
+
+FINGERPRINT_FIELD = "public_key_fingerprint"
+
+
+def fingerprint_public_key(public_key):
+    """Hex SHA-256 of the key's DER SubjectPublicKeyInfo."""
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).hexdigest()
+
+
+def fingerprint_pem(public_key_pem):
+    """Fingerprint of a PEM public key, or None if it can't be parsed.
+
+    Hashing the DER form means PEM line-ending or wrapping differences
+    still produce the same fingerprint.
+    """
+    if isinstance(public_key_pem, str):
+        public_key_pem = public_key_pem.encode("utf-8")
+    try:
+        public_key = serialization.load_pem_public_key(public_key_pem, backend=default_backend())
+    except (ValueError, TypeError):
+        return None
+    return fingerprint_public_key(public_key)
+
+
+def backfill_fingerprints(collection, batch_size=500):
+    """Add the fingerprint to every document that has a public_key but no fingerprint.
+
+    Returns (updated, skipped); skipped counts keys that could not be parsed.
+    """
+    updated = skipped = 0
+    operations = []
+    cursor = collection.find(
+        {"public_key": {"$exists": True}, FINGERPRINT_FIELD: {"$exists": False}},
+        {"public_key": 1},
+    ).batch_size(batch_size)
+    for doc in cursor:
+        fingerprint = fingerprint_pem(doc["public_key"])
+        if fingerprint is None:
+            skipped += 1
+            continue
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {FINGERPRINT_FIELD: fingerprint}}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated, skipped
@@ -0,0 +1,42 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+
+# Seconds a lease stays held without being renewed
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", "60"))
+
+
+class Lease:
+    """A named lease held by at most one process of the deployment at a time.
+
+    The lease lives in leases as {"_id": name, "holder": ..., "expires_at": ...}.
+    acquire() takes it when it is free or expired and renews it when this
+    process already holds it, so calling it on every cycle of a background
+    loop keeps one worker in charge. A holder that dies stops renewing and
+    the lease passes to another process after ttl seconds.
+    """
+
+    def __init__(self, leases, name, ttl=LEASE_SECONDS):
+        self.leases = leases
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self):
+        """Take or renew the lease; returns whether this process holds it."""
+        now = datetime.now(timezone.utc)
+        try:
+            self.leases.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Held by another process: the filter missed and the upsert hit its _id
+            return False
+        return True
+
+    def release(self):
+        self.leases.delete_one({"_id": self.name, "holder": self.holder})
@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scraping import one_mg, apollopharmacy, pharmeasy, SCRAPER_PARTS
+from http_client import CONNECT_TIMEOUT, http_request
+from metrics import track
+
+# Per-store deadline in seconds, measured from the moment the search starts
+STORE_TIMEOUT = float(os.getenv("STORE_TIMEOUT", "8"))
+
+
+def _url_query(search):
+    return str(search).replace(" ", "%20").strip()
+
+
+def _plain_query(search):
+    return str(search)
+
+
+def _finalize_one_mg(data):
+    data["price"] = int(str(data["price"]).replace("₹", ""))
+    return data
+
+
+# name, scraper, query builder, post-processing of the scraped dict
+STORES = [
+    ("1mg", one_mg, _url_query, _finalize_one_mg),
+    ("Apollo Pharmacy", apollopharmacy, _plain_query, None),
+    ("PharmEasy", pharmeasy, _url_query, None),
+]
+
+# Shared pool so each search only pays for thread hand-off, not thread start-up.
+# Sized so a few concurrent searches can each run every store at once.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SCRAPER_WORKERS", str(len(STORES) * 4))),
+    thread_name_prefix="scraper",
+)
+
+
+def _run_store(scraper, query, finalize, deadline=None):
+    """Query one store; returns (data, seconds taken).
+
+    With a deadline (a perf_counter() time) the request gets only the time
+    left before it, and is not retried: a worker of the shared pool is freed
+    about when the search stops waiting, instead of a hung store holding it
+    through every retry. Background refreshes pass no deadline.
+    """
+    started = time.perf_counter()
+    with track("pharmacy", scraper.__name__):
+        if scraper not in SCRAPER_PARTS:
+            # A scraper not split into request and parser makes its own request
+            data = scraper(query)
+        else:
+            build_request, parse = SCRAPER_PARTS[scraper]
+            method, url, kwargs = build_request(query)
+            if deadline is None:
+                response = http_request(method, url, **kwargs)
+            else:
+                remaining = deadline - started
+                if remaining <= 0:
+                    raise TimeoutError("Store deadline passed before the request was sent")
+                response = http_request(method, url, retry=False, timeout=(min(CONNECT_TIMEOUT, remaining), remaining), **kwargs)
+            data = parse(response.text)
+    if data and finalize:
+        data = finalize(data)
+    return data, time.perf_counter() - started
+
+
+def _status(store, status, elapsed, error=None, cache_state=None):
+    entry = {"store": store, "status": status, "elapsed_ms": round(elapsed * 1000, 1)}
+    if error:
+        entry["error"] = error
+    if cache_state:
+        entry["cache"] = cache_state
+    return entry
+
+
+def _check_cache(stores, search, cache):
+    """Split stores into cached answers and the ones to query.
+
+    Returns ([(name, value, cache state)], [store to query], {name: cache state}).
+    Stale entries are answered and refreshed in the background.
+    """
+    cached = []
+    to_query = []
+    cache_states = {}
+    for store in stores:
+        name, scraper, build_query, finalize = store
+        if cache is not None:
+            value, state = cache.lookup(name, search)
+            cache_states[name] = state
+            if value is not None:
+                if state == "stale":
+                    query = build_query(search)
+                    cache.refresh(
+                        _executor, name, search,
+                        lambda scraper=scraper, query=query, finalize=finalize: _run_store(scraper, query, finalize)[0],
+                    )
+                cached.append((name, value, state))
+                continue
+        to_query.append(store)
+    return cached, to_query, cache_states
+
+
+def _cached_result(name, value, state, started):
+    value["store"] = name
+    return value, _status(name, "ok", time.perf_counter() - started, cache_state=state)
+
+
+def _settled_result(name, finished, started, cache_state):
+    """(data, status) of a finished store query, a Future or an asyncio Task; data is None unless found."""
+    try:
+        data, elapsed = finished.result()
+    except Exception as e:
+        print(f"Error scraping {name}: {str(e)}")
+        return None, _status(name, "error", time.perf_counter() - started, str(e), cache_state)
+    if not data:
+        return None, _status(name, "empty", elapsed, cache_state=cache_state)
+    data["store"] = name
+    return data, _status(name, "ok", elapsed, cache_state=cache_state)
+
+
+def iter_store_results(search, timeout=None, stores=None, cache=None):
+    """Query every store concurrently and yield (data, status) as each one settles.
+
+    A store that misses its deadline is reported with status "timeout"; its
+    worker is left to finish in the background and its result is discarded.
+    With a cache, fresh and stale entries are answered immediately and stale
+    ones are refreshed in the background.
+    """
+    timeout = STORE_TIMEOUT if timeout is None else timeout
+    stores = STORES if stores is None else stores
+    started = time.perf_counter()
+    deadline = started + timeout
+
+    cached, to_query, cache_states = _check_cache(stores, search, cache)
+    pending = {}
+    for name, scraper, build_query, finalize in to_query:
+        # Copy the request's context so the search is timed against it (see profiling.py)
+        future = _executor.submit(contextvars.copy_context().run, _run_store, scraper, build_query(search), finalize, deadline)
+        pending[future] = name
+
+    for name, value, state in cached:
+        yield _cached_result(name, value, state, started)
+
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            data, status = _settled_result(name, future, started, cache_states.get(name))
+            if data is not None and cache is not None:
+                cache.store(name, search, data)
+            yield data, status
+
+    for future, name in pending.items():
+        future.cancel()
+        yield None, _status(name, "timeout", time.perf_counter() - started, cache_state=cache_states.get(name))
+
+
+def store_order(settled):
+    """Split (data, status) pairs into results and statuses, each in STORES order."""
+    order = {name: index for index, (name, *_) in enumerate(STORES)}
+    results = []
+    statuses = []
+    for data, status in settled:
+        if data:
+            results.append(data)
+        statuses.append(status)
+
+    # Keep the response order stable regardless of which store answered first
+    results.sort(key=lambda item: order.get(item["store"], len(order)))
+    statuses.sort(key=lambda item: order.get(item["store"], len(order)))
+    return results, statuses
+
+
+def search_medicines(search, timeout=None, cache=None):
+    """Return the results of every store that answered in time plus per-store statuses."""
+    return store_order(iter_store_results(search, timeout, cache=cache))
+
+
+async def _arun_store(client, scraper, query, finalize):
+    started = time.perf_counter()
+    build_request, parse = SCRAPER_PARTS[scraper]
+    method, url, kwargs = build_request(query)
+    with track("pharmacy", scraper.__name__):
+        response = await client.request(method, url, **kwargs)
+        # HTML parsing is CPU-bound, so it runs off the event loop
+        data = await asyncio.to_thread(parse, response.text)
+    if data and finalize:
+        data = finalize(data)
+    return data, time.perf_counter() - started
+
+
+async def aiter_store_results(search, client, timeout=None, cache=None):
+    """iter_store_results for the ASGI serving mode, fetching every store over an httpx.AsyncClient."""
+    timeout = STORE_TIMEOUT if timeout is None else timeout
+    started = time.perf_counter()
+    deadline = started + timeout
+
+    cached, to_query, cache_states = await asyncio.to_thread(_check_cache, STORES, search, cache)
+    pending = {
+        asyncio.ensure_future(_arun_store(client, scraper, build_query(search), finalize)): name
+        for name, scraper, build_query, finalize in to_query
+    }
+
+    try:
+        for name, value, state in cached:
+            yield _cached_result(name, value, state, started)
+
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = pending.pop(task)
+                data, status = _settled_result(name, task, started, cache_states.get(name))
+                if data is not None and cache is not None:
+                    await asyncio.to_thread(cache.store, name, search, data)
+                yield data, status
+
+        for name in pending.values():
+            yield None, _status(name, "timeout", time.perf_counter() - started, cache_state=cache_states.get(name))
+    finally:
+        # Also reached when a streaming client disconnects part way
+        for task in pending:
+            task.cancel()
+
+
+async def asearch_medicines(search, client, timeout=None, cache=None):
+    """search_medicines for the ASGI serving mode."""
+    return store_order([settled async for settled in aiter_store_results(search, client, timeout, cache)])
@@ -0,0 +1,234 @@
+"""Latency histograms, error counters and in-flight gauges, served at /metrics.
+
+Every Flask route (and every native route of asgi.py) is timed by method,
+route rule and status. Outbound calls are timed by dependency and operation:
+
+    llm       advice                    model     vectorize, predict
+    mongo     <command>.<collection>    chain     <JSON-RPC method>, tx_confirmation
+    pinata    file_lookup               pharmacy  one_mg, apollopharmacy, pharmeasy
+
+The exposition is the Prometheus text format, produced here rather than
+with prometheus_client; recording a sample is a bisect and a short locked
+update. Metrics are per process: behind several workers, scrape each one.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from pymongo import monitoring
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds in seconds, from a cached lookup up to an LLM completion
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def lines(self):
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+REQUEST_LATENCY = Histogram(
+    "curelink_http_request_duration_seconds", "Time spent serving requests", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge(
+    "curelink_http_requests_in_flight", "Requests being served", ("method", "route"))
+REQUEST_ERRORS = Counter(
+    "curelink_http_request_errors_total", "Requests that raised or returned a 5xx status", ("method", "route"))
+DEPENDENCY_LATENCY = Histogram(
+    "curelink_dependency_duration_seconds", "Time spent in calls to a dependency", ("dependency", "operation"))
+DEPENDENCY_IN_FLIGHT = Gauge(
+    "curelink_dependency_calls_in_flight", "Calls to a dependency not yet finished", ("dependency", "operation"))
+DEPENDENCY_ERRORS = Counter(
+    "curelink_dependency_errors_total", "Calls to a dependency that failed", ("dependency", "operation"))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.lines())
+    return "\n".join(lines) + "\n"
+
+
+_span_listeners = []
+
+
+def add_span_listener(listener):
+    """Call listener(dependency, operation, seconds, error) after every timed dependency call."""
+    _span_listeners.append(listener)
+
+
+def observe_dependency(dependency, operation, seconds, error=False):
+    labels = (dependency, operation)
+    DEPENDENCY_LATENCY.observe(labels, seconds)
+    if error:
+        DEPENDENCY_ERRORS.inc(labels)
+    for listener in _span_listeners:
+        listener(dependency, operation, seconds, error)
+
+
+@contextmanager
+def track(dependency, operation):
+    """Time the enclosed call to a dependency; an exception (or cancellation) counts as an error."""
+    labels = (dependency, operation)
+    DEPENDENCY_IN_FLIGHT.inc(labels)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        DEPENDENCY_IN_FLIGHT.dec(labels)
+        observe_dependency(dependency, operation, time.perf_counter() - started, error)
+
+
+class FirstChunk:
+    """Times a streamed call's first chunk, under its own operation; call it on every chunk."""
+
+    def __init__(self, dependency, operation):
+        self.labels = (dependency, operation)
+        self.started = time.perf_counter()
+        self.seen = False
+
+    def __call__(self):
+        if not self.seen:
+            self.seen = True
+            observe_dependency(*self.labels, time.perf_counter() - self.started)
+
+
+def request_started(method, route):
+    REQUESTS_IN_FLIGHT.inc((method, route))
+    return time.perf_counter()
+
+
+def request_finished(method, route, status, started, error=False):
+    REQUESTS_IN_FLIGHT.dec((method, route))
+    REQUEST_LATENCY.observe((method, route, str(status)), time.perf_counter() - started)
+    if error or status >= 500:
+        REQUEST_ERRORS.inc((method, route))
+
+
+def instrument_flask(app):
+    """Time every request to the app by its route rule (not the raw path, to bound label values)."""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_route = (request.method, request.url_rule.rule if request.url_rule else "unmatched")
+        g.metrics_started = request_started(*g.metrics_route)
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def stop_request_timer(exc):
+        route = g.pop("metrics_route", None)
+        if route is not None:
+            request_finished(*route, g.pop("metrics_status", 500), g.metrics_started, error=exc is not None)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command, labelled e.g. "find.users"."""
+
+    def __init__(self):
+        self._operations = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore names the cursor, with the collection alongside
+            collection = event.command.get("collection")
+        operation = f"{event.command_name}.{collection}" if isinstance(collection, str) else event.command_name
+        self._operations[(event.connection_id, event.request_id)] = operation
+        DEPENDENCY_IN_FLIGHT.inc(("mongo", operation))
+
+    def _finish(self, event, error):
+        operation = self._operations.pop((event.connection_id, event.request_id), None)
+        if operation is None:
+            return
+        DEPENDENCY_IN_FLIGHT.dec(("mongo", operation))
+        observe_dependency("mongo", operation, event.duration_micros / 1e6, error)
+
+    def succeeded(self, event):
+        self._finish(event, error=False)
+
+    def failed(self, event):
+        self._finish(event, error=True)
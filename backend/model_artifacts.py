@@ -0,0 +1,323 @@
+"""Compiled, memory-mappable model artifacts.
+
+The pickled predictor (TF-IDF vectorizer + MultinomialNB + label encoder)
+and the disease/drug CSV are compiled once into plain .npy arrays:
+
+    python model_artifacts.py [--models-dir models]
+
+At runtime the arrays are opened with mmap_mode="r", so every worker on a
+host shares the same pages through the OS page cache, and each component
+is only loaded the first time it is used. When no compiled artifacts are
+present (or they are older than their sources) the pickle and CSV are
+loaded instead.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import numpy as np
+import scipy.sparse as sp
+from drug_index import DrugIndex
+
+FORMAT_VERSION = 1
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+PICKLE_NAME = "disease_predictor.pkl"
+DRUG_CSV_NAME = "disease_drug_data.csv"
+COMPILED_DIR_NAME = "compiled"
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledVectorizer:
+    """Drop-in replacement for the fitted TfidfVectorizer's transform()."""
+
+    def __init__(self, terms, idf, params):
+        self.vocabulary_ = {str(term): index for index, term in enumerate(terms)}
+        self.idf_ = idf
+        self.lowercase = params["lowercase"]
+        self.min_n, self.max_n = params["ngram_range"]
+        self.norm = params["norm"]
+        self.sublinear_tf = params["sublinear_tf"]
+        self._token_pattern = re.compile(params["token_pattern"])
+
+    def _ngrams(self, tokens):
+        if self.max_n == 1:
+            return tokens
+        ngrams = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), self.max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(" ".join(tokens[i:i + n]))
+        return ngrams
+
+    def transform(self, texts):
+        vocabulary = self.vocabulary_
+        indices = []
+        data = []
+        indptr = [0]
+        for text in texts:
+            if self.lowercase:
+                text = text.lower()
+            counts = {}
+            for gram in self._ngrams(self._token_pattern.findall(text)):
+                column = vocabulary.get(gram)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            for column in sorted(counts):
+                indices.append(column)
+                data.append(counts[column])
+            indptr.append(len(indices))
+
+        values = np.asarray(data, dtype=np.float64)
+        indptr = np.asarray(indptr, dtype=np.int64)
+        if self.sublinear_tf:
+            np.log(values, values)
+            values += 1
+        values *= self.idf_[np.asarray(indices, dtype=np.int64)]
+        if self.norm == "l2":
+            rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+            norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=len(indptr) - 1))
+            norms[norms == 0] = 1
+            values /= norms[rows]
+        return sp.csr_matrix(
+            (values, np.asarray(indices, dtype=np.int32), indptr),
+            shape=(len(indptr) - 1, len(vocabulary)),
+        )
+
+
+class CompiledNaiveBayes:
+    """predict()/predict_proba() of a fitted MultinomialNB from its log-probabilities."""
+
+    def __init__(self, feature_log_prob, class_log_prior, classes):
+        self.feature_log_prob_ = feature_log_prob
+        self.class_log_prior_ = class_log_prior
+        self.classes_ = classes
+
+    def _joint_log_likelihood(self, X):
+        return np.asarray(X @ self.feature_log_prob_.T) + self.class_log_prior_
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self._joint_log_likelihood(X), axis=1)]
+
+    def predict_proba(self, X):
+        jll = self._joint_log_likelihood(X)
+        peak = jll.max(axis=1, keepdims=True)
+        log_norm = peak + np.log(np.exp(jll - peak).sum(axis=1, keepdims=True))
+        return np.exp(jll - log_norm)
+
+
+class CompiledLabelEncoder:
+    def __init__(self, classes):
+        self.classes_ = classes
+
+    def inverse_transform(self, y):
+        return self.classes_[np.asarray(y, dtype=np.int64)]
+
+
+def _paths(models_dir):
+    compiled_dir = os.path.join(models_dir, COMPILED_DIR_NAME)
+    return (
+        os.path.join(models_dir, PICKLE_NAME),
+        os.path.join(models_dir, DRUG_CSV_NAME),
+        compiled_dir,
+    )
+
+
+def _load_pickle(pickle_path):
+    import joblib
+    # The pickle references the preprocessing function as __main__.preprocess_text
+    main = sys.modules["__main__"]
+    if not hasattr(main, "preprocess_text"):
+        from utils import preprocess_text
+        main.preprocess_text = preprocess_text
+    return joblib.load(pickle_path)
+
+
+def compile_artifacts(models_dir=MODELS_DIR):
+    """Write the compiled arrays for the pickle and CSV found in models_dir."""
+    import pandas as pd
+    pickle_path, csv_path, compiled_dir = _paths(models_dir)
+    components = _load_pickle(pickle_path)
+    model = components["model"]
+    vectorizer = components["vectorizer"]
+    label_encoder = components["label_encoder"]
+
+    if type(model).__name__ != "MultinomialNB" or type(vectorizer).__name__ != "TfidfVectorizer":
+        raise ValueError(f"Unsupported model types: {type(model).__name__}, {type(vectorizer).__name__}")
+    params = vectorizer.get_params()
+    if params["analyzer"] != "word" or params["tokenizer"] or params["preprocessor"] or params["stop_words"] or params["strip_accents"]:
+        raise ValueError("Only plain word-analyzer TF-IDF vectorizers can be compiled")
+
+    os.makedirs(compiled_dir, exist_ok=True)
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+
+    def save(name, array):
+        np.save(os.path.join(compiled_dir, name), np.ascontiguousarray(array))
+
+    save("vocab_terms.npy", np.array(terms, dtype=str))
+    save("idf.npy", vectorizer.idf_.astype(np.float64))
+    save("feature_log_prob.npy", model.feature_log_prob_.astype(np.float64))
+    save("class_log_prior.npy", model.class_log_prior_.astype(np.float64))
+    save("model_classes.npy", model.classes_)
+    save("label_classes.npy", np.array(label_encoder.classes_, dtype=str))
+
+    # Drug table as two int32 code columns plus their string dictionaries
+    drug_df = pd.read_csv(csv_path)
+    disease_codes, diseases = pd.factorize(drug_df["disease"])
+    drug_codes, drugs = pd.factorize(drug_df["drug"])
+    save("drug_table_diseases.npy", np.array(diseases, dtype=str))
+    save("drug_table_drugs.npy", np.array(drugs, dtype=str))
+    save("drug_table_codes.npy", np.column_stack([disease_codes, drug_codes]).astype(np.int32))
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "vectorizer": {
+            "lowercase": params["lowercase"],
+            "ngram_range": list(params["ngram_range"]),
+            "token_pattern": params["token_pattern"],
+            "norm": params["norm"],
+            "sublinear_tf": params["sublinear_tf"],
+        },
+        "sources": {PICKLE_NAME: os.path.getsize(pickle_path), DRUG_CSV_NAME: os.path.getsize(csv_path)},
+        "compiled_at": time.time(),
+    }
+    with open(os.path.join(compiled_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return compiled_dir
+
+
+class ModelArtifacts:
+    """Lazily loaded model components with per-component load timings (ms)."""
+
+    def __init__(self, models_dir=MODELS_DIR):
+        self.pickle_path, self.csv_path, self.compiled_dir = _paths(models_dir)
+        self.timings = {}
+        self.source = None
+        self._lock = threading.RLock()
+        self._loaded = {}
+        self._meta = None
+
+    def _compiled_meta(self):
+        meta_path = os.path.join(self.compiled_dir, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("format_version") != FORMAT_VERSION:
+            return None
+        for source in (self.pickle_path, self.csv_path):
+            # A deployment may ship only the compiled artifacts
+            if not os.path.exists(source):
+                continue
+            if os.path.getmtime(source) > os.path.getmtime(meta_path):
+                logger.warning("Compiled model artifacts are older than %s; loading the originals", source)
+                return None
+        return meta
+
+    def _load_array(self, name):
+        return np.load(os.path.join(self.compiled_dir, name), mmap_mode="r")
+
+    def _timed(self, name, loader):
+        started = time.perf_counter()
+        value = loader()
+        self.timings[name] = round((time.perf_counter() - started) * 1000, 2)
+        return value
+
+    def _get(self, name):
+        if name in self._loaded:
+            return self._loaded[name]
+        with self._lock:
+            if name not in self._loaded:
+                if self.source is None:
+                    self._meta = self._compiled_meta()
+                    self.source = "compiled" if self._meta else "pickle"
+                loader = getattr(self, f"_load_{self.source}_{name}")
+                self._loaded[name] = self._timed(name, loader)
+                logger.info("Loaded %s from %s in %s ms", name, self.source, self.timings[name])
+            return self._loaded[name]
+
+    @property
+    def vectorizer(self):
+        return self._get("vectorizer")
+
+    @property
+    def model(self):
+        return self._get("model")
+
+    @property
+    def label_encoder(self):
+        return self._get("label_encoder")
+
+    @property
+    def drug_index(self):
+        return self._get("drug_index")
+
+    def preload(self):
+        """Load every component now, e.g. in a pre-forking master before workers fork."""
+        for name in ("vectorizer", "model", "label_encoder", "drug_index"):
+            self._get(name)
+
+    def _load_compiled_vectorizer(self):
+        return CompiledVectorizer(
+            self._load_array("vocab_terms.npy"),
+            self._load_array("idf.npy"),
+            self._meta["vectorizer"],
+        )
+
+    def _load_compiled_model(self):
+        return CompiledNaiveBayes(
+            self._load_array("feature_log_prob.npy"),
+            self._load_array("class_log_prior.npy"),
+            self._load_array("model_classes.npy"),
+        )
+
+    def _load_compiled_label_encoder(self):
+        return CompiledLabelEncoder(self._load_array("label_classes.npy"))
+
+    def _load_compiled_drug_index(self):
+        diseases = self._load_array("drug_table_diseases.npy")
+        drugs = self._load_array("drug_table_drugs.npy")
+        codes = self._load_array("drug_table_codes.npy")
+        return DrugIndex(zip(diseases[codes[:, 0]].tolist(), drugs[codes[:, 1]].tolist()))
+
+    def _pickle_components(self):
+        if "components" not in self._loaded:
+            self._loaded["components"] = self._timed("pickle", lambda: _load_pickle(self.pickle_path))
+        return self._loaded["components"]
+
+    def _load_pickle_vectorizer(self):
+        return self._pickle_components()["vectorizer"]
+
+    def _load_pickle_model(self):
+        return self._pickle_components()["model"]
+
+    def _load_pickle_label_encoder(self):
+        return self._pickle_components()["label_encoder"]
+
+    def _load_pickle_drug_index(self):
+        import pandas as pd
+        return DrugIndex.from_dataframe(pd.read_csv(self.csv_path))
+
+    def status(self):
+        return {
+            "source": self.source,
+            "loaded": sorted(name for name in self._loaded if name != "components"),
+            "timings_ms": dict(self.timings),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile model artifacts into memory-mappable arrays")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    compiled_dir = compile_artifacts(args.models_dir)
+    print(f"Compiled artifacts written to {compiled_dir} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import time
+from price_cache import LocalBackend
+
+# Names can be edited, so they are only reused for a short while
+PATIENT_NAME_TTL = float(os.getenv("PATIENT_NAME_TTL", "30"))
+PATIENT_NAME_CACHE_SIZE = int(os.getenv("PATIENT_NAME_CACHE_SIZE", "10000"))
+UNKNOWN_PATIENT = "Unknown Patient"
+
+
+def format_patient_name(user):
+    return f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+
+
+class PatientNameResolver:
+    """Resolves patient IDs to display names with one $in query per batch."""
+
+    def __init__(self, collection, ttl=PATIENT_NAME_TTL, max_entries=PATIENT_NAME_CACHE_SIZE):
+        self.collection = collection
+        self.ttl = ttl
+        self.local = LocalBackend(max_entries)
+
+    def names_for(self, patient_ids):
+        """Return {patient_id: name} for every ID, querying MongoDB once for the uncached ones."""
+        names = {}
+        missing = []
+        now = time.time()
+        for patient_id in dict.fromkeys(patient_ids):
+            entry = self.local.get(patient_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                names[patient_id] = entry[0]
+            else:
+                missing.append(patient_id)
+
+        if missing:
+            cursor = self.collection.find(
+                {"id": {"$in": missing}},
+                {"_id": 0, "id": 1, "first_name": 1, "last_name": 1},
+            )
+            for user in cursor:
+                names[user["id"]] = format_patient_name(user)
+            for patient_id in missing:
+                names.setdefault(patient_id, UNKNOWN_PATIENT)
+                self.local.set(patient_id, names[patient_id], now, self.ttl)
+        return names
+
+    def name_for(self, patient_id):
+        return self.names_for([patient_id])[patient_id]
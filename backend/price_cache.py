@@ -0,0 +1,160 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+# Seconds a cached price is served as fresh
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "900"))
+# Extra seconds a stale price may still be served while it is refreshed
+PRICE_CACHE_STALE_TTL = float(os.getenv("PRICE_CACHE_STALE_TTL", "3600"))
+PRICE_CACHE_MAX_ENTRIES = int(os.getenv("PRICE_CACHE_MAX_ENTRIES", "2048"))
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_query(search):
+    return _whitespace.sub(" ", str(search)).strip().lower()
+
+
+class LocalBackend:
+    """In-process LRU store of (value, stored_at) pairs."""
+
+    def __init__(self, max_entries=PRICE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, stored_at, expires_in):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MongoBackend:
+    """Shared store so several workers reuse each other's warm entries."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        # Mongo's TTL monitor removes entries once they are too old to serve even stale
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def get(self, key):
+        doc = self.collection.find_one({"_id": key}, {"value": 1, "stored_at": 1})
+        if not doc:
+            return None
+        return doc["value"], doc["stored_at"]
+
+    def set(self, key, value, stored_at, expires_in):
+        self.collection.update_one(
+            {"_id": key},
+            {"$set": {
+                "value": value,
+                "stored_at": stored_at,
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+            }},
+            upsert=True,
+        )
+
+    def __len__(self):
+        return self.collection.estimated_document_count()
+
+
+class PriceCache:
+    """Per-store cache of scraped prices with stale-while-revalidate."""
+
+    def __init__(self, backend, ttl=PRICE_CACHE_TTL, stale_ttl=PRICE_CACHE_STALE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "refresh_errors": 0}
+
+    @staticmethod
+    def key(store, search):
+        return f"{store}:{normalize_query(search)}"
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def lookup(self, store, search):
+        """Return (value, state) where state is "hit", "stale" or "miss"."""
+        try:
+            entry = self.backend.get(self.key(store, search))
+        except Exception as e:
+            print(f"Price cache lookup failed: {str(e)}")
+            entry = None
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count("hits")
+                return dict(value), "hit"
+            if age < self.ttl + self.stale_ttl:
+                self._count("stale")
+                return dict(value), "stale"
+        self._count("misses")
+        return None, "miss"
+
+    def store(self, store, search, value):
+        try:
+            self.backend.set(self.key(store, search), dict(value), time.time(), self.ttl + self.stale_ttl)
+        except Exception as e:
+            print(f"Price cache write failed: {str(e)}")
+
+    def refresh(self, executor, store, search, fetch):
+        """Re-fetch a stale entry in the background, at most once per key at a time."""
+        key = self.key(store, search)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                value = fetch()
+                if value:
+                    self.store(store, search, value)
+                self._count("refreshes")
+            except Exception as e:
+                print(f"Background refresh of {key} failed: {str(e)}")
+                self._count("refresh_errors")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        executor.submit(run)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"] + stats["stale"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["stale"]) / lookups, 4) if lookups else 0.0
+        try:
+            stats["entries"] = len(self.backend)
+        except Exception:
+            stats["entries"] = None
+        stats["backend"] = type(self.backend).__name__
+        return stats
+
+
+def create_price_cache(db=None):
+    """Build the cache selected by PRICE_CACHE_BACKEND ("local" or "mongo")."""
+    if os.getenv("PRICE_CACHE_BACKEND", "local").lower() == "mongo" and db is not None:
+        return PriceCache(MongoBackend(db.price_cache))
+    return PriceCache(LocalBackend())
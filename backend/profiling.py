@@ -0,0 +1,227 @@
+"""Sampling profiler and slow-request capture.
+
+profile_threads() samples the stack of every thread for a few seconds
+and returns the counts as collapsed stacks ("root;caller;callee count"
+per line), the input format of flamegraph.pl, speedscope and similar
+tools.
+
+SlowRequestRecorder samples only the threads serving a request, while
+they serve it. Each request also records a span for every dependency
+call timed through metrics.py. A request that takes longer than the
+threshold keeps its samples and spans in a bounded ring buffer. Faster
+requests are dropped when they finish. Native asgi.py routes share the
+event loop thread, so only WSGI requests are sampled. Server-sent event
+streams are long by design and are not captured.
+"""
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "50"))
+SLOW_REQUEST_SAMPLE_MS = float(os.getenv("SLOW_REQUEST_SAMPLE_MS", "10"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Shortest sampling interval; below it the sampler would just spin holding the GIL
+PROFILE_MIN_INTERVAL = 0.001
+# Distinct stacks kept per request, so a long request can't grow without bound
+MAX_STACKS_PER_REQUEST = 2000
+
+_thread_number = re.compile(r"\d+")
+
+
+def collapse(frame, root=None):
+    """One stack as "root;outermost;...;innermost"."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    if root:
+        names.append(root)
+    return ";".join(reversed(names))
+
+
+def format_collapsed(counts):
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+_profile_lock = threading.Lock()
+
+
+def profile_threads(seconds, interval=0.005):
+    """Sample all other threads for the given time; returns a Counter of collapsed stacks.
+
+    Stacks are rooted at the thread's name, with numbers folded so pool
+    threads merge. The interval is raised to at least PROFILE_MIN_INTERVAL.
+    Raises ProfilerBusy if a profile is already running.
+    """
+    interval = max(interval, PROFILE_MIN_INTERVAL)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        counts = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+        while time.monotonic() < deadline:
+            names = {thread.ident: _thread_number.sub("N", thread.name) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    counts[collapse(frame, names.get(ident, "thread"))] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        _profile_lock.release()
+
+
+class _Request:
+    __slots__ = ("method", "route", "path", "started", "started_at", "thread", "spans", "samples")
+
+    def __init__(self, method, route, path):
+        self.method = method
+        self.route = route
+        self.path = path
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        self.thread = threading.get_ident()
+        self.spans = []
+        self.samples = Counter()
+
+
+_current_request = contextvars.ContextVar("slow_request", default=None)
+
+
+class SlowRequestRecorder:
+    def __init__(self, threshold_ms=SLOW_REQUEST_MS, capacity=SLOW_REQUEST_BUFFER, sample_ms=SLOW_REQUEST_SAMPLE_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = sample_ms / 1000
+        self.captured = deque(maxlen=capacity)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler = None
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def start(self, method, route, path):
+        """Begin recording the current request; returns a token for finish()."""
+        request = _Request(method, route, path)
+        with self._lock:
+            self._active[request.thread] = request
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="slow-request-sampler", daemon=True)
+                self._sampler.start()
+        self._wake.set()
+        return _current_request.set(request)
+
+    def finish(self, token, status):
+        request = self.discard(token)
+        if request is None:
+            return
+        elapsed = time.perf_counter() - request.started
+        if elapsed >= self.threshold:
+            self.captured.append(self._summary(request, status, elapsed))
+
+    def discard(self, token):
+        """Stop recording the current request without capturing it; returns its record."""
+        request = _current_request.get()
+        _current_request.reset(token)
+        if request is not None:
+            with self._lock:
+                self._active.pop(request.thread, None)
+        return request
+
+    def record_span(self, dependency, operation, seconds, error=False):
+        """Hook for metrics.py: attach a finished dependency call to the current request."""
+        request = _current_request.get()
+        if request is not None:
+            ended = time.perf_counter() - request.started
+            request.spans.append((dependency, operation, ended - seconds, seconds, error))
+
+    def _sample_loop(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active.values())
+                if not active:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for request in active:
+                frame = frames.get(request.thread)
+                if frame is None:
+                    continue
+                stack = collapse(frame)
+                if len(request.samples) < MAX_STACKS_PER_REQUEST or stack in request.samples:
+                    request.samples[stack] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _summary(self, request, status, elapsed):
+        totals = {}
+        for dependency, _, _, seconds, _ in request.spans:
+            totals[dependency] = totals.get(dependency, 0) + seconds
+        return {
+            "method": request.method,
+            "route": request.route,
+            "path": request.path,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+            "started_at": request.started_at.isoformat(),
+            "spans": [
+                {"dependency": dependency, "operation": operation, "offset_ms": round(offset * 1000, 1),
+                 "duration_ms": round(seconds * 1000, 1), "error": error}
+                for dependency, operation, offset, seconds, error in request.spans
+            ],
+            "span_totals_ms": {dependency: round(seconds * 1000, 1) for dependency, seconds in totals.items()},
+            "sample_interval_ms": self.interval * 1000,
+            "samples": format_collapsed(request.samples),
+        }
+
+    def recent(self):
+        """Captured slow requests, newest first."""
+        return list(reversed(self.captured))
+
+
+def capture_slow_requests(app, recorder):
+    """Record every request to the app with the recorder.
+
+    The /admin routes themselves are skipped, as are text/event-stream
+    responses, which stay open for as long as the stream runs.
+    """
+    from flask import g, request
+
+    if not recorder.enabled:
+        return
+
+    @app.before_request
+    def start_capture():
+        if not request.path.startswith("/admin/"):
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            g.slow_request_token = recorder.start(request.method, route, request.path)
+
+    @app.after_request
+    def record_capture_status(response):
+        g.slow_request_status = response.status_code
+        g.slow_request_streamed = response.mimetype == "text/event-stream"
+        return response
+
+    @app.teardown_request
+    def finish_capture(exc):
+        token = g.pop("slow_request_token", None)
+        if token is None:
+            return
+        if g.pop("slow_request_streamed", False):
+            recorder.discard(token)
+        else:
+            recorder.finish(token, g.pop("slow_request_status", 500))
@@ -0,0 +1,170 @@
+"""Filtering, cursor pagination and sparse fieldsets for report listings.
+
+Listing requests may carry, next to the patient or hospital ID:
+
+    limit            page size; without it every matching report is returned
+    cursor           opaque next_cursor from the previous page
+    disease          case-insensitive exact match
+    status           "approved", "rejected" or "pending"
+    added_by_patient true/false
+    uploaded_from / uploaded_to / treatment_from / treatment_to
+                     inclusive YYYY-MM-DD bounds
+    fields           list of response fields to include
+
+Reports are ordered by document ID, and the cursor records the last ID
+returned, so pages stay stable while new reports are added.
+"""
+import base64
+import json
+import os
+import re
+from datetime import date, timedelta
+
+REPORTS_PAGE_MAX = int(os.getenv("REPORTS_PAGE_MAX", "200"))
+
+DOCUMENT_FIELDS = (
+    "document_id", "patient_id", "patient_name", "file_details", "hospital_id",
+    "doctor_name", "is_approved", "is_rejected", "added_by_patient", "disease",
+    "hospital_name", "medication", "treatment_date", "summary", "uploaded_date",
+    "report_hashes",
+)
+STATUSES = ("approved", "rejected", "pending")
+# Request parameter -> report key holding an ISO date string
+DATE_RANGES = {"uploaded": "uploadedDate", "treatment": "treatmentDate"}
+
+
+class ListingError(ValueError):
+    pass
+
+
+def encode_cursor(document_id):
+    payload = json.dumps({"after": int(document_id)}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["after"])
+    except Exception:
+        raise ListingError("Invalid cursor")
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ListingError(f"{name} must be a YYYY-MM-DD date")
+
+
+def parse_listing_options(data):
+    """Validate the listing parameters of a request body into an options dict."""
+    options = {"limit": None, "after": None, "fields": None}
+
+    limit = data.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ListingError("limit must be an integer")
+        if not 1 <= limit <= REPORTS_PAGE_MAX:
+            raise ListingError(f"limit must be between 1 and {REPORTS_PAGE_MAX}")
+        options["limit"] = limit
+    if data.get("cursor"):
+        options["after"] = decode_cursor(str(data["cursor"]))
+
+    fields = data.get("fields")
+    if fields is not None:
+        if isinstance(fields, str):
+            fields = [field.strip() for field in fields.split(",") if field.strip()]
+        if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+            raise ListingError("fields must be a list of field names or a comma-separated string")
+        unknown = [field for field in fields if field not in DOCUMENT_FIELDS]
+        if unknown:
+            raise ListingError(f"Unknown fields: {', '.join(unknown)}")
+        options["fields"] = set(fields)
+
+    if data.get("disease"):
+        options["disease"] = str(data["disease"]).strip()
+    status = data.get("status")
+    if status:
+        if status not in STATUSES:
+            raise ListingError(f"status must be one of {', '.join(STATUSES)}")
+        options["status"] = status
+    added_by_patient = data.get("added_by_patient")
+    if added_by_patient is not None:
+        if isinstance(added_by_patient, str):
+            added_by_patient = added_by_patient.lower() in ("1", "true", "yes")
+        options["added_by_patient"] = bool(added_by_patient)
+
+    for prefix, key in DATE_RANGES.items():
+        start = data.get(f"{prefix}_from")
+        end = data.get(f"{prefix}_to")
+        if start or end:
+            # Stored as ISO strings, so string comparison against [from, to + 1 day) is a date range
+            options[key] = (
+                _parse_date(start, f"{prefix}_from").isoformat() if start else None,
+                (_parse_date(end, f"{prefix}_to") + timedelta(days=1)).isoformat() if end else None,
+            )
+    return options
+
+
+def mongo_filter(options, prefix="report."):
+    """The options' filters as a MongoDB query on projected reports."""
+    query = {}
+    if "disease" in options:
+        query[prefix + "disease"] = {"$regex": f"^{re.escape(options['disease'])}$", "$options": "i"}
+    if "status" in options:
+        status = options["status"]
+        query[prefix + "isApproved"] = status == "approved"
+        query[prefix + "isRejected"] = status == "rejected"
+    if "added_by_patient" in options:
+        query[prefix + "addedByPatient"] = options["added_by_patient"]
+    for key in DATE_RANGES.values():
+        if key in options:
+            start, end = options[key]
+            bounds = {}
+            if start:
+                bounds["$gte"] = start
+            if end:
+                bounds["$lt"] = end
+            query[prefix + key] = bounds
+    return query
+
+
+def report_matches(report, options):
+    """Python equivalent of mongo_filter, for reports read straight from the chain."""
+    if "disease" in options and str(report["disease"]).casefold() != options["disease"].casefold():
+        return False
+    if "status" in options:
+        status = options["status"]
+        if bool(report["isApproved"]) != (status == "approved") or bool(report["isRejected"]) != (status == "rejected"):
+            return False
+    if "added_by_patient" in options and bool(report["addedByPatient"]) != options["added_by_patient"]:
+        return False
+    for key in DATE_RANGES.values():
+        if key in options:
+            start, end = options[key]
+            value = str(report[key])
+            if (start and value < start) or (end and value >= end):
+                return False
+    return True
+
+
+def split_page(reports, limit):
+    """Cut a list fetched with limit + 1 rows into (page, next_cursor)."""
+    if limit is None or len(reports) <= limit:
+        return reports, None
+    page = reports[:limit]
+    return page, encode_cursor(page[-1]["documentId"])
+
+
+def paginate(reports, options):
+    """Filter and page an already loaded report list, returning (page, next_cursor)."""
+    after = options["after"]
+    matching = sorted(
+        (report for report in reports
+         if (after is None or int(report["documentId"]) > after) and report_matches(report, options)),
+        key=lambda report: int(report["documentId"]),
+    )
+    return split_page(matching, options["limit"])
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pymongo import ASCENDING, UpdateOne
+
+# How far (in blocks) the projection may trail the current chain head and still be served
+PROJECTION_MAX_LAG = int(os.getenv("REPORT_PROJECTION_MAX_LAG", "5"))
+# Seconds without a successful sync before the projection is considered stale
+PROJECTION_MAX_AGE = float(os.getenv("REPORT_PROJECTION_MAX_AGE", "120"))
+PROJECTION_SYNC_INTERVAL = float(os.getenv("REPORT_PROJECTION_SYNC_INTERVAL", "15"))
+PROJECTION_CHUNK = int(os.getenv("REPORT_PROJECTION_CHUNK", "2000"))
+# Seconds a read of the chain head is reused when checking the projection's lag
+HEAD_CACHE_SECONDS = float(os.getenv("REPORT_PROJECTION_HEAD_CACHE", "2"))
+# The contract's deployment block, where a first sync starts. Required: without it
+# the first sync would scan every block since genesis.
+CONTRACT_DEPLOY_BLOCK = int(os.environ["CONTRACT_DEPLOY_BLOCK"]) if os.getenv("CONTRACT_DEPLOY_BLOCK") else None
+
+REPORT_EVENTS = ("ReportAdded", "ReportApproved", "ReportRejected")
+STATE_ID = "reports"
+
+
+def deploy_block():
+    if CONTRACT_DEPLOY_BLOCK is None:
+        raise RuntimeError("CONTRACT_DEPLOY_BLOCK is not set; refusing to scan the chain from genesis")
+    return CONTRACT_DEPLOY_BLOCK
+
+
+def fresh_state(state, head, max_lag=PROJECTION_MAX_LAG, max_age=PROJECTION_MAX_AGE):
+    """state if it was written within max_age seconds and its last block is at most max_lag behind head.
+
+    head is the current chain head; when it could not be read (None) only
+    the age is checked.
+    """
+    if not state:
+        return None
+    updated_at = state["updated_at"]
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    age = (datetime.now(timezone.utc) - updated_at).total_seconds()
+    if age > max_age or (head is not None and head - state["block"] > max_lag):
+        return None
+    return state
+
+
+def report_criteria(owner, query=None, after=None):
+    criteria = dict(owner, **(query or {}))
+    if after is not None:
+        criteria["document_id"] = {"$gt": after}
+    return criteria
+
+
+class ReportProjection:
+    """MongoDB read model of the reports stored on-chain.
+
+    Each report is stored as the dict the contract's getReports returns,
+    indexed by patient and hospital. The projection is driven by the
+    contract's report events: every patient touched by an event in a block
+    range is re-read with getReports and upserted. A watermark records the
+    last block applied and the chain head seen at the time.
+    """
+
+    def __init__(self, web3, contract, db):
+        self.web3 = web3
+        self.contract = contract
+        self.reports = db.reports
+        self.state = db.projection_state
+        self._indexes_ready = False
+        self._sync_lock = threading.Lock()
+        self._head = None
+        self._head_read_at = float("-inf")
+
+    def ensure_indexes(self):
+        if not self._indexes_ready:
+            self.reports.create_index([("patient_id", ASCENDING), ("document_id", ASCENDING)], unique=True)
+            self.reports.create_index([("hospital_id", ASCENDING), ("document_id", ASCENDING)])
+            self._indexes_ready = True
+
+    def watermark(self):
+        return self.state.find_one({"_id": STATE_ID})
+
+    def set_watermark(self, block, head):
+        self.state.update_one(
+            {"_id": STATE_ID},
+            {"$set": {"block": block, "head": head, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    def chain_head(self):
+        """The current block number, re-read at most every HEAD_CACHE_SECONDS; None if the node is unreachable."""
+        # A failed read is cached too, so an unreachable node costs one attempt per interval
+        if time.monotonic() - self._head_read_at > HEAD_CACHE_SECONDS:
+            self._head_read_at = time.monotonic()
+            try:
+                self._head = self.web3.eth.block_number
+            except Exception as e:
+                print(f"Failed to read the chain head: {str(e)}")
+                self._head = None
+        return self._head
+
+    def fresh_watermark(self, max_lag=PROJECTION_MAX_LAG, max_age=PROJECTION_MAX_AGE):
+        """The watermark if the last sync is recent and within max_lag blocks of the current head, else None."""
+        return fresh_state(self.watermark(), self.chain_head(), max_lag, max_age)
+
+    def fetch_logs(self, from_block, to_block):
+        """Decoded report event logs between the two blocks (inclusive)."""
+        logs = []
+        for name in REPORT_EVENTS:
+            event = getattr(self.contract.events, name)
+            logs.extend(event.get_logs(from_block=from_block, to_block=to_block))
+        return logs
+
+    def patients_in_range(self, from_block, to_block):
+        """Patient IDs touched by any report event between the two blocks (inclusive)."""
+        return {int(log["args"]["patientId"]) for log in self.fetch_logs(from_block, to_block)}
+
+    def refresh_patients(self, patient_ids, block=None):
+        """Re-read each patient's reports from the contract and upsert them."""
+        operations = []
+        for patient_id in patient_ids:
+            reports_json = self.contract.functions.getReports(patient_id).call()
+            reports = json.loads(reports_json) if reports_json and reports_json != "[]" else []
+            # Drop rows the chain no longer has, e.g. after a reorg
+            self.reports.delete_many({
+                "patient_id": patient_id,
+                "document_id": {"$nin": [int(report["documentId"]) for report in reports]},
+            })
+            for report in reports:
+                report.setdefault("patientId", patient_id)
+                operations.append(UpdateOne(
+                    {"patient_id": patient_id, "document_id": int(report["documentId"])},
+                    {"$set": {
+                        "hospital_id": int(report["hospitalId"]),
+                        "report": report,
+                        "synced_block": block,
+                    }},
+                    upsert=True,
+                ))
+        if operations:
+            self.reports.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def sync(self, chunk=PROJECTION_CHUNK):
+        """Apply all events since the watermark up to the current head."""
+        with self._sync_lock:
+            self.ensure_indexes()
+            state = self.watermark()
+            start = state["block"] + 1 if state else deploy_block()
+            head = self.web3.eth.block_number
+            applied = 0
+            while start <= head:
+                end = min(start + chunk - 1, head)
+                applied += self.refresh_patients(self.patients_in_range(start, end), end)
+                self.set_watermark(end, head)
+                start = end + 1
+            # Also refreshes the timestamp when there was nothing new to apply
+            self.set_watermark(start - 1, head)
+            return applied
+
+    def find_reports(self, owner, query=None, after=None, limit=None):
+        """Reports of owner ({"patient_id": ...} or {"hospital_id": ...}) matching query, by document ID."""
+        cursor = self.reports.find(report_criteria(owner, query, after), {"report": 1}).sort("document_id", ASCENDING)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return [doc["report"] for doc in cursor]
@@ -1,16 +1,19 @@
-import requests
+from http_client import http_get, http_post
 from bs4 import BeautifulSoup
 import json
 import re
-def one_mg(query):
+# Each store is split into a request builder returning (method, url, request kwargs)
+# and a parser of the response text, so the sync scrapers below and the async
+# search in medicine_search.py share the same requests and parsing.
+
+def one_mg_request(query):
   headers = {
       "referer": "https://www.1mg.com/search/all",
       "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36"
   }
+  return "GET", f"https://www.1mg.com/search/all?name={query}", {"headers": headers}
 
-  # Sending the request
-  response = requests.get(f"https://www.1mg.com/search/all?name={query}", headers=headers).text
-
+def parse_one_mg(response):
   # Parsing the HTML
   soup = BeautifulSoup(response, 'html.parser')
 
@@ -44,8 +47,14 @@ def one_mg(query):
     one_mg_data["price"] = price
     return one_mg_data
 
+def one_mg(query):
+  # Sending the request
+  _, url, kwargs = one_mg_request(query)
+  response = http_get(url, **kwargs).text
+  return parse_one_mg(response)
 
-def apollopharmacy(query):
+
+def apollopharmacy_request(query):
   headers = {
       "authority": "search.apollo247.com",
       "method": "POST",
@@ -79,8 +88,10 @@ def apollopharmacy(query):
       "pincode": ""
   }
 
+  return "POST", "https://search.apollo247.com/v3/fullSearch", {"json": payload, "headers": headers}
+
+def parse_apollopharmacy(response):
   apollo_data = {}
-  response = requests.post("https://search.apollo247.com/v3/fullSearch", json=payload,headers=headers).text
   json_data = json.loads(response)["data"]["products"][0]
   print("URL:","https://www.apollopharmacy.in/otc/"+ json_data["urlKey"])
   print("Title:",json_data["name"])
@@ -97,9 +108,16 @@ def apollopharmacy(query):
   apollo_data["price"] = json_data["specialPrice"]
   return apollo_data
 
+def apollopharmacy(query):
+  _, url, kwargs = apollopharmacy_request(query)
+  response = http_post(url, **kwargs).text
+  return parse_apollopharmacy(response)
 
-def pharmeasy(query):
-  response = requests.get(f"https://pharmeasy.in/search/all?name={query}").text
+
+def pharmeasy_request(query):
+  return "GET", f"https://pharmeasy.in/search/all?name={query}", {}
+
+def parse_pharmeasy(response):
   soup = BeautifulSoup(response, 'html.parser')
   product_card = soup.find_all(class_=re.compile("ProductCard_medicineUnitContainer"))
   if product_card!=[]:
@@ -118,4 +136,17 @@ def pharmeasy(query):
         "pack_size":product_card.find(class_=re.compile("ProductCard_measurementUnit")).text,
         "price":price
     }
-    return pharmeasy_data
\ No newline at end of file
+    return pharmeasy_data
+
+def pharmeasy(query):
+  _, url, kwargs = pharmeasy_request(query)
+  response = http_get(url, **kwargs).text
+  return parse_pharmeasy(response)
+
+
+# scraper -> (request builder, parser)
+SCRAPER_PARTS = {
+  one_mg: (one_mg_request, parse_one_mg),
+  apollopharmacy: (apollopharmacy_request, parse_apollopharmacy),
+  pharmeasy: (pharmeasy_request, parse_pharmeasy),
+}
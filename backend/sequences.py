@@ -0,0 +1,63 @@
+import os
+import threading
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# IDs each process reserves per round-trip to the counter document
+SEQUENCE_BLOCK_SIZE = int(os.getenv("SEQUENCE_BLOCK_SIZE", "20"))
+
+
+class Sequence:
+    """Allocates unique integer IDs from an atomic counter document.
+
+    The counter lives in counters as {"_id": name, "value": last reserved}.
+    Each process reserves block_size IDs with one $inc and hands them out
+    from memory, so concurrent workers never share an ID. IDs from a block
+    that is not used up before the process exits are skipped, so the
+    sequence can have gaps. On first use the counter is raised to the
+    largest ID already in seed_collection.
+    """
+
+    def __init__(self, counters, name, seed_collection=None, field="id", block_size=SEQUENCE_BLOCK_SIZE):
+        self.counters = counters
+        self.name = name
+        self.seed_collection = seed_collection
+        self.field = field
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._seeded = False
+
+    def _seed(self):
+        current_max = 0
+        if self.seed_collection is not None:
+            last = self.seed_collection.find_one({}, {self.field: 1}, sort=[(self.field, DESCENDING)])
+            if last and self.field in last:
+                current_max = int(last[self.field])
+        try:
+            self.counters.update_one({"_id": self.name}, {"$max": {"value": current_max}}, upsert=True)
+        except DuplicateKeyError:
+            # Another process created the counter first; $max again against its document
+            self.counters.update_one({"_id": self.name}, {"$max": {"value": current_max}})
+        self._seeded = True
+
+    def _reserve(self):
+        counter = self.counters.find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"value": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._end = counter["value"] + 1
+        self._next = self._end - self.block_size
+
+    def next(self):
+        with self._lock:
+            if not self._seeded:
+                self._seed()
+            if self._next >= self._end:
+                self._reserve()
+            value = self._next
+            self._next += 1
+            return value
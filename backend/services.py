@@ -0,0 +1,116 @@
+"""Lazily created service singletons and the startup profile.
+
+Heavy dependencies (langchain, web3, NLTK) are imported, and clients are
+connected, the first time something uses them rather than when a worker
+imports app.py. The registry records how long each of those imports and
+each service's construction took; app.py serves it at /api/startup-report.
+For a breakdown of the eager imports as well, run with python -X importtime.
+"""
+import importlib
+import sys
+import threading
+import time
+
+# Set when the process started importing the app, for the startup report
+BOOT_STARTED = time.perf_counter()
+# Module name -> how long its first import took, for modules imported lazily
+IMPORT_TIMES = {}
+
+
+def import_module(module_name):
+    """importlib.import_module, timing the first import of each module."""
+    # Always go through importlib: it waits if another thread is mid-import
+    # instead of handing back a partially initialized module
+    first = module_name not in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if first:
+        IMPORT_TIMES.setdefault(module_name, {
+            "import_ms": round((time.perf_counter() - started) * 1000, 2),
+            "seconds_after_boot": round(started - BOOT_STARTED, 3),
+        })
+    return module
+
+
+class ServiceRegistry:
+    """Process-wide singletons (clients, caches, managers) created on first use.
+
+    Each service is registered with a factory that imports what it needs
+    through import_module() and builds the object on the first get(); a
+    ServiceProxy lets module-level names stand in for it until then.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+        self.init_times = {}
+        self.boot_ms = None
+        self.modules_at_boot = None
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+
+    def factory(self, name):
+        """Decorator form of register()."""
+        def decorator(factory):
+            self.register(name, factory)
+            return factory
+        return decorator
+
+    def get(self, name):
+        if name in self._instances:
+            return self._instances[name]
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                instance = self._factories[name]()
+                self.init_times[name] = {
+                    "init_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "seconds_after_boot": round(started - BOOT_STARTED, 3),
+                    "thread": threading.current_thread().name,
+                }
+                self._instances[name] = instance
+            return self._instances[name]
+
+    def initialized(self, name):
+        return name in self._instances
+
+    def proxy(self, name):
+        return ServiceProxy(self, name)
+
+    def mark_booted(self):
+        self.boot_ms = round((time.perf_counter() - BOOT_STARTED) * 1000, 2)
+        self.modules_at_boot = len(sys.modules)
+
+    def startup_report(self):
+        return {
+            "boot_ms": self.boot_ms,
+            "modules_at_boot": self.modules_at_boot,
+            "lazy_imports": {name: dict(timing) for name, timing in IMPORT_TIMES.items()},
+            "services": {name: dict(timing) for name, timing in self.init_times.items()},
+            "not_initialized": sorted(set(self._factories) - set(self._instances)),
+        }
+
+
+class ServiceProxy:
+    """Stands in for a service at module level and creates it on first attribute access."""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __getitem__(self, key):
+        return self._registry.get(self._name)[key]
+
+    def __repr__(self):
+        state = "initialized" if self._registry.initialized(self._name) else "not initialized"
+        return f"<service {self._name} ({state})>"
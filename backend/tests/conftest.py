@@ -0,0 +1,90 @@
+"""Shared fixtures: a MongoDB database and the in-memory dev chain.
+
+    cd backend && python -m pytest tests
+
+Tests use the MongoDB at MONGO_TEST_URL when it is set (in a scratch
+database, dropped afterwards), otherwise mongomock. A single MongoDB
+operation is atomic on the server, but mongomock's are not atomic across
+threads, so each mongomock call is serialized to stand in for the server.
+"""
+import os
+import sys
+import threading
+import uuid
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+class _SerializedCollection:
+    _lock = threading.RLock()
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return call
+
+
+class _SerializedDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return _SerializedCollection(self._db[name])
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def mongo_db():
+    url = os.getenv("MONGO_TEST_URL")
+    if url:
+        from pymongo import MongoClient
+        client = MongoClient(url)
+        name = f"curelink_test_{uuid.uuid4().hex[:8]}"
+        yield client[name]
+        client.drop_database(name)
+        client.close()
+        return
+    mongomock = pytest.importorskip("mongomock")
+    yield _SerializedDatabase(mongomock.MongoClient()["curelink_test"])
+
+
+@pytest.fixture
+def chain():
+    from benchmarks.standin_chain import StandinChain
+    return StandinChain(abi_path=os.path.join(BACKEND, "abi.json"))
+
+
+@pytest.fixture
+def web3(chain):
+    """web3 talking JSON-RPC to the in-memory chain, without a socket."""
+    from web3 import Web3
+    from web3.providers import BaseProvider
+
+    class StandinProvider(BaseProvider):
+        def make_request(self, method, params):
+            return chain.handle_request({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+
+        def is_connected(self, show_traceback=False):
+            return True
+
+    return Web3(StandinProvider())
+
+
+@pytest.fixture
+def contract(web3):
+    import json
+    from benchmarks.standin_chain import CONTRACT_ADDRESS
+    with open(os.path.join(BACKEND, "abi.json")) as abi_file:
+        return web3.eth.contract(address=CONTRACT_ADDRESS, abi=json.load(abi_file))
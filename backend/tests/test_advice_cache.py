@@ -0,0 +1,62 @@
+import json
+import threading
+import time
+import pytest
+from advice_cache import AdviceCache
+from advice_stream import parse_advice
+
+ADVICE = {"description": "Rest and fluids", "prevention_tips": "Wash hands"}
+
+
+def slow_completion(calls, release, text=json.dumps(ADVICE)):
+    def generate():
+        calls.append(1)
+        for start in range(0, len(text), 8):
+            yield text[start:start + 8]
+            if start == 0:
+                # Hold the call open after the first chunk, so the other requests join it
+                release.wait(5)
+    return generate
+
+
+def test_concurrent_requests_share_one_streamed_call():
+    cache = AdviceCache()
+    calls = []
+    release = threading.Event()
+    streamed = []
+    computed = []
+
+    leader = cache.stream("v1:Flu", slow_completion(calls, release), parse_advice)
+    followers = [cache.stream("v1:Flu", slow_completion(calls, release), parse_advice) for _ in range(3)]
+    waiter = threading.Thread(target=lambda: computed.append(cache.get_or_compute("v1:Flu", lambda: calls.append(1))))
+    waiter.start()
+    readers = [threading.Thread(target=lambda flight=flight: streamed.append("".join(flight.follow())))
+               for flight in [leader, *followers]]
+    for reader in readers:
+        reader.start()
+    while cache.stats()["coalesced"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in [waiter, *readers]:
+        thread.join()
+
+    assert len(calls) == 1
+    assert streamed == [json.dumps(ADVICE)] * 4
+    assert leader.result() == ADVICE and computed == [ADVICE]
+
+    # Later requests are answered from the cache, without text
+    hit = cache.stream("v1:Flu", slow_completion(calls, release), parse_advice)
+    assert list(hit.follow()) == [] and hit.result() == ADVICE
+
+
+def test_invalid_completion_is_not_cached():
+    cache = AdviceCache()
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    flight = cache.stream("v1:Flu", slow_completion(calls, release, text="I cannot help with that"), parse_advice)
+    assert "".join(flight.follow()) == "I cannot help with that"
+    with pytest.raises(json.JSONDecodeError):
+        flight.result()
+    assert cache.get("v1:Flu") is None
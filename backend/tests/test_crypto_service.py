@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import crypto_service
+from crypto_service import CryptoService, ServiceBusy
+
+KEYS = ("private", "public", "qr")
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    """Key generation that waits until the returned event is set; run on threads, not processes."""
+    release = threading.Event()
+
+    def generate():
+        release.wait(10)
+        return KEYS
+    monkeypatch.setattr(crypto_service, "generate_registration_keys", generate)
+    yield release
+    release.set()
+
+
+def service(max_queue):
+    crypto = CryptoService(max_workers=1, max_queue=max_queue)
+    crypto._executor = ThreadPoolExecutor(max_workers=1)
+    return crypto
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_timed_out_jobs_give_back_their_slots(blocked):
+    crypto = service(max_queue=3)
+    results = []
+    # Occupies the only worker
+    running = threading.Thread(target=lambda: results.append(crypto.registration_keys(timeout=5)))
+    running.start()
+    wait_for(lambda: crypto.stats()["queue_depth"] == 1)
+
+    # Queued behind it, so cancelled on timeout
+    for _ in range(6):
+        with pytest.raises(ServiceBusy, match="timed out"):
+            crypto.registration_keys(timeout=0.05)
+    assert crypto.stats()["queue_depth"] == 1
+    assert crypto.stats()["timed_out"] == 6
+
+    blocked.set()
+    running.join()
+    assert results == [KEYS]
+    assert crypto.stats()["queue_depth"] == 0
+    assert crypto.registration_keys(timeout=5) == KEYS
+
+
+def test_a_running_job_that_times_out_frees_its_slot_when_it_finishes(blocked):
+    crypto = service(max_queue=1)
+    with pytest.raises(ServiceBusy, match="timed out"):
+        crypto.registration_keys(timeout=0.05)
+    # Still running, so the queue is full
+    with pytest.raises(ServiceBusy, match="queue is full"):
+        crypto.registration_keys(timeout=0.05)
+
+    blocked.set()
+    wait_for(lambda: crypto.stats()["queue_depth"] == 0)
+    assert crypto.registration_keys(timeout=5) == KEYS
+    assert crypto.stats()["rejected"] == 1
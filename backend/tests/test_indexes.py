@@ -0,0 +1,28 @@
+import threading
+import pytest
+from pymongo.errors import DuplicateKeyError
+from indexes import ensure_indexes, insert_unique
+
+
+def test_concurrent_registrations_with_one_email_insert_one_user(mongo_db):
+    ensure_indexes(mongo_db)
+    results = []
+    # Both requests passed the find_one check before either inserted
+    threads = [
+        threading.Thread(target=lambda n=n: results.append(insert_unique(mongo_db.users, {"id": n, "email": "same@example.com"}, "email")))
+        for n in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+    assert mongo_db.users.count_documents({"email": "same@example.com"}) == 1
+
+
+def test_a_duplicate_on_another_index_is_raised(mongo_db):
+    ensure_indexes(mongo_db)
+    assert insert_unique(mongo_db.users, {"id": 1, "email": "a@example.com"}, "email")
+    with pytest.raises(DuplicateKeyError):
+        insert_unique(mongo_db.users, {"id": 1, "email": "b@example.com"}, "email")
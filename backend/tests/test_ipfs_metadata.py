@@ -0,0 +1,46 @@
+from ipfs_metadata import CidMetadataStore
+
+
+class Pinata:
+    def __init__(self, files):
+        self.files = files
+        self.calls = []
+        self.down = False
+
+    def fetch(self, cid):
+        self.calls.append(cid)
+        if self.down:
+            raise ConnectionError("Pinata timed out")
+        return self.files.get(cid)
+
+
+def test_found_and_missing_cids_are_cached(mongo_db):
+    pinata = Pinata({"bafk-found": {"name": "scan.pdf"}})
+    store = CidMetadataStore(mongo_db.cid_metadata, pinata.fetch)
+
+    assert store.resolve_names(["bafk-found", "bafk-missing"]) == {"bafk-found": "scan.pdf", "bafk-missing": "Unknown"}
+    assert store.resolve_names(["bafk-found", "bafk-missing"]) == {"bafk-found": "scan.pdf", "bafk-missing": "Unknown"}
+    assert sorted(pinata.calls) == ["bafk-found", "bafk-missing"]
+
+
+def test_failed_lookups_are_not_cached(mongo_db):
+    pinata = Pinata({"bafk-found": {"name": "scan.pdf"}})
+    store = CidMetadataStore(mongo_db.cid_metadata, pinata.fetch)
+
+    pinata.down = True
+    assert store.resolve_many(["bafk-found"]) == {"bafk-found": None}
+    assert mongo_db.cid_metadata.count_documents({}) == 0
+
+    pinata.down = False
+    assert store.resolve_many(["bafk-found"]) == {"bafk-found": {"name": "scan.pdf"}}
+    assert pinata.calls == ["bafk-found", "bafk-found"]
+
+
+def test_negative_entries_expire(mongo_db):
+    pinata = Pinata({})
+    store = CidMetadataStore(mongo_db.cid_metadata, pinata.fetch, negative_ttl=0)
+    store.resolve_many(["bafk-new"])
+    mongo_db.cid_metadata.delete_many({})
+
+    pinata.files["bafk-new"] = {"name": "late.pdf"}
+    assert store.resolve_names(["bafk-new"]) == {"bafk-new": "late.pdf"}
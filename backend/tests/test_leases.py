@@ -0,0 +1,35 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from leases import Lease
+
+
+def test_one_worker_holds_the_lease(mongo_db):
+    workers = [Lease(mongo_db.leases, "deployment-tasks") for _ in range(8)]
+    held = []
+    threads = [threading.Thread(target=lambda lease=lease: held.append((lease, lease.acquire()))) for lease in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    holders = [lease for lease, holds in held if holds]
+    assert len(holders) == 1
+    holder = holders[0]
+    # Renewing keeps it; the others still can't take it
+    assert holder.acquire()
+    assert not any(lease.acquire() for lease in workers if lease is not holder)
+
+
+def test_an_expired_lease_passes_to_another_worker(mongo_db):
+    first, second = Lease(mongo_db.leases, "deployment-tasks"), Lease(mongo_db.leases, "deployment-tasks")
+    assert first.acquire()
+    assert not second.acquire()
+
+    # The holder died and stopped renewing
+    mongo_db.leases.update_one({"_id": "deployment-tasks"},
+                               {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    assert second.acquire()
+    assert not first.acquire()
+
+    second.release()
+    assert first.acquire()
@@ -0,0 +1,91 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import medicine_search
+from medicine_search import _run_store, iter_store_results
+from scraping import one_mg
+
+
+class Cache:
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+        self.stored = []
+
+    def lookup(self, store, search):
+        value = self.entries.get(store)
+        return (dict(value), "fresh") if value else (None, "miss")
+
+    def refresh(self, executor, store, search, fetch):
+        pass
+
+    def store(self, store, search, data):
+        self.stored.append(store)
+
+
+def found(query):
+    return {"name": query, "price": 10}
+
+
+def nothing(query):
+    return None
+
+
+def broken(query):
+    raise ValueError("layout changed")
+
+
+def slow(query):
+    time.sleep(1)
+    return found(query)
+
+
+def test_each_store_settles_once_and_found_results_are_cached():
+    stores = [(name, scraper, str, None) for name, scraper in
+              [("cached", found), ("found", found), ("empty", nothing), ("error", broken), ("slow", slow)]]
+    cache = Cache({"cached": {"name": "dolo", "price": 9}})
+
+    settled = list(iter_store_results("dolo", timeout=0.3, stores=stores, cache=cache))
+    statuses = {status["store"]: status["status"] for _, status in settled}
+
+    assert statuses == {"cached": "ok", "found": "ok", "empty": "empty", "error": "error", "slow": "timeout"}
+    assert settled[0][0] == {"name": "dolo", "price": 9, "store": "cached"}
+    assert [data["store"] for data, _ in settled if data] == ["cached", "found"]
+    assert cache.stored == ["found"]
+
+
+@pytest.fixture
+def hung_store():
+    """A local store that answers every request after 3 s; returns (url, requests received)."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            received.append(self.path)
+            time.sleep(3)
+            self.send_response(503)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", received
+    server.shutdown()
+
+
+def test_a_hung_store_gives_its_worker_back_at_the_deadline(hung_store, monkeypatch):
+    url, received = hung_store
+    monkeypatch.setitem(medicine_search.SCRAPER_PARTS, one_mg, (lambda query: ("GET", f"{url}/search?name={query}", {}), str))
+
+    started = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        _run_store(one_mg, "dolo", None, deadline=started + 0.3)
+    # Not the 10 s read timeout, and no retries on the same deadline
+    assert time.perf_counter() - started < 1
+    assert received == ["/search?name=dolo"]
+
+    with pytest.raises(TimeoutError):
+        _run_store(one_mg, "dolo", None, deadline=time.perf_counter())
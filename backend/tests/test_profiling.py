@@ -0,0 +1,41 @@
+import threading
+import time
+from flask import Flask, Response, stream_with_context
+from profiling import SlowRequestRecorder, capture_slow_requests, profile_threads
+
+
+def test_profile_interval_is_clamped():
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, name="worker-1")
+    worker.start()
+    try:
+        counts = profile_threads(0.2, interval=0)
+    finally:
+        stop.set()
+        worker.join()
+    # About 200 samples at 1 ms; an unclamped loop takes many thousands
+    assert 0 < sum(count for stack, count in counts.items() if stack.startswith("worker-N")) <= 250
+
+
+def test_slow_request_capture_skips_event_streams():
+    app = Flask(__name__)
+    recorder = SlowRequestRecorder(threshold_ms=10)
+    capture_slow_requests(app, recorder)
+
+    @app.route("/slow")
+    def slow():
+        time.sleep(0.05)
+        return "done"
+
+    @app.route("/stream")
+    def stream():
+        def events():
+            time.sleep(0.05)
+            yield "event: done\ndata: {}\n\n"
+        return Response(stream_with_context(events()), mimetype="text/event-stream")
+
+    client = app.test_client()
+    assert client.get("/stream").data.startswith(b"event: done")
+    assert client.get("/slow").status_code == 200
+    assert [captured["route"] for captured in recorder.recent()] == ["/slow"]
+    assert recorder._active == {}
@@ -0,0 +1,35 @@
+import threading
+from sequences import Sequence
+
+
+def draw(sequence, count, ids):
+    for _ in range(count):
+        ids.append(sequence.next())
+
+
+def test_parallel_registrations_get_unique_ids(mongo_db):
+    # Two instances sharing one counter stand in for two worker processes
+    workers = [Sequence(mongo_db.counters, "users", block_size=5) for _ in range(2)]
+    ids = []
+    threads = [threading.Thread(target=draw, args=(workers[n % 2], 50, ids)) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(ids) == 16 * 50
+    assert len(set(ids)) == len(ids)
+
+
+def test_ids_continue_after_the_largest_existing_one(mongo_db):
+    mongo_db.users.insert_many([{"id": 1}, {"id": 41}, {"id": 7}])
+    workers = [Sequence(mongo_db.counters, "users", mongo_db.users, block_size=3) for _ in range(2)]
+    ids = []
+    threads = [threading.Thread(target=draw, args=(worker, 10, ids)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert min(ids) > 41
+    assert len(set(ids)) == 20
@@ -0,0 +1,172 @@
+import threading
+from datetime import datetime, timedelta, timezone
+import pytest
+from benchmarks.standin_chain import DEV_PRIVATE_KEY
+from tx_manager import CONFIRMED, FAILED, PENDING, SETTLING, TransactionManager
+
+
+def add_report(web3, contract, patient_id):
+    def build(params):
+        return contract.functions.addReportByDoctor(
+            patient_id, [f"bafkreitest{patient_id}"], "Migraine", "Test Hospital", "Paracetamol",
+            "2024-06-01", "Test report", "Dr. Test", 1, "2024-06-01T10:00:00",
+        ).build_transaction({**params, "gas": 2000000, "gasPrice": web3.to_wei("20", "gwei")})
+    return build
+
+
+def record_document(db, contract):
+    """An add_report handler like app.py's: the document ID from the receipt, upserted."""
+    def handler(context, receipt):
+        document_id = contract.events.ReportAdded().process_receipt(receipt)[0]["args"]["documentId"]
+        db.documents.update_one(
+            {"patient_id": context["patient_id"], "document_id": document_id},
+            {"$setOnInsert": {**context, "document_id": document_id}},
+            upsert=True,
+        )
+    return handler
+
+
+def make_worker(web3, db, contract):
+    """A TransactionManager as one worker process would build it; receipts are settled by the test."""
+    manager = TransactionManager(web3, db.transactions, db.nonces)
+    manager.register_handler("add_report", record_document(db, contract))
+    manager._track = lambda tx_hash: None
+    return manager
+
+
+def settle_all(manager, web3, db):
+    for doc in db.transactions.find({"status": PENDING}):
+        manager._settle(doc["_id"], web3.eth.get_transaction_receipt(doc["_id"]))
+
+
+def test_workers_sharing_a_key_never_reuse_a_nonce(web3, mongo_db, contract):
+    workers = [make_worker(web3, mongo_db, contract) for _ in range(2)]
+    errors = []
+
+    def send(worker, patient_ids):
+        for patient_id in patient_ids:
+            try:
+                worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, patient_id),
+                              context={"patient_id": patient_id})
+            except Exception as e:
+                errors.append(e)
+
+    threads = [
+        threading.Thread(target=send, args=(workers[n % 2], range(n * 5 + 1, n * 5 + 6)))
+        for n in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    transactions = list(mongo_db.transactions.find())
+    assert len(transactions) == 20
+    assert sorted(tx["nonce"] for tx in transactions) == list(range(20))
+
+    settle_all(workers[0], web3, mongo_db)
+    assert {tx["status"] for tx in mongo_db.transactions.find()} == {CONFIRMED}
+    document_ids = [doc["document_id"] for doc in mongo_db.documents.find()]
+    assert sorted(document_ids) == list(range(1, 21))
+
+
+def test_a_transaction_is_settled_once(web3, mongo_db, contract):
+    first, second = (make_worker(web3, mongo_db, contract) for _ in range(2))
+    raw_hash = first.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 7), context={"patient_id": 7})
+    tx_hash = web3.to_hex(raw_hash)
+    receipt = web3.eth.get_transaction_receipt(tx_hash)
+
+    # Both workers see the receipt, e.g. after both recovered the pending transaction
+    first._settle(tx_hash, receipt)
+    second._settle(tx_hash, receipt)
+    assert mongo_db.transactions.find_one({"_id": tx_hash})["status"] == CONFIRMED
+    assert mongo_db.documents.count_documents({"patient_id": 7}) == 1
+
+    # A worker that died mid-settle leaves the transaction to be settled again; the handler upserts
+    mongo_db.transactions.update_one({"_id": tx_hash}, {"$set": {"status": PENDING}})
+    second._settle(tx_hash, receipt)
+    assert mongo_db.documents.count_documents({"patient_id": 7}) == 1
+
+
+def test_stuck_settle_is_recovered(web3, mongo_db, contract):
+    worker = make_worker(web3, mongo_db, contract)
+    tx_hash = web3.to_hex(worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 3), context={"patient_id": 3}))
+    mongo_db.transactions.update_one({"_id": tx_hash}, {"$set": {"status": SETTLING, "updated_at": datetime.now(timezone.utc) - timedelta(hours=1)}})
+
+    recovered = []
+    worker._track = recovered.append
+    assert worker.recover_pending() == 1
+    assert recovered == [tx_hash]
+    assert mongo_db.transactions.find_one({"_id": tx_hash})["status"] == PENDING
+
+
+def test_nothing_is_sent_when_the_record_cannot_be_written(web3, mongo_db, chain, contract):
+    worker = make_worker(web3, mongo_db, contract)
+
+    class Unwritable:
+        def insert_one(self, doc):
+            raise RuntimeError("MongoDB is down")
+
+    worker.collection = Unwritable()
+    with pytest.raises(RuntimeError):
+        worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 1), context={"patient_id": 1})
+    assert chain.transactions == {}
+
+    # The reserved nonce was handed back, so the next transaction doesn't leave a gap
+    worker.collection = mongo_db.transactions
+    worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 1), context={"patient_id": 1})
+    assert [tx["nonce"] for tx in mongo_db.transactions.find()] == [0]
+
+
+def test_failed_send_is_recorded_and_the_nonce_resynced(web3, mongo_db, contract):
+    worker = make_worker(web3, mongo_db, contract)
+    worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 1), context={"patient_id": 1})
+    # The counter falls behind the node, as if the key had been used elsewhere
+    mongo_db.nonces.update_many({}, {"$set": {"next": 0}})
+
+    with pytest.raises(Exception, match="nonce too low"):
+        worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 2), context={"patient_id": 2})
+    assert mongo_db.transactions.count_documents({"status": FAILED}) == 1
+
+    worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 2), context={"patient_id": 2})
+    assert mongo_db.transactions.count_documents({"status": PENDING}) == 2
+
+
+def test_only_orphaned_transactions_are_picked_up_while_leading(web3, mongo_db, contract):
+    worker = make_worker(web3, mongo_db, contract)
+    fresh = web3.to_hex(worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 4), context={"patient_id": 4}))
+    orphan = web3.to_hex(worker.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 5), context={"patient_id": 5}))
+    mongo_db.transactions.update_one({"_id": orphan}, {"$set": {"submitted_at": datetime.now(timezone.utc) - timedelta(hours=1)}})
+
+    leader = make_worker(web3, mongo_db, contract)
+    recovered = []
+    leader._track = recovered.append
+    assert leader.recover_pending(older_than=600) == 1
+    assert recovered == [orphan]
+    assert mongo_db.transactions.find_one({"_id": fresh})["status"] == PENDING
+
+
+def test_a_receipt_found_at_the_timeout_settles_the_transaction(web3, mongo_db, contract):
+    manager = make_worker(web3, mongo_db, contract)
+    tx_hash = web3.to_hex(manager.submit("add_report", DEV_PRIVATE_KEY, add_report(web3, contract, 6), context={"patient_id": 6}))
+
+    class LateReceipt:
+        """Not mined on the regular poll, mined by the final check."""
+        def __init__(self, eth):
+            self.eth = eth
+            self.calls = 0
+
+        def get_transaction_receipt(self, tx_hash):
+            self.calls += 1
+            if self.calls == 1:
+                raise ValueError("not found")
+            return self.eth.get_transaction_receipt(tx_hash)
+
+    class Web3:
+        eth = LateReceipt(web3.eth)
+
+    watcher = TransactionManager(Web3(), mongo_db.transactions, mongo_db.nonces, poll_interval=0.01, receipt_timeout=0)
+    watcher._track(tx_hash)
+    watcher._tracker.join(timeout=0.5)
+    assert mongo_db.transactions.find_one({"_id": tx_hash})["status"] == CONFIRMED
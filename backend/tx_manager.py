@@ -0,0 +1,244 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from metrics import observe_dependency
+
+# Seconds between receipt polls, and how long a transaction may stay unmined
+RECEIPT_POLL_INTERVAL = float(os.getenv("TX_RECEIPT_POLL_INTERVAL", "2"))
+RECEIPT_TIMEOUT = float(os.getenv("TX_RECEIPT_TIMEOUT", "600"))
+
+# How long a worker may hold a confirmed transaction in "settling" before another may retry it
+SETTLE_TIMEOUT = float(os.getenv("TX_SETTLE_TIMEOUT", "300"))
+
+PENDING = "pending"
+SETTLING = "settling"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+class NonceManager:
+    """Hands out consecutive nonces for one account, shared by every process through MongoDB.
+
+    The counter is seeded from the node (including its pending pool) the
+    first time the account is used; after that each nonce is reserved with
+    one atomic $inc, so workers signing with the same key never collide.
+    A nonce whose transaction was never sent is handed back if nothing was
+    reserved after it; after a failed send the counter re-syncs with the node.
+    """
+
+    def __init__(self, web3, collection, address):
+        self.web3 = web3
+        self.collection = collection
+        self.address = address
+
+    def reserve(self):
+        doc = self.collection.find_one_and_update({"_id": self.address}, {"$inc": {"next": 1}})
+        if doc is None:
+            # $max so a concurrent seed from another process can't move the counter back
+            self.collection.update_one(
+                {"_id": self.address},
+                {"$max": {"next": self.web3.eth.get_transaction_count(self.address, "pending")}},
+                upsert=True,
+            )
+            doc = self.collection.find_one_and_update({"_id": self.address}, {"$inc": {"next": 1}})
+        return doc["next"]
+
+    def release(self, nonce):
+        """Hand back an unsent nonce, unless a later one is already reserved."""
+        self.collection.update_one({"_id": self.address, "next": nonce + 1}, {"$set": {"next": nonce}})
+
+    def resync(self):
+        """Restart from the node's view, e.g. after a nonce error."""
+        count = self.web3.eth.get_transaction_count(self.address, "pending")
+        self.collection.update_one({"_id": self.address}, {"$set": {"next": count}}, upsert=True)
+
+
+class TransactionManager:
+    """Signs and submits contract writes, then tracks their receipts in the background.
+
+    Every transaction is persisted in MongoDB, as pending before it is sent,
+    then confirmed or failed. Follow-up work that must wait for mining is
+    registered per transaction kind with register_handler(); handlers receive
+    the stored context and the receipt. Each confirmation is claimed by one
+    process, but a handler may still run again after a crash, so handlers
+    must be idempotent (upsert rather than insert).
+    """
+
+    def __init__(self, web3, collection, nonces, poll_interval=RECEIPT_POLL_INTERVAL, receipt_timeout=RECEIPT_TIMEOUT):
+        self.web3 = web3
+        self.collection = collection
+        self.nonces = nonces
+        self.poll_interval = poll_interval
+        self.receipt_timeout = receipt_timeout
+        self._handlers = {}
+        # Sends from this process go out in nonce order
+        self._send_lock = threading.Lock()
+        self._incoming = queue.Queue()
+        self._tracker = None
+        self._tracker_lock = threading.Lock()
+
+    def register_handler(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def submit(self, kind, private_key, build, context=None):
+        """Sign and send a transaction, returning its hash (bytes) without waiting for mining.
+
+        build(params) must return a transaction dict built with the given
+        "from" and "nonce" params, e.g. contract.functions.f().build_transaction({...}).
+        The transaction is recorded as pending before it is sent, so one the
+        node accepted is always tracked; if the record can't be written,
+        nothing is sent.
+        """
+        account = self.web3.eth.account.from_key(private_key)
+        nonces = NonceManager(self.web3, self.nonces, account.address)
+        with self._send_lock:
+            nonce = nonces.reserve()
+            try:
+                tx = build({"from": account.address, "nonce": nonce})
+                signed_tx = self.web3.eth.account.sign_transaction(tx, private_key)
+                tx_hash = self.web3.to_hex(signed_tx.hash)
+                now = datetime.now(timezone.utc)
+                self.collection.insert_one({
+                    "_id": tx_hash,
+                    "kind": kind,
+                    "status": PENDING,
+                    "from": account.address,
+                    "nonce": nonce,
+                    "context": context or {},
+                    "submitted_at": now,
+                    "updated_at": now,
+                })
+            except Exception:
+                nonces.release(nonce)
+                raise
+
+            try:
+                self.web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            except Exception as e:
+                self._mark(tx_hash, FAILED, error=f"Send failed: {str(e)}", expected=PENDING)
+                # The account may have been used outside the counter; start again from the node's view
+                try:
+                    nonces.resync()
+                except Exception as resync_error:
+                    print(f"Failed to re-sync nonce for {account.address}: {str(resync_error)}")
+                raise
+        self._track(tx_hash)
+        return signed_tx.hash
+
+    def status(self, tx_hash):
+        return self.collection.find_one({"_id": tx_hash})
+
+    def recover_pending(self, older_than=None):
+        """Resume receipt tracking for transactions left pending by a previous process.
+
+        A transaction stuck in "settling" (its process died mid-handler) is
+        put back to pending so it is settled again. With older_than (seconds),
+        only transactions submitted at least that long ago are picked up: a
+        live process fails its own after receipt_timeout, so anything pending
+        past that was orphaned by a process that died.
+        """
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=SETTLE_TIMEOUT)
+        self.collection.update_many(
+            {"status": SETTLING, "updated_at": {"$lt": cutoff}},
+            {"$set": {"status": PENDING, "updated_at": now}},
+        )
+        query = {"status": PENDING}
+        if older_than is not None:
+            query["submitted_at"] = {"$lt": now - timedelta(seconds=older_than)}
+        count = 0
+        for doc in self.collection.find(query, {"_id": 1}):
+            self._track(doc["_id"])
+            count += 1
+        return count
+
+    def _track(self, tx_hash):
+        self._incoming.put(tx_hash)
+        with self._tracker_lock:
+            if self._tracker is None or not self._tracker.is_alive():
+                self._tracker = threading.Thread(target=self._track_loop, name="tx-receipts", daemon=True)
+                self._tracker.start()
+
+    def _track_loop(self):
+        pending = {}
+        while True:
+            try:
+                tx_hash = self._incoming.get(timeout=self.poll_interval if pending else None)
+                # setdefault: a recovered transaction already tracked here keeps its deadline
+                pending.setdefault(tx_hash, time.monotonic())
+                # Pick up any other new submissions before polling
+                while True:
+                    tx_hash = self._incoming.get_nowait()
+                    pending.setdefault(tx_hash, time.monotonic())
+            except queue.Empty:
+                pass
+
+            # Values are when tracking began: submission, or recovery after a restart
+            for tx_hash, tracked_since in list(pending.items()):
+                try:
+                    receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+                except Exception:
+                    # Not mined yet (TransactionNotFound) or a transient RPC error
+                    receipt = None
+                if receipt is not None:
+                    del pending[tx_hash]
+                    observe_dependency("chain", "tx_confirmation", time.monotonic() - tracked_since, error=receipt["status"] != 1)
+                    try:
+                        self._settle(tx_hash, receipt)
+                    except Exception as e:
+                        print(f"Failed to settle transaction {tx_hash}: {str(e)}")
+                elif time.monotonic() > tracked_since + self.receipt_timeout:
+                    del pending[tx_hash]
+                    # One last look, so a transaction mined during this pass is not failed
+                    try:
+                        receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+                    except Exception:
+                        receipt = None
+                    observe_dependency("chain", "tx_confirmation", time.monotonic() - tracked_since, error=receipt is None or receipt["status"] != 1)
+                    try:
+                        if receipt is not None:
+                            self._settle(tx_hash, receipt)
+                        else:
+                            self._mark(tx_hash, FAILED, error="Timed out waiting for receipt", expected=PENDING)
+                    except Exception as e:
+                        print(f"Failed to settle transaction {tx_hash}: {str(e)}")
+
+    def _settle(self, tx_hash, receipt):
+        """Record a mined transaction and run its handler, unless another process already has."""
+        doc = self.collection.find_one_and_update(
+            {"_id": tx_hash, "status": PENDING},
+            {"$set": {"status": SETTLING, "updated_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return
+        if receipt["status"] != 1:
+            self._mark(tx_hash, FAILED, receipt, error="Transaction reverted")
+            return
+        handler = self._handlers.get(doc.get("kind"))
+        if handler:
+            try:
+                handler(doc.get("context", {}), receipt)
+            except Exception as e:
+                print(f"Handler for {doc.get('kind')} transaction {tx_hash} failed: {str(e)}")
+                self._mark(tx_hash, CONFIRMED, receipt, error=f"Post-confirmation update failed: {str(e)}")
+                return
+        self._mark(tx_hash, CONFIRMED, receipt)
+
+    def _mark(self, tx_hash, status, receipt=None, error=None, expected=None):
+        update = {"status": status, "updated_at": datetime.now(timezone.utc)}
+        if receipt is not None:
+            update["block_number"] = receipt["blockNumber"]
+            update["gas_used"] = receipt["gasUsed"]
+        if error:
+            update["error"] = error
+        query = {"_id": tx_hash}
+        if expected:
+            query["status"] = expected
+        try:
+            self.collection.update_one(query, {"$set": update})
+        except Exception as e:
+            print(f"Failed to record {status} for transaction {tx_hash}: {str(e)}")
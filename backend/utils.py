@@ -1,8 +1,7 @@
 import re
 import ssl
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+from functools import lru_cache
+from services import import_module
 
 # Handle SSL certificate issues for NLTK downloads
 try:
@@ -14,6 +13,7 @@ else:
 
 # Download NLTK resources with error handling
 def download_nltk_resources():
+    nltk = import_module("nltk")
     try:
         nltk.data.find('corpora/stopwords')
     except LookupError:
@@ -31,20 +31,45 @@ def download_nltk_resources():
             print(f"Error downloading wordnet: {e}")
             raise
 
-# Call this at module level
-download_nltk_resources()
+# Bounded memo of word -> lemma; the symptom vocabulary is small and highly repetitive
+LEMMA_CACHE_SIZE = 50000
+
+_non_alpha = re.compile(r'[^a-zA-Z\s]')
+_stop_words = None
+_lemmatizer = None
+
+def _get_stop_words():
+    global _stop_words
+    if _stop_words is None:
+        # NLTK is only imported, and its data checked, once text is first preprocessed
+        download_nltk_resources()
+        _stop_words = frozenset(import_module("nltk.corpus").stopwords.words('english'))
+    return _stop_words
+
+def _get_lemmatizer():
+    global _lemmatizer
+    if _lemmatizer is None:
+        download_nltk_resources()
+        lemmatizer = import_module("nltk.stem").WordNetLemmatizer()
+        # Force the lazy WordNet corpus load once, before threads share the instance
+        lemmatizer.lemmatize('warmup')
+        _lemmatizer = lemmatizer
+    return _lemmatizer
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemmatize(word):
+    return _get_lemmatizer().lemmatize(word)
 
 def preprocess_text(text):
     # Convert to lowercase
     text = text.lower()
     # Remove special characters and numbers
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    # Tokenize
-    words = text.split()
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    words = [word for word in words if word not in stop_words]
-    # Lemmatization
-    lemmatizer = WordNetLemmatizer()
-    words = [lemmatizer.lemmatize(word) for word in words]
-    return ' '.join(words)
\ No newline at end of file
+    text = _non_alpha.sub('', text)
+    # Tokenize, remove stopwords and lemmatize
+    stop_words = _get_stop_words()
+    return ' '.join([_lemmatize(word) for word in text.split() if word not in stop_words])
+
+def preprocess_texts(texts):
+    """Lazily preprocess an iterable of texts, sharing the compiled pipeline."""
+    for text in texts:
+        yield preprocess_text(text)